@@ -67,6 +67,93 @@ class account_bank_statement_line_global(models.Model):
         ('code_uniq', 'unique (code)', 'The code must be unique !'),
     ]
 
+    @api.model
+    def _reserve(self, nb, sequence_code):
+        """
+        Reserve 'nb' record ids and codes of sequence 'sequence_code'
+        for _bulk_insert().
+        The sequence numbers are retrieved with a single query,
+        cf. ir.sequence, _next(), hence a 'no_gap' sequence is locked
+        only once.
+
+        Returns a list of (id, code) tuples.
+        """
+        if not nb:
+            return []
+        cr = self._cr
+        seq_obj = self.env['ir.sequence']
+        company_ids = self.env['res.company'].search([]).ids + [False]
+        seqs = seq_obj.search(
+            [('code', '=', sequence_code), ('company_id', 'in', company_ids)])
+        if not seqs:
+            raise except_orm(
+                _('Error !'),
+                _("No sequence defined with code '%s' !") % sequence_code)
+        company = self.env.user.company_id
+        preferred = seqs.filtered(lambda r: r.company_id == company)
+        seq = preferred and preferred[0] or seqs[0]
+        if seq.implementation == 'standard':
+            cr.execute(
+                "SELECT nextval('ir_sequence_%03d') "
+                "FROM generate_series(1, %%s)" % seq.id, (nb,))
+            numbers = [x[0] for x in cr.fetchall()]
+        else:
+            cr.execute(
+                "UPDATE ir_sequence "
+                "SET number_next = number_next + %s * number_increment "
+                "WHERE id = %s RETURNING number_next, number_increment",
+                (nb, seq.id))
+            number_next, incr = cr.fetchone()
+            numbers = [number_next - (nb - i) * incr for i in range(nb)]
+            seq.invalidate_cache(['number_next'], [seq.id])
+        d = seq_obj._interpolation_dict()
+        prefix = seq_obj._interpolate(seq.prefix, d)
+        suffix = seq_obj._interpolate(seq.suffix, d)
+        codes = [prefix + '%%0%sd' % seq.padding % x + suffix
+                 for x in numbers]
+        cr.execute(
+            "SELECT nextval(%s) FROM generate_series(1, %s)",
+            (self._sequence, nb))
+        return zip([x[0] for x in cr.fetchall()], codes)
+
+    @api.model
+    def _bulk_insert(self, vals_list):
+        """
+        Create records with the ids reserved via _reserve()
+        in a single multi-row INSERT statement.
+        The 'parent_id' may refer to a record of the same batch.
+        The access rights and record rules are checked as in create().
+        """
+        if not vals_list:
+            return
+        cr, uid = self._cr, self._uid
+        columns = self._columns
+        self.check_access_rights('create')
+        fnames = ['code', 'name', 'type', 'parent_id', 'amount',
+                  'payment_reference']
+        rows = []
+        params = []
+        for vals in vals_list:
+            row = ['%s']
+            params.append(vals['id'])
+            for f in fnames:
+                row.append(columns[f]._symbol_set[0])
+                params.append(columns[f]._symbol_set[1](vals.get(f)))
+            row += ['%s', "(now() at time zone 'UTC')"] * 2
+            params += [uid, uid]
+            rows.append('(%s)' % ', '.join(row))
+        cr.execute(
+            'INSERT INTO "%s" (id, %s, create_uid, create_date, '
+            'write_uid, write_date) VALUES %s' % (
+                self._table,
+                ', '.join(['"%s"' % f for f in fnames]),
+                ', '.join(rows)),
+            params)
+        recs = self.browse([x['id'] for x in vals_list])
+        recs.check_access_rule('create')
+        recs._validate_fields(fnames)
+        recs.modified(fnames)
+
     @api.model
     def name_search(self, name, args=None, operator='ilike', limit=100):
         args = args or []
@@ -299,3 +386,122 @@ class account_bank_statement_line(models.Model):
                 seq = 0
             vals['sequence'] = seq + 1
         return super(account_bank_statement_line, self).create(vals)
+
+    @api.model
+    def _bulk_create(self, vals_list, batch_size=500):
+        """
+        Create statement lines via multi-row INSERT statements.
+
+        Lines with values for fields that are not stored in a column
+        of the table (e.g. keys handled by create() overrides) are
+        created via create().
+        The stored function and related fields are computed and the
+        constraints are checked after the INSERT.
+        The access rights and record rules are checked as in create().
+
+        Returns the ids of the created lines in the order of vals_list.
+        """
+        cr, uid, context = self._cr, self._uid, self._context
+        model = self.pool[self._name]
+        columns = self._columns
+        self.check_access_rights('create')
+
+        def is_column(f):
+            return f in columns and columns[f]._classic_write \
+                and not columns[f]._type.endswith('2many') \
+                and not getattr(columns[f], 'translate', False)
+
+        # sequence handling, cf. create()
+        last_seq = {}
+        todo = []
+        for vals in vals_list:
+            if not vals.get('statement_id'):
+                raise except_orm(
+                    _('Error !'),
+                    _("Please recalculate the statement balance first "
+                      "via the 'Compute' button"))
+            st_id = vals['statement_id']
+            if st_id not in last_seq:
+                lines = self.search(
+                    [('statement_id', '=', st_id)],
+                    order='sequence desc', limit=1)
+                last_seq[st_id] = lines and lines[0].sequence or 0
+            vals = dict(vals)
+            if not vals.get('sequence'):
+                vals['sequence'] = last_seq[st_id] + 1
+            last_seq[st_id] = max(last_seq[st_id], vals['sequence'])
+            todo.append(vals)
+
+        defaults = dict(
+            [(k, v) for k, v in self.default_get(columns.keys()).items()
+             if is_column(k)])
+        res = []
+        bulk_ids = []
+        bulk_fields = set()
+        batch = []
+
+        def flush(batch):
+            fnames = sorted(set([f for vals in batch for f in vals]))
+            cr.execute(
+                "SELECT nextval(%s) FROM generate_series(1, %s)",
+                (self._sequence, len(batch)))
+            new_ids = [x[0] for x in cr.fetchall()]
+            rows = []
+            params = []
+            for new_id, vals in zip(new_ids, batch):
+                row = ['%s']
+                params.append(new_id)
+                for f in fnames:
+                    if f in vals:
+                        row.append(columns[f]._symbol_set[0])
+                        params.append(columns[f]._symbol_set[1](vals[f]))
+                    else:
+                        row.append('NULL')
+                row += ['%s', "(now() at time zone 'UTC')"] * 2
+                params += [uid, uid]
+                rows.append('(%s)' % ', '.join(row))
+            cr.execute(
+                'INSERT INTO "%s" (id, %s, create_uid, create_date, '
+                'write_uid, write_date) VALUES %s' % (
+                    self._table,
+                    ', '.join(['"%s"' % f for f in fnames]),
+                    ', '.join(rows)),
+                params)
+            bulk_fields.update(fnames)
+            return new_ids
+
+        for vals in todo:
+            if not all([is_column(f) for f in vals]):
+                res.append(('orm', self.create(vals).id))
+                continue
+            row = dict(defaults, **vals)
+            batch.append(row)
+            res.append(('bulk', None))
+            if len(batch) == batch_size:
+                bulk_ids += flush(batch)
+                batch = []
+        if batch:
+            bulk_ids += flush(batch)
+
+        if bulk_ids:
+            recs = self.browse(bulk_ids)
+            recs.check_access_rule('create')
+            recs.modified(self._fields)
+            recs._validate_fields(bulk_fields)
+            recs.modified(
+                list(bulk_fields)
+                + ['create_uid', 'create_date', 'write_uid', 'write_date'])
+            if context.get('recompute', True):
+                result = model._store_get_values(
+                    cr, uid, bulk_ids, list(bulk_fields), context)
+                result.sort()
+                done = []
+                for order, model_name, ids, fields2 in result:
+                    if (model_name, ids, fields2) not in done:
+                        self.pool[model_name]._store_set_values(
+                            cr, uid, ids, fields2, context)
+                        done.append((model_name, ids, fields2))
+                recs.recompute()
+
+        bulk_ids.reverse()
+        return [x[1] or bulk_ids.pop() for x in res]
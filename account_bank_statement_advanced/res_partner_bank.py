@@ -20,59 +20,108 @@
 #
 ##############################################################################
 
-from openerp import models, api
+from openerp import models, fields, api
 import logging
 _logger = logging.getLogger(__name__)
 
 
+def normalise_acc_number(acc_number):
+    return acc_number and \
+        acc_number.replace(' ', '').replace('-', '').upper() or False
+
+
 class res_partner_bank(models.Model):
     _inherit = 'res.partner.bank'
 
+    acc_number_norm = fields.Char(
+        string='Normalised Account Number',
+        compute='_get_acc_number_norm', store=True, index=True,
+        readonly=True,
+        help="Bank Account Number in uppercase without spaces or dashes.")
+
+    @api.one
+    @api.depends('acc_number')
+    def _get_acc_number_norm(self):
+        self.acc_number_norm = normalise_acc_number(self.acc_number)
+
+    def init(self, cr):
+        """
+        Backfill the normalised account numbers and add a trigram
+        index for the substring lookups (requires the pg_trgm extension).
+        """
+        cr.execute(
+            "UPDATE res_partner_bank "
+            "SET acc_number_norm = "
+            "UPPER(REPLACE(REPLACE(acc_number, ' ', ''), '-', '')) "
+            "WHERE acc_number_norm IS NULL AND acc_number IS NOT NULL")
+        cr.execute(
+            "SELECT indexname FROM pg_indexes "
+            "WHERE indexname = 'res_partner_bank_acc_number_norm_trgm_index'")
+        if cr.fetchone():
+            return
+        try:
+            with cr.savepoint():
+                cr.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+                cr.execute(
+                    "CREATE INDEX res_partner_bank_acc_number_norm_trgm_index "
+                    "ON res_partner_bank "
+                    "USING gin (acc_number_norm gin_trgm_ops)")
+        except Exception, e:
+            _logger.warn(
+                "Trigram index on res_partner_bank.acc_number_norm "
+                "not created (pg_trgm extension not available): %s", e)
+
     def _acc_number_select(self, operator, number):
         """
-        The code below could be simplified if the Odoo standard
-        accounting modules would store bank account numbers
-        in the database in 'normalised' format (without spaces or
-        other formatting characters (such as '-').
+        Returns the SQL select (and its parameters) to lookup
+        bank account numbers.
+
+        The selection is based upon the account numbers without spaces
+        or other formatting characters (such as '-').
+        The conditions on the indexed 'acc_number_norm' column are
+        necessary conditions for the conditions on 'acc_number' hence
+        they don't alter the result of the lookup.
         """
         if operator in ['=', '=like', '=ilike']:
             op = '='
         else:  # operator in ['like', 'ilike']
             op = 'LIKE'
+        pattern = '%' + number + '%'
+        # acc_number_norm LIKE is only equivalent without LIKE wildcards
+        norm_like = not [x for x in '%_\\' if x in number]
+        conditions = []
+        params = []
         if len(number) == 12:
             """
             Belgium BBAN is always 12 chars and subset of IBAN.
             Hence we can retrieve the IBAN from a BBAN lookup.
             TODO: extend logic to other countries
             """
-            select = \
-                "SELECT id FROM res_partner_bank WHERE " \
-                "(state='iban' AND SUBSTRING(acc_number FOR 2) = 'BE' AND " \
-                "REPLACE(acc_number, ' ', '') LIKE '%%'|| '%s' ||'%%' ) " \
-                % number
-            # other countries
-            if op == '=':
-                select += "OR " \
-                    "REPLACE(REPLACE(acc_number, ' ', ''), '-','') = '%s'" \
-                    % number
-            else:
-                select += "OR " \
-                    "REPLACE(REPLACE(acc_number, ' ', ''), '-','') " \
-                    "LIKE '%%'|| '%s' ||'%%' " \
-                    % number
+            condition = \
+                "(state = 'iban' AND SUBSTRING(acc_number FOR 2) = 'BE' " \
+                "AND REPLACE(acc_number, ' ', '') LIKE %s"
+            params.append(pattern)
+            if norm_like:
+                condition += " AND acc_number_norm LIKE %s"
+                params.append(pattern)
+            conditions.append(condition + ")")
+        # other countries
+        if op == '=':
+            conditions.append(
+                "(acc_number_norm = %s AND "
+                "REPLACE(REPLACE(acc_number, ' ', ''), '-', '') = %s)")
+            params += [number, number]
         else:
-            if op == '=':
-                select = \
-                    "SELECT id FROM res_partner_bank WHERE " \
-                    "REPLACE(REPLACE(acc_number, ' ', ''), '-','') = '%s'" \
-                    % number
-            else:
-                select = \
-                    "SELECT id FROM res_partner_bank WHERE " \
-                    "REPLACE(REPLACE(acc_number, ' ', ''), '-','') " \
-                    "LIKE '%%'|| '%s' ||'%%' " \
-                    % number
-        return select
+            condition = \
+                "(REPLACE(REPLACE(acc_number, ' ', ''), '-', '') LIKE %s"
+            params.append(pattern)
+            if norm_like:
+                condition += " AND acc_number_norm LIKE %s"
+                params.append(pattern)
+            conditions.append(condition + ")")
+        select = "SELECT id FROM res_partner_bank WHERE " \
+            + " OR ".join(conditions)
+        return select, params
 
     @api.model
     def search(self, args, offset=0, limit=None, order=None, count=False):
@@ -81,8 +130,8 @@ class res_partner_bank(models.Model):
             if arg[0] == 'acc_number' and \
                     arg[1] in ['=', '=like', '=ilike', 'like', 'ilike']:
                 number = arg[2].replace(' ', '').replace('-', '').upper()
-                select = self._acc_number_select(arg[1], number)
-                self._cr.execute(select)
+                select, params = self._acc_number_select(arg[1], number)
+                self._cr.execute(select, params)
                 res = self._cr.fetchall()
                 if res:
                     rpb_ids = [x[0] for x in res]
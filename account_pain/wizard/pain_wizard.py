@@ -25,7 +25,7 @@ from openerp.osv import fields, orm
 import re
 import time
 import base64
-from StringIO import StringIO
+import tempfile
 from lxml import etree
 from openerp import tools
 import logging
@@ -101,9 +101,7 @@ class account_payment_make_payment(orm.TransientModel):
         active_id = context.get('active_id', [])
 
         payment_obj = self.pool.get('payment.order')
-        payment_line_obj = self.pool.get('payment.line')
         attachment_obj = self.pool.get('ir.attachment')
-        payment_line_obj = self.pool.get('payment.line')
         note = ''
 
         payment = payment_obj.browse(cr, uid, active_id, context=context)
@@ -122,15 +120,136 @@ class account_payment_make_payment(orm.TransientModel):
                 _("Your Payment Order does not contain "
                   "payment instructions!"))
 
-        # create XML
+        # The XML is written to a temporary file one PmtInf element
+        # at a time, hence the memory use does not grow with the
+        # number of payment lines.
+        ns = 'urn:iso:std:iso:20022:tech:xsd:pain.001.001.03'
         ns_map = {
-            None: 'urn:iso:std:iso:20022:tech:xsd:pain.001.001.03',
+            None: ns,
             'xsi': 'http://www.w3.org/2001/XMLSchema-instance',
         }
-        pain = etree.Element('Document', nsmap=ns_map)
-        CstmrCdtTrfInitn = etree.SubElement(pain, 'CstmrCdtTrfInitn')
-        # GroupHeader
-        GrpHdr = etree.SubElement(CstmrCdtTrfInitn, 'GrpHdr')
+        pain_file = tempfile.TemporaryFile()
+        try:
+            with etree.xmlfile(pain_file, encoding='UTF-8') as xf:
+                xf.write_declaration()
+                with xf.element('{%s}Document' % ns, nsmap=ns_map):
+                    xf.write('\n')
+                    with xf.element('{%s}CstmrCdtTrfInitn' % ns):
+                        xf.write('\n')
+                        xf.write(self._pain_group_header(
+                            cr, uid, payment, company, context=context),
+                            pretty_print=True)
+                        # PaymentInformation
+                        for line in payment.line_ids:
+                            execution_date, line_note = \
+                                self._pain_execution_date(
+                                    cr, uid, payment, line, context=context)
+                            note += line_note
+                            xf.write(self._pain_payment_info(
+                                cr, uid, payment, line, company,
+                                execution_date, context=context),
+                                pretty_print=True)
+
+            # validate the generated XML schema while parsing the file
+            xsd = tools.file_open('account_pain/xsd/pain.001.001.03.xsd')
+            xmlschema = etree.XMLSchema(etree.parse(xsd))
+            pain_file.seek(0)
+            try:
+                for event, el in etree.iterparse(
+                        pain_file, tag='{%s}PmtInf' % ns, schema=xmlschema):
+                    el.clear()
+                    while el.getprevious() is not None:
+                        del el.getparent()[0]
+            except etree.XMLSyntaxError, e:
+                _logger.error(
+                    'The generated XML file does not fit '
+                    'the required schema !')
+                _logger.error(tools.ustr(e))
+                raise orm.except_orm(
+                    _('The generated XML file does not fit '
+                      'the required schema !'), tools.ustr(e))
+
+            # base64 encoding per block of 57 bytes (one line of output)
+            pain_file.seek(0)
+            pain_data = []
+            while True:
+                chunk = pain_file.read(57 * 1024)
+                if not chunk:
+                    break
+                pain_data.append(base64.encodestring(chunk))
+            pain_data = ''.join(pain_data)
+        finally:
+            pain_file.close()
+
+        attachment_obj.create(cr, uid, {
+            'name': pain_fname,
+            'datas': pain_data,
+            'datas_fname': pain_fname,
+            'res_model': 'payment.order',
+            'res_id': active_id,
+            }, context=context)
+        payment_obj.set_done(cr, uid, [active_id], context)
+
+        if note:
+            note = _('Warning:\n') + note
+
+        return {
+            'pain_data': pain_data,
+            'pain_fname': pain_fname,
+            'note': note}
+
+    def _pain_execution_date(self, cr, uid, payment, line, context=None):
+        """
+        Returns the execution date of a payment line and a note
+        when the payment date of the line has been changed.
+        """
+        payment_line_obj = self.pool['payment.line']
+        note = ''
+        if not line.amount:
+            raise orm.except_orm(
+                _('Payment Instruction Error!'),
+                _('Payment Instruction Error in Payment Line %s.\n'
+                  'Please fill in the transaction amount!'
+                  ) % line.name)
+        if not (line.bank_id and line.bank_id.acc_number):
+            raise orm.except_orm(
+                _('Payment Instruction Error!'),
+                _("Unsupported Payment Instruction in Payment Line %s.\n"
+                  "Please fill in the bank account number of the "
+                  "Creditor for this Payment Line!"
+                  ) % line.name)
+
+        if payment.date_prefered == 'now':
+            execution_date = time.strftime('%Y-%m-%d')
+        elif payment.date_prefered == 'fixed':
+            execution_date = payment.date_scheduled
+        elif payment.date_prefered == 'due':
+            if not line.date:
+                if line.ml_maturity_date:
+                    execution_date = line.ml_maturity_date
+                else:
+                    execution_date = time.strftime('%Y-%m-%d')
+            else:
+                execution_date = line.date
+        else:
+            raise orm.except_orm(
+                _('Unsupported Payment Order Option!'),
+                _("Please ensure that the 'Preferred date' is equal "
+                  "to 'Due date', 'Directly' or 'Fixed date'!"))
+        if execution_date < time.strftime('%Y-%m-%d'):
+            execution_date = time.strftime('%Y-%m-%d')
+        if line.date != execution_date:
+            note += _(
+                "\nThe Payment Date on Payment "
+                "Line %s has been changed."
+                ) % line.name
+            payment_line_obj.write(
+                cr, uid, line.id, {'date': execution_date})
+        return execution_date, note
+
+    def _pain_group_header(self, cr, uid, payment, company, context=None):
+        payment_mode = payment.mode
+        GrpHdr = etree.Element('GrpHdr')
         MsgId = etree.SubElement(GrpHdr, 'MsgId')
         MsgId.text = payment.reference
         CreDtTm = etree.SubElement(GrpHdr, 'CreDtTm')
@@ -151,188 +270,116 @@ class account_payment_make_payment(orm.TransientModel):
             if payment_mode.initgpty_issr:
                 Issr = etree.SubElement(Othr, 'Issr')
                 Issr.text = payment_mode.initgpty_issr
-        # PaymentInformation
-        payment_method = 'TRF'
-        for line in payment.line_ids:
-
-            if not line.amount:
-                raise orm.except_orm(
-                    _('Payment Instruction Error!'),
-                    _('Payment Instruction Error in Payment Line %s.\n'
-                      'Please fill in the transaction amount!'
-                      ) % line.name)
-            if not (line.bank_id and line.bank_id.acc_number):
-                raise orm.except_orm(
-                    _('Payment Instruction Error!'),
-                    _("Unsupported Payment Instruction in Payment Line %s.\n"
-                      "Please fill in the bank account number of the "
-                      "Creditor for this Payment Line!"
-                      ) % line.name)
-
-            if payment.date_prefered == 'now':
-                execution_date = time.strftime('%Y-%m-%d')
-            elif payment.date_prefered == 'fixed':
-                execution_date = payment.date_scheduled
-            elif payment.date_prefered == 'due':
-                if not line.date:
-                    if line.ml_maturity_date:
-                        execution_date = line.ml_maturity_date
-                    else:
-                        execution_date = time.strftime('%Y-%m-%d')
-                else:
-                    execution_date = line.date
-            else:
-                raise orm.except_orm(
-                    _('Unsupported Payment Order Option!'),
-                    _("Please ensure that the 'Preferred date' is equal "
-                      "to 'Due date', 'Directly' or 'Fixed date'!"))
-            if execution_date < time.strftime('%Y-%m-%d'):
-                execution_date = time.strftime('%Y-%m-%d')
-            if line.date != execution_date:
-                note += _(
-                    "\nThe Payment Date on Payment "
-                    "Line %s has been changed."
-                    ) % line.name
-                payment_line_obj.write(
-                    cr, uid, line.id, {'date': execution_date})
+        return GrpHdr
 
-            PmtInf = etree.SubElement(CstmrCdtTrfInitn, 'PmtInf')
-            PmtInfId = etree.SubElement(PmtInf, 'PmtInfId')
-            PmtInfId.text = line.name
-            PmtMtd = etree.SubElement(PmtInf, 'PmtMtd')
-            PmtMtd.text = payment_method
-            BtchBookg = etree.SubElement(PmtInf, 'BtchBookg')
-            BtchBookg.text = 'false'
-            if payment_method == 'TRF':
-                PmtTpInf = etree.SubElement(PmtInf, 'PmtTpInf')
-                InstrPrty = etree.SubElement(PmtTpInf, 'InstrPrty')
-                InstrPrty.text = 'NORM'
-                if line.currency.name == 'EUR' \
-                        or payment_mode.journal.currency == 'EUR':
-                    SvcLvl = etree.SubElement(PmtTpInf, 'SvcLvl')
-                    Cd = etree.SubElement(SvcLvl, 'Cd')
-                    Cd.text = 'SEPA'
-                ReqdExctnDt = etree.SubElement(PmtInf, 'ReqdExctnDt')
-                ReqdExctnDt.text = execution_date
-                Dbtr = etree.SubElement(PmtInf, 'Dbtr')
-                Nm = etree.SubElement(Dbtr, 'Nm')
-                Nm.text = company.name
-                DbtrAcct = etree.SubElement(PmtInf, 'DbtrAcct')
-                Id = etree.SubElement(DbtrAcct, 'Id')
-                IBAN = etree.SubElement(Id, 'IBAN')
-                IBAN.text = payment_mode.bank_id.iban.upper().replace(' ', '')
-                DbtrAgt = etree.SubElement(PmtInf, 'DbtrAgt')
-                FinInstnId = etree.SubElement(DbtrAgt, 'FinInstnId')
+    def _pain_payment_info(self, cr, uid, payment, line, company,
+                           execution_date, context=None):
+        payment_mode = payment.mode
+        payment_method = 'TRF'
+        PmtInf = etree.Element('PmtInf')
+        PmtInfId = etree.SubElement(PmtInf, 'PmtInfId')
+        PmtInfId.text = line.name
+        PmtMtd = etree.SubElement(PmtInf, 'PmtMtd')
+        PmtMtd.text = payment_method
+        BtchBookg = etree.SubElement(PmtInf, 'BtchBookg')
+        BtchBookg.text = 'false'
+        if payment_method == 'TRF':
+            PmtTpInf = etree.SubElement(PmtInf, 'PmtTpInf')
+            InstrPrty = etree.SubElement(PmtTpInf, 'InstrPrty')
+            InstrPrty.text = 'NORM'
+            if line.currency.name == 'EUR' \
+                    or payment_mode.journal.currency == 'EUR':
+                SvcLvl = etree.SubElement(PmtTpInf, 'SvcLvl')
+                Cd = etree.SubElement(SvcLvl, 'Cd')
+                Cd.text = 'SEPA'
+            ReqdExctnDt = etree.SubElement(PmtInf, 'ReqdExctnDt')
+            ReqdExctnDt.text = execution_date
+            Dbtr = etree.SubElement(PmtInf, 'Dbtr')
+            Nm = etree.SubElement(Dbtr, 'Nm')
+            Nm.text = company.name
+            DbtrAcct = etree.SubElement(PmtInf, 'DbtrAcct')
+            Id = etree.SubElement(DbtrAcct, 'Id')
+            IBAN = etree.SubElement(Id, 'IBAN')
+            IBAN.text = payment_mode.bank_id.iban.upper().replace(' ', '')
+            DbtrAgt = etree.SubElement(PmtInf, 'DbtrAgt')
+            FinInstnId = etree.SubElement(DbtrAgt, 'FinInstnId')
+            BIC = etree.SubElement(FinInstnId, 'BIC')
+            BIC.text = re.sub(
+                '\s', '',
+                payment_mode.bank_id.bank_bic.upper()
+                or payment_mode.bank_id.bank.bic.upper())
+            ChrgBr = etree.SubElement(PmtInf, 'ChrgBr')
+            ChrgBr.text = line.bank_id.charge_bearer or 'SLEV'
+            CdtTrfTxInf = etree.SubElement(PmtInf, 'CdtTrfTxInf')
+            PmtId = etree.SubElement(CdtTrfTxInf, 'PmtId')
+            EndToEndId = etree.SubElement(PmtId, 'EndToEndId')
+            EndToEndId.text = line.name
+            Amt = etree.SubElement(CdtTrfTxInf, 'Amt')
+            InstdAmt = etree.SubElement(
+                Amt, 'InstdAmt', Ccy=line.currency.name)
+            InstdAmt.text = '%.2f' % line.amount_currency
+            # to be completed with other countries allowing
+            # payments without BIC
+            if line.bank_id.iban[0:2].upper() not in ['BE']:
+                if not (line.bank_id.bank_bic or line.bank_id.bank.bic):
+                    raise orm.except_orm(
+                        _('Configuration Error!'),
+                        _("Unsupported Payment Instruction "
+                          "in Payment Line %s.\n"
+                          "Please fill in the BIC code of the Bank "
+                          "Creditor Account for this Payment Line!"
+                          ) % line.name)
+            if line.bank_id.bank_bic or line.bank_id.bank.bic:
+                CdtrAgt = etree.SubElement(CdtTrfTxInf, 'CdtrAgt')
+                FinInstnId = etree.SubElement(CdtrAgt, 'FinInstnId')
                 BIC = etree.SubElement(FinInstnId, 'BIC')
                 BIC.text = re.sub(
                     '\s', '',
-                    payment_mode.bank_id.bank_bic.upper()
-                    or payment_mode.bank_id.bank.bic.upper())
-                ChrgBr = etree.SubElement(PmtInf, 'ChrgBr')
-                ChrgBr.text = line.bank_id.charge_bearer or 'SLEV'
-                CdtTrfTxInf = etree.SubElement(PmtInf, 'CdtTrfTxInf')
-                PmtId = etree.SubElement(CdtTrfTxInf, 'PmtId')
-                EndToEndId = etree.SubElement(PmtId, 'EndToEndId')
-                EndToEndId.text = line.name
-                Amt = etree.SubElement(CdtTrfTxInf, 'Amt')
-                InstdAmt = etree.SubElement(
-                    Amt, 'InstdAmt', Ccy=line.currency.name)
-                InstdAmt.text = '%.2f' % line.amount_currency
-                # to be completed with other countries allowing
-                # payments without BIC
-                if line.bank_id.iban[0:2].upper() not in ['BE']:
-                    if not (line.bank_id.bank_bic or line.bank_id.bank.bic):
-                        raise orm.except_orm(
-                            _('Configuration Error!'),
-                            _("Unsupported Payment Instruction "
-                              "in Payment Line %s.\n"
-                              "Please fill in the BIC code of the Bank "
-                              "Creditor Account for this Payment Line!"
-                              ) % line.name)
-                if line.bank_id.bank_bic or line.bank_id.bank.bic:
-                    CdtrAgt = etree.SubElement(CdtTrfTxInf, 'CdtrAgt')
-                    FinInstnId = etree.SubElement(CdtrAgt, 'FinInstnId')
-                    BIC = etree.SubElement(FinInstnId, 'BIC')
-                    BIC.text = re.sub(
-                        '\s', '',
-                        (line.bank_id.bank_bic or line.bank_id.bank.bic
-                         ).upper())
-                Cdtr = etree.SubElement(CdtTrfTxInf, 'Cdtr')
-                Nm = etree.SubElement(Cdtr, 'Nm')
-                Nm.text = line.partner_id.name
-                CdtrAcct = etree.SubElement(CdtTrfTxInf, 'CdtrAcct')
-                Id = etree.SubElement(CdtrAcct, 'Id')
-                IBAN = etree.SubElement(Id, 'IBAN')
-                IBAN.text = line.bank_id.iban.upper().replace(' ', '')
-                if line.communication:
-                    comm = line.communication
-                    if line.communication2:
-                        comm += ' ' + line.communication2
-                    RmtInf = etree.SubElement(CdtTrfTxInf, 'RmtInf')
-                    if line.state == 'normal':
-                        Ustrd = etree.SubElement(RmtInf, 'Ustrd')
-                        Ustrd.text = comm
-                    elif line.state == 'structured':
-                        Strd = etree.SubElement(RmtInf, 'Strd')
-                        CdtrRefInf = etree.SubElement(Strd, 'CdtrRefInf')
-                        Tp = etree.SubElement(CdtrRefInf, 'Tp')
-                        CdOrPrtry = etree.SubElement(Tp, 'CdOrPrtry')
-                        Cd = etree.SubElement(CdOrPrtry, 'Cd')
-                        Cd.text = 'SCOR'
-                        Issr = etree.SubElement(Tp, 'Issr')
-                        Issr.text = 'BBA'
-                        comm = self.format_comm(line.communication)
-                        if not comm:
-                            raise orm.except_orm(
-                                _('Payment Instruction Error!'),
-                                _("Unsupported Structured Communication "
-                                  "in Payment Line %s.\n"
-                                  "Only the Belgian Structured Communication "
-                                  "format (BBA) is supported in the current "
-                                  "release of the ISO 20022 payment module!"
-                                  ) % line.name)
-                        Ref = etree.SubElement(CdtrRefInf, 'Ref')
-                        Ref.text = comm
-                    else:
+                    (line.bank_id.bank_bic or line.bank_id.bank.bic
+                     ).upper())
+            Cdtr = etree.SubElement(CdtTrfTxInf, 'Cdtr')
+            Nm = etree.SubElement(Cdtr, 'Nm')
+            Nm.text = line.partner_id.name
+            CdtrAcct = etree.SubElement(CdtTrfTxInf, 'CdtrAcct')
+            Id = etree.SubElement(CdtrAcct, 'Id')
+            IBAN = etree.SubElement(Id, 'IBAN')
+            IBAN.text = line.bank_id.iban.upper().replace(' ', '')
+            if line.communication:
+                comm = line.communication
+                if line.communication2:
+                    comm += ' ' + line.communication2
+                RmtInf = etree.SubElement(CdtTrfTxInf, 'RmtInf')
+                if line.state == 'normal':
+                    Ustrd = etree.SubElement(RmtInf, 'Ustrd')
+                    Ustrd.text = comm
+                elif line.state == 'structured':
+                    Strd = etree.SubElement(RmtInf, 'Strd')
+                    CdtrRefInf = etree.SubElement(Strd, 'CdtrRefInf')
+                    Tp = etree.SubElement(CdtrRefInf, 'Tp')
+                    CdOrPrtry = etree.SubElement(Tp, 'CdOrPrtry')
+                    Cd = etree.SubElement(CdOrPrtry, 'Cd')
+                    Cd.text = 'SCOR'
+                    Issr = etree.SubElement(Tp, 'Issr')
+                    Issr.text = 'BBA'
+                    comm = self.format_comm(line.communication)
+                    if not comm:
                         raise orm.except_orm(
-                            _('Configuration Error!'),
-                            _("Unsupported Communication Type "
+                            _('Payment Instruction Error!'),
+                            _("Unsupported Structured Communication "
                               "in Payment Line %s.\n"
+                              "Only the Belgian Structured Communication "
+                              "format (BBA) is supported in the current "
+                              "release of the ISO 20022 payment module!"
                               ) % line.name)
-        pain_data = etree.tostring(
-            pain, encoding='UTF-8', xml_declaration=True, pretty_print=True)
-        # validate the generated XML schema
-        xsd = tools.file_open('account_pain/xsd/pain.001.001.03.xsd')
-        xmlschema_doc = etree.parse(xsd)
-        xmlschema = etree.XMLSchema(xmlschema_doc)
-        xml_to_validate = StringIO(pain_data)
-        parse_result = etree.parse(xml_to_validate)
-        if xmlschema.validate(parse_result):
-            pain_data = base64.encodestring(pain_data)
-            attachment_obj.create(cr, uid, {
-                'name': pain_fname,
-                'datas': pain_data,
-                'datas_fname': pain_fname,
-                'res_model': 'payment.order',
-                'res_id': active_id,
-                }, context=context)
-            payment_obj.set_done(cr, uid, [active_id], context)
-        else:
-            _logger.error(
-                'The generated XML file does not fit the required schema !')
-            _logger.error(tools.ustr(xmlschema.error_log.last_error))
-            error = xmlschema.error_log[0]
-            raise orm.except_orm(
-                _('The generated XML file does not fit the required schema !'
-                  ), error.message)
-
-        if note:
-            note = _('Warning:\n') + note
-
-        return {
-            'pain_data': pain_data,
-            'pain_fname': pain_fname,
-            'note': note}
+                    Ref = etree.SubElement(CdtrRefInf, 'Ref')
+                    Ref.text = comm
+                else:
+                    raise orm.except_orm(
+                        _('Configuration Error!'),
+                        _("Unsupported Communication Type "
+                          "in Payment Line %s.\n"
+                          ) % line.name)
+        return PmtInf
 
 
 class account_pain_create(orm.TransientModel):
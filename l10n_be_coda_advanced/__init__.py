@@ -21,5 +21,8 @@
 ##############################################################################
 
 from . import account_coda
+from . import account_coda_spool
 from . import account_bank_statement
+from . import account_journal
+from . import res_partner_bank
 from . import wizard
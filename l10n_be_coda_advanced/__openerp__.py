@@ -47,5 +47,9 @@
         'account_coda_view.xml',
         'account_bank_statement_view.xml',
         'wizard/account_coda_wizard.xml',
+        'wizard/account_coda_batch_import_wizard.xml',
+        'account_coda_spool_view.xml',
+        'account_coda_spool_data.xml',
+        'account_coda_data.xml',
         ],
 }
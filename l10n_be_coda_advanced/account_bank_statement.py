@@ -29,3 +29,21 @@ class account_bank_statement(models.Model):
     coda_id = fields.Many2one(
         'account.coda', string='CODA Data File', ondelete='cascade')
     coda_note = fields.Text('CODA Notes')
+    coda_hash = fields.Char(
+        string='CODA Fingerprint', size=40, readonly=True, copy=False,
+        help="Fingerprint of the CODA statement (Bank Account, "
+             "Sequence Numbers, Old Balance and Old Balance Date).")
+
+    _sql_constraints = [
+        ('coda_hash_uniq', 'unique (coda_hash)',
+         'This CODA Bank Statement has already been imported !'),
+    ]
+
+
+class account_bank_statement_line(models.Model):
+    _inherit = 'account.bank.statement.line'
+
+    coda_reconcile_data = fields.Text(
+        string='Deferred Reconciliation', readonly=True, copy=False,
+        help="Move line values of the deferred reconciliation "
+             "by the CODA import.")
@@ -21,8 +21,13 @@
 ##############################################################################
 
 from openerp.osv import orm, fields
+from openerp import tools, SUPERUSER_ID
 from openerp.addons.decimal_precision import decimal_precision as dp
 from openerp.tools.translate import _
+from openerp.addons.l10n_be_coda_advanced.wizard.coda_helpers import \
+    get_iban_and_bban
+import json
+import time
 import logging
 _logger = logging.getLogger(__name__)
 
@@ -183,6 +188,72 @@ class coda_bank_account(orm.Model):
                 ))
         return res
 
+    def create(self, cr, uid, vals, context=None):
+        self.clear_caches()
+        return super(coda_bank_account, self).create(
+            cr, uid, vals, context=context)
+
+    def write(self, cr, uid, ids, vals, context=None):
+        self.clear_caches()
+        return super(coda_bank_account, self).write(
+            cr, uid, ids, vals, context=context)
+
+    def unlink(self, cr, uid, ids, context=None):
+        self.clear_caches()
+        return super(coda_bank_account, self).unlink(
+            cr, uid, ids, context=context)
+
+    @tools.ormcache(skiparg=3)
+    def _get_coda_bank_table(self, cr, uid, lang):
+        """
+        Returns the CODA Bank Account parameters of all companies
+        as a dictionary with the Bank Account Number (BBAN and IBAN
+        without spaces) as key and a list of CODA Bank Accounts
+        (in _order) as value.
+
+        The parameters are extended with the journal code, bank account
+        number and currency name.
+        """
+        cba_ids = self.search(cr, SUPERUSER_ID, [])
+        if not cba_ids:
+            return {}
+        coda_banks = self.read(
+            cr, SUPERUSER_ID, cba_ids, context={'lang': lang})
+        cr.execute(
+            "SELECT cba.id, aj.code, rpb.acc_number, rc.name "
+            "FROM coda_bank_account cba "
+            "INNER JOIN res_partner_bank rpb ON rpb.id = cba.bank_id "
+            "INNER JOIN res_currency rc ON rc.id = cba.currency_id "
+            "LEFT OUTER JOIN account_journal aj ON aj.id = cba.journal_id "
+            "WHERE cba.id IN %s", (tuple(cba_ids),))
+        extra = dict([(x[0], x[1:]) for x in cr.fetchall()])
+        coda_bank_table = {}
+        for coda_bank in coda_banks:
+            journal_code, acc_number, currency_name = extra[coda_bank['id']]
+            coda_bank.update({
+                'journal_code': journal_code or '',
+                'acc_number': acc_number,
+                'currency_name': currency_name,
+            })
+            for number in get_iban_and_bban(acc_number):
+                coda_bank_table.setdefault(number, []).append(coda_bank)
+        return coda_bank_table
+
+    def get_coda_bank_table(self, cr, uid, context=None):
+        """
+        CODA Bank Account parameters, cf. _get_coda_bank_table.
+        Only the CODA Bank Accounts accessible by uid are returned.
+        """
+        lang = (context or {}).get('lang') or False
+        coda_bank_table = self._get_coda_bank_table(cr, uid, lang)
+        cba_ids = set(self.search(cr, uid, [], context=context))
+        res = {}
+        for number, coda_banks in coda_bank_table.iteritems():
+            coda_banks = [dict(x) for x in coda_banks if x['id'] in cba_ids]
+            if coda_banks:
+                res[number] = coda_banks
+        return res
+
     def copy(self, cr, uid, id, default=None, context=None):
         cba = self.browse(cr, uid, id, context=context)
         if not default:
@@ -204,6 +275,18 @@ class account_coda(orm.Model):
     _name = 'account.coda'
     _description = 'Object to store CODA Data Files'
     _order = 'coda_creation_date desc'
+
+    def _reconcile_progress(self, cr, uid, ids, field_name, arg,
+                            context=None):
+        res = {}
+        for coda in self.read(
+                cr, uid, ids, ['reconcile_total', 'reconcile_done'],
+                context=context):
+            total = coda['reconcile_total']
+            res[coda['id']] = total and \
+                100.0 * coda['reconcile_done'] / total or 0.0
+        return res
+
     _columns = {
         'name': fields.char('CODA Filename', size=128, readonly=True),
         'coda_data': fields.binary('CODA File', readonly=True),
@@ -214,8 +297,20 @@ class account_coda(orm.Model):
             'account.bank.statement', 'coda_id',
             'Generated Bank Statements', readonly=True),
         'note': fields.text('Import Log', readonly=True),
+        'import_stats': fields.text(
+            'Import Statistics', readonly=True,
+            help="Wall time, SQL query count and number of records "
+                 "processed per phase of the CODA import."),
         'coda_creation_date': fields.date(
             'CODA Creation Date', readonly=True, select=True),
+        'coda_hash': fields.char(
+            'Fingerprint', size=40, readonly=True,
+            help="SHA-1 digest of the CODA File."),
+        'checkpoint': fields.text(
+            'Checkpoint', readonly=True,
+            help="Statements of the CODA File that have been processed "
+                 "(JSON). Processing the CODA File again resumes "
+                 "from the first statement that has not been processed."),
         'date': fields.date('Import Date', readonly=True, select=True),
         'user_id': fields.many2one(
             'res.users', 'User', readonly=True, select=True),
@@ -223,7 +318,20 @@ class account_coda(orm.Model):
             ('draft', 'Draft'),
             ('done', 'Done')],
             'State', required=True, readonly=True),
-        'company_id': fields.many2one('res.company', 'Company', readonly=True)
+        'company_id': fields.many2one('res.company', 'Company', readonly=True),
+        'reconcile_state': fields.selection([
+            ('pending', 'Pending'),
+            ('done', 'Done')],
+            'Reconciliation', readonly=True, select=True,
+            help="State of the deferred reconciliation "
+                 "of the Bank Statement lines."),
+        'reconcile_total': fields.integer(
+            'Lines to reconcile', readonly=True),
+        'reconcile_done': fields.integer(
+            'Lines reconciled', readonly=True),
+        'reconcile_progress': fields.function(
+            _reconcile_progress, type='float',
+            string='Reconciliation Progress'),
     }
     _defaults = {
         'date': fields.date.context_today,
@@ -232,7 +340,9 @@ class account_coda(orm.Model):
     }
     _sql_constraints = [
         ('coda_uniq', 'unique (name, coda_creation_date)',
-         'This CODA has already been imported !')
+         'This CODA has already been imported !'),
+        ('coda_hash_uniq', 'unique (coda_hash)',
+         'This CODA has already been imported !'),
     ]
 
     def set_to_draft(self, cr, uid, ids, context=None):
@@ -267,6 +377,97 @@ class account_coda(orm.Model):
         }
         return act_wiz
 
+    def _reconcile_chunk(self, cr, uid, coda_id, chunk_size, context=None):
+        """
+        Create the moves and reconciliations of a chunk of
+        Bank Statement lines of which the reconciliation has been
+        deferred by the CODA import.
+
+        Returns the number of lines processed, None when the CODA File
+        is being processed by another transaction.
+        """
+        absl_obj = self.pool['account.bank.statement.line']
+        try:
+            with cr.savepoint():
+                cr.execute(
+                    "SELECT id FROM account_coda WHERE id = %s "
+                    "FOR UPDATE NOWAIT", (coda_id,))
+        except Exception:
+            return None
+        cr.execute(
+            "SELECT l.id, l.ref, l.coda_reconcile_data, s.name "
+            "FROM account_bank_statement_line l "
+            "JOIN account_bank_statement s ON s.id = l.statement_id "
+            "WHERE s.coda_id = %s AND l.coda_reconcile_data IS NOT NULL "
+            "ORDER BY s.id, l.sequence, l.id LIMIT %s",
+            (coda_id, chunk_size))
+        st_lines = cr.fetchall()
+        note = ''
+        for st_line_id, ref, data, st_name in st_lines:
+            mv_line_dict = dict(
+                [(str(k), v) for k, v in json.loads(data).items()])
+            err_string = ''
+            try:
+                with cr.savepoint():
+                    absl_obj.process_reconciliation(
+                        cr, uid, st_line_id, [mv_line_dict],
+                        context=context)
+            except orm.except_orm, e:
+                err_string = _('\nApplication Error : ') + str(e)
+            except Exception, e:
+                err_string = _('\nSystem Error : ') + str(e)
+            if err_string:
+                note += _(
+                    "\n    Bank Statement '%s' line '%s':"
+                    ) % (st_name, ref) + err_string
+            cr.execute(
+                "UPDATE account_bank_statement_line "
+                "SET coda_reconcile_data = NULL WHERE id = %s",
+                (st_line_id,))
+
+        cr.execute(
+            "SELECT count(*) FROM account_bank_statement_line l "
+            "JOIN account_bank_statement s ON s.id = l.statement_id "
+            "WHERE s.coda_id = %s AND l.coda_reconcile_data IS NOT NULL",
+            (coda_id,))
+        pending = cr.fetchone()[0]
+        coda = self.read(
+            cr, uid, coda_id, ['reconcile_done', 'note'], context=context)
+        vals = {'reconcile_done': coda['reconcile_done'] + len(st_lines)}
+        if not pending:
+            vals['reconcile_state'] = 'done'
+        if note:
+            vals['note'] = (coda['note'] or '') + '\n\n>>> ' \
+                + time.strftime('%Y-%m-%d %H:%M:%S') + ' ' \
+                + _("Deferred reconciliation errors :") + note
+        self.write(cr, uid, [coda_id], vals, context=context)
+        cr.commit()
+        return len(st_lines)
+
+    def reconcile_deferred(self, cr, uid, ids=None, context=None):
+        """
+        Process the deferred reconciliations in chunks,
+        the chunk size is defined by the 'coda.reconcile.chunk_size'
+        system parameter.
+        A commit is performed after each chunk.
+        """
+        if ids is None:
+            ids = self.search(
+                cr, uid, [('reconcile_state', '=', 'pending')],
+                order='id', context=context)
+        chunk_size = int(self.pool['ir.config_parameter'].get_param(
+            cr, uid, 'coda.reconcile.chunk_size', default=100))
+        for coda_id in ids:
+            while True:
+                nb_lines = self._reconcile_chunk(
+                    cr, uid, coda_id, chunk_size, context=context)
+                if not nb_lines:
+                    break
+        return True
+
+    def button_reconcile_deferred(self, cr, uid, ids, context=None):
+        return self.reconcile_deferred(cr, uid, ids, context=context)
+
     def unlink(self, cr, uid, ids, context=None):
         bank_st_obj = self.pool['account.bank.statement']
         for coda in self.browse(cr, uid, ids, context=context):
@@ -277,10 +478,62 @@ class account_coda(orm.Model):
             cr, uid, ids, context=context)
 
 
+class account_coda_reference_table(orm.AbstractModel):
+    """
+    Registry level cache of the CODA reference tables.
+    The cache is cleared when a record of the table is changed.
+    """
+    _name = 'account.coda.reference.table'
+    _description = 'CODA reference table'
+
+    """
+    Fields that identify a record in the CODA file.
+    """
+    _code_fields = []
+
+    def create(self, cr, uid, vals, context=None):
+        self.clear_caches()
+        return super(account_coda_reference_table, self).create(
+            cr, uid, vals, context=context)
+
+    def write(self, cr, uid, ids, vals, context=None):
+        self.clear_caches()
+        return super(account_coda_reference_table, self).write(
+            cr, uid, ids, vals, context=context)
+
+    def unlink(self, cr, uid, ids, context=None):
+        self.clear_caches()
+        return super(account_coda_reference_table, self).unlink(
+            cr, uid, ids, context=context)
+
+    @tools.ormcache(skiparg=3)
+    def _get_code_table(self, cr, uid, lang):
+        """
+        Returns a dictionary with the values of the _code_fields
+        as key and the record as value.
+        """
+        ids = self.search(cr, uid, [])
+        records = self.read(
+            cr, uid, ids, context={'lang': lang}, load='_classic_write')
+        code_table = {}
+        for record in records:
+            key = tuple([record[f] for f in self._code_fields])
+            if len(key) == 1:
+                key = key[0]
+            code_table.setdefault(key, record)
+        return code_table
+
+    def get_code_table(self, cr, uid, context=None):
+        lang = (context or {}).get('lang') or False
+        return self._get_code_table(cr, uid, lang)
+
+
 class account_coda_trans_type(orm.Model):
     _name = 'account.coda.trans.type'
+    _inherit = ['account.coda.reference.table']
     _description = 'CODA transaction type'
     _rec_name = 'type'
+    _code_fields = ['type']
     _columns = {
         'type': fields.char('Transaction Type', size=1, required=True),
         'parent_id': fields.many2one('account.coda.trans.type', 'Parent'),
@@ -311,8 +564,10 @@ class account_coda_trans_type(orm.Model):
 
 class account_coda_trans_code(orm.Model):
     _name = 'account.coda.trans.code'
+    _inherit = ['account.coda.reference.table']
     _description = 'CODA transaction code'
     _rec_name = 'code'
+    _code_fields = ['type', 'code', 'parent_id']
     _columns = {
         'code': fields.char('Code', size=2, required=True, select=1),
         'type': fields.selection(
@@ -352,8 +607,10 @@ class account_coda_trans_code(orm.Model):
 
 class account_coda_trans_category(orm.Model):
     _name = 'account.coda.trans.category'
+    _inherit = ['account.coda.reference.table']
     _description = 'CODA transaction category'
     _rec_name = 'category'
+    _code_fields = ['category']
     _columns = {
         'category': fields.char(
             'Transaction Category', size=3, required=True),
@@ -380,8 +637,10 @@ class account_coda_trans_category(orm.Model):
 
 class account_coda_comm_type(orm.Model):
     _name = 'account.coda.comm.type'
+    _inherit = ['account.coda.reference.table']
     _description = 'CODA structured communication type'
     _rec_name = 'code'
+    _code_fields = ['code']
     _columns = {
         'code': fields.char(
             'Structured Communication Type', size=3, required=True, select=1),
@@ -456,7 +715,15 @@ class coda_bank_statement(orm.Model):
             'journal_id', 'company_id', type='many2one',
             relation='res.company', string='Company',
             store=True, readonly=True),
+        'coda_hash': fields.char(
+            'Fingerprint', size=40, readonly=True,
+            help="Fingerprint of the statement (Bank Account, "
+                 "Sequence Numbers, Old Balance and Old Balance Date)."),
     }
+    _sql_constraints = [
+        ('coda_hash_uniq', 'unique (coda_hash)',
+         'This CODA Bank Statement has already been imported !'),
+    ]
 
     def search(self, cr, uid, args, offset=0, limit=None,
                order=None, context=None, count=False):
@@ -571,11 +838,35 @@ class coda_account_mapping_rule(orm.Model):
         'action': 'none',
     }
 
-    def rule_get(self, cr, uid, coda_bank_account_id,
-                 trans_type_id=None, trans_family_id=None,
-                 trans_code_id=None, trans_category_id=None,
-                 struct_comm_type_id=None, partner_id=None,
-                 freecomm=None, structcomm=None, context=None):
+    def create(self, cr, uid, vals, context=None):
+        self.clear_caches()
+        return super(coda_account_mapping_rule, self).create(
+            cr, uid, vals, context=context)
+
+    def write(self, cr, uid, ids, vals, context=None):
+        self.clear_caches()
+        return super(coda_account_mapping_rule, self).write(
+            cr, uid, ids, vals, context=context)
+
+    def unlink(self, cr, uid, ids, context=None):
+        self.clear_caches()
+        return super(coda_account_mapping_rule, self).unlink(
+            cr, uid, ids, context=context)
+
+    @tools.ormcache(skiparg=3)
+    def _get_rule_index(self, cr, uid, coda_bank_account_id):
+        """
+        Compiled rule index of a CODA Bank Account.
+
+        The rules are grouped by the exact match criteria that are set
+        on the rule (the 'signature'). Within a group the rules are hashed
+        on the values of those criteria. Only the substring criteria
+        (freecomm, structcomm) need to be checked on the candidates.
+
+        Returns a list of (signature, {key: [rule, ...]}) tuples.
+        A rule is a (rank, freecomm, structcomm, result) tuple with
+        rank = position of the rule in the rule sequence.
+        """
         cr.execute("""
             SELECT trans_type_id, trans_family_id, trans_code_id,
               trans_category_id,
@@ -583,23 +874,41 @@ class coda_account_mapping_rule(orm.Model):
               account_id, tax_code_id, analytic_account_id
             FROM coda_account_mapping_rule
             WHERE active = TRUE AND coda_bank_account_id = %s
-            ORDER BY sequence""" % coda_bank_account_id)
-        rules = cr.fetchall()
-        condition = \
-            '(not rule[0] or (trans_type_id == rule[0])) and ' \
-            '(not rule[1] or (trans_family_id == rule[1])) ' \
-            'and (not rule[2] or (trans_code_id == rule[2])) and ' \
-            '(not rule[3] or (trans_category_id == rule[3])) ' \
-            'and (not rule[4] or (struct_comm_type_id == rule[4])) and ' \
-            '(not rule[5] or (partner_id == rule[5])) ' \
-            'and (not rule[6] or (rule[6].lower() in ' \
-            '(freecomm and freecomm.lower() or ""))) ' \
-            'and (not rule[7] or (rule[7] in (structcomm or ""))) '
+            ORDER BY sequence, id""", (coda_bank_account_id,))
+        index = {}
+        for rank, rule in enumerate(cr.fetchall()):
+            signature = tuple([i for i in range(6) if rule[i]])
+            key = tuple([rule[i] for i in signature])
+            entry = (rank,
+                     rule[6] and rule[6].lower() or '',
+                     rule[7] or '',
+                     rule[8:11])
+            index.setdefault(signature, {}).setdefault(key, []).append(entry)
+        return index.items()
+
+    def rule_get(self, cr, uid, coda_bank_account_id,
+                 trans_type_id=None, trans_family_id=None,
+                 trans_code_id=None, trans_category_id=None,
+                 struct_comm_type_id=None, partner_id=None,
+                 freecomm=None, structcomm=None, context=None):
+        rule_index = self._get_rule_index(cr, uid, coda_bank_account_id)
+        values = (trans_type_id, trans_family_id, trans_code_id,
+                  trans_category_id, struct_comm_type_id, partner_id)
+        freecomm = freecomm and freecomm.lower() or ''
+        structcomm = structcomm or ''
+        match = None
+        for signature, rules in rule_index:
+            key = tuple([values[i] for i in signature])
+            for rule in rules.get(key, []):
+                if match and rule[0] > match[0]:
+                    break
+                if (not rule[1] or rule[1] in freecomm) \
+                        and (not rule[2] or rule[2] in structcomm):
+                    match = rule
+                    break
         account_id = tax_code_id = analytic_account_id = False
-        for rule in rules:
-            if eval(condition):
-                account_id, tax_code_id, analytic_account_id = rule[8:11]
-                break
+        if match:
+            account_id, tax_code_id, analytic_account_id = match[3]
         res = {'account_id': account_id,
                'tax_code_id': tax_code_id,
                'analytic_account_id': analytic_account_id}
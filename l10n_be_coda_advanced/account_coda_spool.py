@@ -0,0 +1,302 @@
+# -*- encoding: utf-8 -*-
+##############################################################################
+#
+#    Odoo, Open Source Management Solution
+#
+#    Copyright (c) 2010-now Noviat nv/sa (www.noviat.com).
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+from openerp.osv import orm, fields
+from openerp.tools.translate import _
+from openerp.tools import DEFAULT_SERVER_DATETIME_FORMAT
+from openerp.addons.l10n_be_coda_advanced.wizard.coda_decoder import \
+    CodaDecoder
+from openerp.addons.l10n_be_coda_advanced.wizard.coda_batch_import import \
+    _coda_batch_process
+import base64
+import hashlib
+import os
+import shutil
+import time
+import logging
+_logger = logging.getLogger(__name__)
+
+
+class account_coda_spool(orm.Model):
+    """
+    Work queue of the CODA files dropped in the CODA spool directory.
+
+    Configuration parameters (ir.config_parameter):
+    - coda.spool.directory: directory scanned for new CODA files
+    - coda.spool.archive_directory: (optional) directory where the
+      CODA files are moved to after a successful import
+    """
+    _name = 'account.coda.spool'
+    _description = 'CODA Spool Queue'
+    _order = 'id desc'
+    # files modified less than _min_age seconds ago are skipped
+    # since they may still be written by the bank connectivity software
+    _min_age = 30
+
+    _columns = {
+        'name': fields.char('CODA Filename', size=128, readonly=True),
+        'path': fields.char('Path', readonly=True),
+        'fingerprint': fields.char(
+            'Fingerprint', size=40, readonly=True, select=True,
+            help="SHA-1 digest of the CODA File."),
+        'file_size': fields.integer('File Size', readonly=True),
+        'coda_creation_date': fields.date(
+            'CODA Creation Date', readonly=True, select=True),
+        'state': fields.selection([
+            ('pending', 'Pending'),
+            ('running', 'Running'),
+            ('done', 'Done'),
+            ('error', 'Error')],
+            'State', required=True, readonly=True, select=True),
+        'err_code': fields.char('Error Code', size=8, readonly=True),
+        'note': fields.text('Log', readonly=True),
+        'coda_id': fields.many2one(
+            'account.coda', 'CODA File', readonly=True, ondelete='set null'),
+        'date_queued': fields.datetime('Queued', readonly=True),
+        'date_start': fields.datetime('Started', readonly=True),
+        'date_done': fields.datetime('Finished', readonly=True),
+        'duration': fields.float(
+            'Duration', digits=(16, 1), readonly=True,
+            help="Processing time in seconds."),
+    }
+    _defaults = {
+        'state': 'pending',
+    }
+    _sql_constraints = [
+        ('fingerprint_uniq', 'unique (fingerprint)',
+         'This CODA File is already in the spool queue !')
+    ]
+
+    def _read_coda_creation_date(self, cr, uid, data, context=None):
+        """
+        Returns the CODA creation date, only record 0 is decoded.
+        """
+        line = unicode(data.split('\n', 1)[0], 'windows-1252', 'replace')
+        if line[:1] != '0':
+            return False
+        return CodaDecoder().decode(line).creation_date
+
+    def _coda_exists(self, cr, uid, codafilename, coda_creation_date,
+                     context=None):
+        """
+        Lookup via the coda_uniq (name, coda_creation_date) constraint.
+        """
+        cr.execute(
+            "SELECT id FROM account_coda "
+            "WHERE name = %s AND coda_creation_date = %s",
+            (codafilename, coda_creation_date))
+        res = cr.fetchone()
+        return res and res[0] or False
+
+    def spool_scan(self, cr, uid, context=None):
+        """
+        Scan the CODA spool directory and queue the new CODA files.
+
+        Returns the ids of the queued files.
+        """
+        param_obj = self.pool['ir.config_parameter']
+        directory = param_obj.get_param(cr, uid, 'coda.spool.directory')
+        if not directory:
+            _logger.debug("No CODA spool directory configured.")
+            return []
+        if not os.path.isdir(directory):
+            _logger.error(
+                "CODA spool directory %s does not exist.", directory)
+            return []
+
+        cr.execute("SELECT fingerprint FROM account_coda_spool")
+        fingerprints = set([x[0] for x in cr.fetchall()])
+        now = time.strftime(DEFAULT_SERVER_DATETIME_FORMAT)
+        spool_ids = []
+        for filename in sorted(os.listdir(directory)):
+            path = os.path.join(directory, filename)
+            if filename.startswith('.') or not os.path.isfile(path):
+                continue
+            if time.time() - os.path.getmtime(path) < self._min_age:
+                continue
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+            except IOError, e:
+                _logger.error("Unable to read CODA File %s: %s", path, e)
+                continue
+            fingerprint = hashlib.sha1(data).hexdigest()
+            if fingerprint in fingerprints:
+                continue
+            fingerprints.add(fingerprint)
+
+            coda_creation_date = self._read_coda_creation_date(
+                cr, uid, data, context=context)
+            vals = {
+                'name': filename,
+                'path': path,
+                'fingerprint': fingerprint,
+                'file_size': len(data),
+                'coda_creation_date': coda_creation_date,
+                'date_queued': now,
+            }
+            # the fingerprint is the CODA File fingerprint
+            # (cf. coda_hash) of the imported CODA files
+            cr.execute(
+                "SELECT id, name FROM account_coda WHERE coda_hash = %s",
+                (fingerprint,))
+            dup = cr.fetchone()
+            if dup:
+                coda_id = dup[0]
+                note = _(
+                    "CODA File '%s' is identical to CODA File '%s' "
+                    "which has already been imported !") % (filename, dup[1])
+            else:
+                coda_id = coda_creation_date and self._coda_exists(
+                    cr, uid, filename, coda_creation_date, context=context)
+                note = _(
+                    "CODA File with Filename '%s' and Creation Date"
+                    " '%s' has already been imported !") % (
+                        filename, coda_creation_date)
+            if coda_id:
+                vals.update({
+                    'state': 'done',
+                    'err_code': 'W0001',
+                    'note': note,
+                    'coda_id': coda_id,
+                    'date_done': now,
+                })
+            spool_id = self.create(cr, uid, vals, context=context)
+            if not coda_id:
+                spool_ids.append(spool_id)
+        cr.commit()
+        return spool_ids
+
+    def _spool_archive(self, cr, uid, spool, context=None):
+        param_obj = self.pool['ir.config_parameter']
+        archive_dir = param_obj.get_param(
+            cr, uid, 'coda.spool.archive_directory')
+        if not archive_dir:
+            return spool.path
+        try:
+            if not os.path.isdir(archive_dir):
+                os.makedirs(archive_dir)
+            archive_path = os.path.join(archive_dir, spool.name)
+            shutil.move(spool.path, archive_path)
+            return archive_path
+        except (IOError, OSError), e:
+            _logger.error(
+                "Unable to archive CODA File %s: %s", spool.path, e)
+            return spool.path
+
+    def _spool_process(self, cr, uid, spool, context=None):
+        """
+        Import a queued CODA File.
+
+        The CODA File is imported on a separate cursor, hence the
+        queue state remains available when the import fails.
+        """
+        now = time.strftime(DEFAULT_SERVER_DATETIME_FORMAT)
+        spool.write({'state': 'running', 'date_start': now,
+                     'err_code': False, 'note': False})
+        cr.commit()
+
+        start = time.time()
+        try:
+            with open(spool.path, 'rb') as f:
+                data = f.read()
+        except IOError, e:
+            err_code, err_string = 'G0004', _(
+                "\nUnable to read CODA File %s : %s") % (spool.path, e)
+        else:
+            codafile = {
+                'name': spool.name,
+                'data': base64.encodestring(data),
+                # resume a CODA File that has been processed partially
+                'coda_id': spool.coda_creation_date and self._coda_exists(
+                    cr, uid, spool.name, spool.coda_creation_date,
+                    context=context),
+            }
+            cr_spool = self.pool.cursor()
+            try:
+                res = _coda_batch_process(
+                    self.pool, cr_spool, uid, [codafile], context)
+            finally:
+                cr_spool.close()
+            err_code, err_string = res[0][1:]
+
+        vals = {
+            'state': err_code and 'error' or 'done',
+            'err_code': err_code,
+            'note': err_string,
+            'date_done': time.strftime(DEFAULT_SERVER_DATETIME_FORMAT),
+            'duration': time.time() - start,
+        }
+        coda_creation_date = spool.coda_creation_date
+        if not coda_creation_date and not err_code:
+            coda_creation_date = self._read_coda_creation_date(
+                cr, uid, data, context=context)
+        if coda_creation_date:
+            vals['coda_id'] = self._coda_exists(
+                cr, uid, spool.name, coda_creation_date, context=context)
+        if not err_code:
+            vals['path'] = self._spool_archive(
+                cr, uid, spool, context=context)
+        spool.write(vals)
+        cr.commit()
+        return err_code
+
+    def spool_process(self, cr, uid, context=None):
+        """
+        Import the pending CODA files.
+
+        The files are processed in CODA creation date order.
+        Files left in state 'running' by an interrupted import
+        are resumed.
+        """
+        cr.execute(
+            "UPDATE account_coda_spool SET state = 'pending' "
+            "WHERE state = 'running'")
+        spool_ids = self.search(
+            cr, uid, [('state', '=', 'pending')],
+            order='coda_creation_date, name, id', context=context)
+        nb_err = 0
+        start = time.time()
+        for spool in self.browse(cr, uid, spool_ids, context=context):
+            if self._spool_process(cr, uid, spool, context=context):
+                nb_err += 1
+        if spool_ids:
+            _logger.info(
+                "CODA spool: %s files processed, %s errors, %.1f s",
+                len(spool_ids), nb_err, time.time() - start)
+        return True
+
+    def spool_run(self, cr, uid, context=None):
+        """
+        Scheduled action: scan the spool directory
+        and import the pending CODA files.
+        """
+        self.spool_scan(cr, uid, context=context)
+        return self.spool_process(cr, uid, context=context)
+
+    def action_requeue(self, cr, uid, ids, context=None):
+        self.write(
+            cr, uid,
+            [x.id for x in self.browse(cr, uid, ids, context=context)
+             if x.state == 'error'],
+            {'state': 'pending'}, context=context)
+        return True
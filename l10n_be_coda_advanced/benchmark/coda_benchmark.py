@@ -0,0 +1,296 @@
+# -*- encoding: utf-8 -*-
+##############################################################################
+#
+#    Odoo, Open Source Management Solution
+#
+#    Copyright (c) 2010-now Noviat nv/sa (www.noviat.com).
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+##############################################################################
+"""
+Benchmark of the CODA import on a synthetic CODA file.
+
+WARNING: use a disposable database, the benchmark creates partners and
+invoices and the CODA import commits the Bank Statements.
+
+The script seeds the database with partners (with bank accounts) and open
+customer invoices, generates a CODA file for an existing CODA Bank Account
+with transactions matching a part of these invoices and imports the file
+in batch mode, e.g.
+
+    python coda_benchmark.py -c /etc/odoo/openerp-server.conf -d bench \\
+        --statements 5 --lines 500 --invoices 1000 --invoice-ratio 0.5
+
+Reported figures:
+- parse rate: decoding of the CODA records (lines/sec)
+- import rate: end-to-end CODA import (transactions/sec)
+- match rate: transactions with a partner / with a journal entry
+- the phase timings of the import, cf. 'Import Statistics' of the CODA File
+
+The sale orders and payment lines of the database are used as well
+when the l10n_be_coda_sale and l10n_be_coda_pain modules are installed.
+"""
+
+import argparse
+import base64
+import datetime
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from coda_generator import CodaGenerator, bba_checksum, be_iban  # noqa
+
+import openerp  # noqa
+from openerp import api, SUPERUSER_ID  # noqa
+from openerp.modules.registry import RegistryManager  # noqa
+from openerp.addons.l10n_be_coda_advanced.wizard.coda_decoder import \
+    benchmark  # noqa
+
+
+def _get_coda_bank(registry, cr, uid, cba_id):
+    cba_table = registry['coda.bank.account'].get_coda_bank_table(cr, uid)
+    for cbas in cba_table.values():
+        for cba in cbas:
+            if cba['state'] == 'normal' and cba_id in [None, cba['id']]:
+                return cba['acc_number'].replace(' ', ''), cba
+    sys.exit("No CODA Bank Account of type 'normal' found.")
+
+
+def _income_account(registry, cr, uid, company_id):
+    account_obj = registry['account.account']
+    account_ids = account_obj.search(
+        cr, uid, [('type', '=', 'other'),
+                  ('user_type.code', '=', 'income'),
+                  ('company_id', '=', company_id)], limit=1)
+    if not account_ids:
+        account_ids = account_obj.search(
+            cr, uid, [('type', '=', 'other'),
+                      ('company_id', '=', company_id)], limit=1)
+    return account_ids[0]
+
+
+def seed_partners(registry, cr, uid, gen, nb_partners):
+    """
+    Returns a list of (partner_id, (iban, name, bic)).
+    """
+    partner_obj = registry['res.partner']
+    partner_bank_obj = registry['res.partner.bank']
+    res = []
+    for i in xrange(nb_partners):
+        bban = '%010d' % gen.rnd.randint(0, 10 ** 10 - 1)
+        iban = be_iban(bba_checksum(bban))
+        name = 'CODA BENCH %s' % iban[4:]
+        partner_id = partner_obj.create(
+            cr, uid, {'name': name, 'is_company': True, 'customer': True})
+        partner_bank_obj.create(
+            cr, uid, {'partner_id': partner_id, 'state': 'iban',
+                      'acc_number': iban})
+        res.append((partner_id, (iban, name, 'GKCCBEBB')))
+    return res
+
+
+def seed_invoices(registry, cr, uid, gen, partners, company_id,
+                  nb_invoices):
+    """
+    Creates open customer invoices, with a BBA Structured Communication
+    when the l10n_be_invoice_bba module is installed.
+    """
+    inv_obj = registry['account.invoice']
+    partner_obj = registry['res.partner']
+    ref_types = inv_obj.fields_get(
+        cr, uid, ['reference_type'])['reference_type']['selection']
+    bba = 'bba' in [x[0] for x in ref_types]
+    account_id = _income_account(registry, cr, uid, company_id)
+    ctx = {'type': 'out_invoice'}
+    res = []
+    for i in xrange(nb_invoices):
+        partner_id, counterparty = gen.rnd.choice(partners)
+        partner = partner_obj.browse(cr, uid, partner_id)
+        amount = round(gen.rnd.uniform(10, 10000), 2)
+        vals = {
+            'type': 'out_invoice',
+            'partner_id': partner_id,
+            'account_id': partner.property_account_receivable.id,
+            'company_id': company_id,
+            'invoice_line': [(0, 0, {
+                'name': 'CODA benchmark',
+                'account_id': account_id,
+                'quantity': 1.0,
+                'price_unit': amount})],
+        }
+        digits = None
+        if bba:
+            digits = bba_checksum('%010d' % gen.rnd.randint(0, 10 ** 10 - 1))
+            vals.update({
+                'reference_type': 'bba',
+                'reference': '+++%s/%s/%s+++' % (
+                    digits[:3], digits[3:7], digits[7:])})
+        inv_id = inv_obj.create(cr, uid, vals, context=ctx)
+        inv_obj.signal_workflow(cr, uid, [inv_id], 'invoice_open')
+        inv = inv_obj.browse(cr, uid, inv_id)
+        res.append({'bba': digits, 'number': inv.number,
+                    'amount': inv.residual, 'counterparty': counterparty})
+    return res
+
+
+def existing_sale_orders(registry, cr, uid, limit):
+    if 'sale.order' not in registry:
+        return []
+    so_obj = registry['sale.order']
+    so_ids = so_obj.search(
+        cr, uid, [('state', 'not in', ['draft', 'sent', 'cancel'])],
+        limit=limit)
+    return [{'name': x.name, 'amount': x.amount_total}
+            for x in so_obj.browse(cr, uid, so_ids)]
+
+
+def existing_payment_lines(registry, cr, uid, limit):
+    if 'payment.line' not in registry:
+        return []
+    pl_obj = registry['payment.line']
+    pl_ids = pl_obj.search(
+        cr, uid, [('order_id.state', '=', 'done')], limit=limit)
+    return [{'name': x.name, 'amount': x.amount_currency,
+             'communication': x.communication}
+            for x in pl_obj.browse(cr, uid, pl_ids)]
+
+
+def match_stats(cr, coda_id):
+    cr.execute(
+        "SELECT count(*), count(absl.partner_id), "
+        "count(absl.journal_entry_id) "
+        "FROM account_bank_statement_line absl "
+        "JOIN account_bank_statement abs ON abs.id = absl.statement_id "
+        "WHERE abs.coda_id = %s", (coda_id,))
+    return cr.fetchone()
+
+
+def run(args):
+    registry = RegistryManager.get(args.database)
+    uid = SUPERUSER_ID
+    gen = CodaGenerator(seed=args.seed)
+    with api.Environment.manage():
+        cr = registry.cursor()
+        try:
+            acc_number, cba = _get_coda_bank(registry, cr, uid, args.cba)
+            gen.acc_number = acc_number
+            gen.currency = cba['currency_name']
+            gen.description = cba['description1'] or ''
+            company_id = cba['company_id'][0]
+            cr.execute(
+                "SELECT balance_end_real FROM account_bank_statement "
+                "WHERE journal_id = %s ORDER BY date DESC, id DESC LIMIT 1",
+                (cba['journal_id'][0],))
+            res = cr.fetchone()
+            gen.balance = res and res[0] or 0.0
+
+            start = time.time()
+            partners = seed_partners(registry, cr, uid, gen, args.partners)
+            invoices = seed_invoices(
+                registry, cr, uid, gen, partners, company_id, args.invoices)
+            sale_orders = existing_sale_orders(
+                registry, cr, uid, args.invoices)
+            payment_lines = existing_payment_lines(
+                registry, cr, uid, args.invoices)
+            cr.commit()
+            sys.stdout.write(
+                "Seeded %s partners, %s invoices in %.1f s, "
+                "%s sale orders, %s payment lines available\n" % (
+                    len(partners), len(invoices), time.time() - start,
+                    len(sale_orders), len(payment_lines)))
+
+            lines = gen.coda_file(
+                nb_statements=args.statements, nb_lines=args.lines,
+                glob_depth=args.glob_depth, glob_ratio=args.glob_ratio,
+                invoices=invoices, invoice_ratio=args.invoice_ratio,
+                sale_orders=sale_orders,
+                sale_order_ratio=args.sale_order_ratio,
+                payment_lines=payment_lines,
+                payment_line_ratio=args.payment_line_ratio,
+                counterparties=[x[1] for x in partners])
+            data = CodaGenerator.to_string(lines)
+            if args.output:
+                with open(args.output, 'wb') as f:
+                    f.write(data)
+            sys.stdout.write("Generated: %s\n" % ', '.join(
+                ['%s: %s' % x for x in sorted(gen.stats.items())]))
+
+            nb_lines, rate = benchmark(
+                [unicode(x, 'windows-1252') for x in lines], 10)
+            sys.stdout.write("Parse rate: %.0f lines/sec\n" % rate)
+
+            codafilename = 'coda_benchmark_%s.cod' % \
+                datetime.datetime.now().strftime('%Y%m%d%H%M%S')
+            ctx = {}
+            if args.deferred_reconcile:
+                ctx['coda_deferred_reconcile'] = True
+            start = time.time()
+            res = registry['account.coda.import'].coda_parsing(
+                cr, uid, [], context=ctx,
+                codafile=base64.encodestring(data),
+                codafilename=codafilename, batch=True)
+            duration = time.time() - start
+            cr.commit()
+            if res:
+                sys.stdout.write("Import error %s: %s\n" % res)
+
+            nb_trans = gen.stats.get('lines', 0)
+            sys.stdout.write(
+                "Import: %s transactions in %.1f s, %.1f transactions/sec\n"
+                % (nb_trans, duration, duration and nb_trans / duration))
+            coda_obj = registry['account.coda']
+            coda_ids = coda_obj.search(cr, uid, [('name', '=', codafilename)])
+            if coda_ids:
+                nb, nb_partner, nb_move = match_stats(cr, coda_ids[0])
+                nb = nb or 1
+                sys.stdout.write(
+                    "Match rate: partner %.1f%%, journal entry %.1f%%\n"
+                    % (100.0 * nb_partner / nb, 100.0 * nb_move / nb))
+                coda = coda_obj.browse(cr, uid, coda_ids[0])
+                sys.stdout.write("%s\n" % (coda.import_stats or ''))
+        finally:
+            cr.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='CODA import benchmark (disposable database only).')
+    parser.add_argument('-c', '--config', required=True,
+                        help='Odoo configuration file')
+    parser.add_argument('-d', '--database', required=True)
+    parser.add_argument('--cba', type=int, default=None,
+                        help='CODA Bank Account id')
+    parser.add_argument('--statements', type=int, default=1)
+    parser.add_argument('--lines', type=int, default=200,
+                        help='transactions per statement')
+    parser.add_argument('--glob-depth', type=int, default=0)
+    parser.add_argument('--glob-ratio', type=float, default=0.1)
+    parser.add_argument('--partners', type=int, default=100)
+    parser.add_argument('--invoices', type=int, default=200)
+    parser.add_argument('--invoice-ratio', type=float, default=0.5)
+    parser.add_argument('--sale-order-ratio', type=float, default=0.0)
+    parser.add_argument('--payment-line-ratio', type=float, default=0.0)
+    parser.add_argument('--deferred-reconcile', action='store_true')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--output', help='save the generated CODA file')
+    args = parser.parse_args()
+    openerp.tools.config.parse_config(
+        ['-c', args.config, '-d', args.database])
+    run(args)
+
+
+if __name__ == '__main__':
+    main()
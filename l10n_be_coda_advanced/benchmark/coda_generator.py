@@ -0,0 +1,386 @@
+# -*- encoding: utf-8 -*-
+##############################################################################
+#
+#    Odoo, Open Source Management Solution
+#
+#    Copyright (c) 2010-now Noviat nv/sa (www.noviat.com).
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+##############################################################################
+"""
+Generator of synthetic CODA V2 files.
+
+This module has no Odoo dependencies, e.g.
+
+    python coda_generator.py out.cod --statements 5 --lines 200 \\
+        --glob-depth 2 --glob-ratio 0.1
+
+The generated transactions can be matched with open invoices, sale orders
+and payment lines of a database, cf. the 'invoices', 'sale_orders' and
+'payment_lines' arguments of CodaGenerator.coda_file and the
+coda_benchmark.py script.
+"""
+
+import argparse
+import datetime
+import random
+import sys
+
+# transaction codes (type, family, code, category)
+TRANS_CODE_CREDIT = ('0', '01', '50', '000')
+TRANS_CODE_DEBIT = ('0', '01', '01', '000')
+# globalisation: amount globalised by the customer and its details
+TRANS_TYPE_GLOB = '1'
+TRANS_TYPE_GLOB_DETAIL = '5'
+
+COMM_TYPES = ['101', '102', '105']
+
+
+def _fmt(value, width):
+    value = value or ''
+    if len(value) > width:
+        return value[:width]
+    return value.ljust(width)
+
+
+def _amount(amount):
+    """ Returns (sign, 15 digits amount with 3 decimals). """
+    return (amount < 0 and '1' or '0',
+            '%015d' % int(round(abs(amount) * 1000)))
+
+
+def _date(date):
+    return date.strftime('%d%m%y')
+
+
+def _record(*parts):
+    line = ''.join(parts)
+    assert len(line) == 128, 'invalid record length %s: %r' % (
+        len(line), line)
+    return line
+
+
+def bba_checksum(digits):
+    """ Returns the 12 digits Belgian structured communication. """
+    digits = digits[:10].rjust(10, '0')
+    mod = int(digits) % 97 or 97
+    return digits + '%02d' % mod
+
+
+def be_iban(bban):
+    """ Returns the Belgian IBAN of a 12 digits BBAN. """
+    # 'BE' = 1114, followed by '00' for the check digit calculation
+    kk = 98 - int(bban + '111400') % 97
+    return 'BE%02d%s' % (kk, bban)
+
+
+def random_bban(rnd):
+    digits = '%010d' % rnd.randint(0, 10 ** 10 - 1)
+    mod = int(digits) % 97 or 97
+    return digits + '%02d' % mod
+
+
+class CodaGenerator(object):
+    """
+    Generator of CODA V2 files for a single bank account.
+    """
+
+    def __init__(self, acc_number='BE33737018595246', currency='EUR',
+                 acc_holder='NOVIAT NV', description='', bic='KREDBEBB',
+                 seed=None):
+        self.acc_number = acc_number
+        self.currency = currency
+        self.acc_holder = acc_holder
+        self.description = description
+        self.bic = bic
+        self.rnd = random.Random(seed)
+        self.coda_seq_number = 0
+        self.balance = 0.0
+        self.stats = {}
+
+    def _stat(self, key, nb=1):
+        self.stats[key] = self.stats.get(key, 0) + nb
+
+    def _counterparty(self, counterparties):
+        if counterparties:
+            return self.rnd.choice(counterparties)
+        bban = random_bban(self.rnd)
+        return (be_iban(bban), 'PARTNER %s' % bban[:6], 'GKCCBEBB')
+
+    def _random_comm(self, comm_types, structured_ratio):
+        """ Returns (structured flag, communication) """
+        rnd = self.rnd
+        if comm_types and rnd.random() < structured_ratio:
+            comm_type = rnd.choice(comm_types)
+            if comm_type in ['101', '102']:
+                comm = bba_checksum('%010d' % rnd.randint(0, 10 ** 10 - 1))
+            elif comm_type == '105':
+                amount = rnd.randint(100, 10 ** 6)
+                comm = '%015d%015d%012d%s%s%s%015d' % (
+                    amount * 10, amount * 11, 110000000, 'USD',
+                    _fmt('', 12), 'US', amount * 10)
+            else:
+                comm = _fmt('', 50)
+            self._stat('comm_%s' % comm_type)
+            return '1', comm_type + comm
+        self._stat('comm_free')
+        return '0', 'PAYMENT %s' % rnd.randint(1, 10 ** 8)
+
+    def _leaf(self, kind, refs, comm_types, structured_ratio):
+        """
+        Returns a transaction dictionary.
+        kind: 'invoice', 'sale_order', 'payment_line' or None
+        """
+        rnd = self.rnd
+        leaf = {'payment_reference': '', 'kind': kind}
+        ref = kind and refs.pop() or {}
+        leaf['counterparty'] = ref.get('counterparty')
+        if kind == 'invoice':
+            leaf['amount'] = ref['amount']
+            if ref.get('bba'):
+                leaf['comm_flag'] = '1'
+                leaf['comm'] = '101' + ref['bba']
+            else:
+                leaf['comm_flag'] = '0'
+                leaf['comm'] = ref['number']
+        elif kind == 'sale_order':
+            leaf['amount'] = ref['amount']
+            leaf['comm_flag'] = '0'
+            leaf['comm'] = 'ORDER %s' % ref['name']
+        elif kind == 'payment_line':
+            leaf['amount'] = -abs(ref['amount'])
+            leaf['comm_flag'] = '0'
+            leaf['comm'] = ref.get('communication') or 'PAYMENT'
+            leaf['payment_reference'] = ref['name']
+        else:
+            leaf['amount'] = round(
+                rnd.choice([1, 1, -1]) * rnd.uniform(1, 5000), 2)
+            leaf['comm_flag'], leaf['comm'] = self._random_comm(
+                comm_types, structured_ratio)
+        if kind:
+            self._stat('match_%s' % kind)
+        return leaf
+
+    def _record_21(self, ref_move, detail, amount, trans_code, comm_flag,
+                   comm, date, glob_code, paper_seq, next_code):
+        sign, amount = _amount(amount)
+        bank_ref = 'GEN%018d' % self.rnd.randint(0, 10 ** 18 - 1)
+        return _record(
+            '21', '%04d' % ref_move, '%04d' % detail, bank_ref,
+            sign, amount, _date(date), ''.join(trans_code), comm_flag,
+            _fmt(comm, 53), _date(date), '%03d' % paper_seq,
+            str(glob_code), next_code, ' ', '0')
+
+    def _leaf_records(self, leaf, ref_move, detail, trans_type, date,
+                      glob_code, paper_seq, counterparties):
+        trans_code = leaf['amount'] < 0 and TRANS_CODE_DEBIT \
+            or TRANS_CODE_CREDIT
+        trans_code = (trans_type,) + trans_code[1:]
+        comm = leaf['comm']
+        iban, name, bic = leaf['counterparty'] \
+            or self._counterparty(counterparties)
+        records = [self._record_21(
+            ref_move, detail, leaf['amount'], trans_code, leaf['comm_flag'],
+            comm[:53], date, glob_code, paper_seq, '1')]
+        ref = '%04d%04d' % (ref_move, detail)
+        records.append(_record(
+            '22', ref, _fmt(comm[53:106], 53),
+            _fmt(leaf['payment_reference'], 35), _fmt(bic, 11), '   ',
+            ' ', '    ', '    ', '    ', '1', ' ', '0'))
+        records.append(_record(
+            '23', ref, _fmt(iban, 34), _fmt(self.currency, 3),
+            _fmt(name, 35), _fmt(comm[106:149], 43), '0', ' ', '0'))
+        self._stat('lines')
+        return records
+
+    def _glob_records(self, leaves, level, ref_move, detail, date,
+                      paper_seq, counterparties):
+        """
+        Records of a globalisation of level 'level', the levels
+        below are nested in the first half of the details.
+        Returns (records, next detail number).
+        """
+        total = round(sum([x['amount'] for x in leaves]), 2)
+        trans_code = total < 0 and TRANS_CODE_DEBIT or TRANS_CODE_CREDIT
+        trans_code = (TRANS_TYPE_GLOB,) + trans_code[1:]
+        records = [self._record_21(
+            ref_move, detail, total, trans_code, '0',
+            'GLOBALISATION LEVEL %s' % level, date, level, paper_seq, '0')]
+        detail += 1
+        self._stat('globalisations')
+        if level > 1 and len(leaves) > 3:
+            half = len(leaves) // 2
+            res, detail = self._glob_records(
+                leaves[:half], level - 1, ref_move, detail, date,
+                paper_seq, counterparties)
+            records += res
+            leaves = leaves[half:]
+        for i, leaf in enumerate(leaves):
+            glob_code = i == len(leaves) - 1 and level or 0
+            records += self._leaf_records(
+                leaf, ref_move, detail, TRANS_TYPE_GLOB_DETAIL, date,
+                glob_code, paper_seq, counterparties)
+            detail += 1
+        return records, detail
+
+    def statement(self, date, nb_lines=100, glob_depth=0, glob_ratio=0.1,
+                  glob_size=5, comm_types=None, structured_ratio=0.5,
+                  invoices=None, invoice_ratio=0.0,
+                  sale_orders=None, sale_order_ratio=0.0,
+                  payment_lines=None, payment_line_ratio=0.0,
+                  counterparties=None):
+        """
+        Returns the records 1, 2.x, 8 of a statement with 'nb_lines'
+        transactions.
+
+        invoices: list of dicts with keys 'amount' and
+          'bba' (12 digits structured communication) or 'number'
+        sale_orders: list of dicts with keys 'name' and 'amount'
+        payment_lines: list of dicts with keys 'name' and 'amount'
+        The dicts are removed from the lists once used, an optional
+        'counterparty' key (iban, name, bic) sets the counterparty.
+        counterparties: list of (iban, name, bic) tuples for the other
+          transactions
+        """
+        rnd = self.rnd
+        comm_types = comm_types is None and COMM_TYPES or comm_types
+        self.coda_seq_number += 1
+        paper_seq = self.coda_seq_number % 1000
+
+        refs = {'invoice': invoices or [], 'sale_order': sale_orders or [],
+                'payment_line': payment_lines or []}
+        ratios = [('invoice', invoice_ratio),
+                  ('sale_order', sale_order_ratio),
+                  ('payment_line', payment_line_ratio)]
+        leaves = []
+        for i in xrange(nb_lines):
+            r = rnd.random()
+            kind = None
+            for key, ratio in ratios:
+                if r < ratio:
+                    kind = refs[key] and key or None
+                    break
+                r -= ratio
+            leaves.append(self._leaf(
+                kind, refs.get(kind), comm_types, structured_ratio))
+
+        balance_start = self.balance
+        records = []
+        ref_move = 0
+        i = 0
+        while i < len(leaves):
+            ref_move += 1
+            if glob_depth and glob_size > 1 and rnd.random() < glob_ratio:
+                size = max(2, glob_size * glob_depth)
+                res, detail = self._glob_records(
+                    leaves[i:i + size], glob_depth, ref_move, 0, date,
+                    paper_seq, counterparties)
+                records += res
+                i += size
+            else:
+                records += self._leaf_records(
+                    leaves[i], ref_move, 0, '0', date, 0, paper_seq,
+                    counterparties)
+                i += 1
+        self.balance = round(
+            balance_start + sum([x['amount'] for x in leaves]), 2)
+        self.debit = sum([-x['amount'] for x in leaves if x['amount'] < 0])
+        self.credit = sum([x['amount'] for x in leaves if x['amount'] > 0])
+
+        sign, amount = _amount(balance_start)
+        old_date = date - datetime.timedelta(days=1)
+        header = _record(
+            '1', '2', '%03d' % paper_seq, _fmt(self.acc_number, 34),
+            self.currency, sign, amount, _date(old_date),
+            _fmt(self.acc_holder, 26), _fmt(self.description, 35),
+            '%03d' % paper_seq)
+        sign, amount = _amount(self.balance)
+        trailer = _record(
+            '8', '%03d' % paper_seq,
+            _fmt(self.acc_number, 34) + self.currency, sign, amount,
+            _date(date), _fmt('', 64), '0')
+        self._stat('statements')
+        return [header] + records + [trailer]
+
+    def coda_file(self, creation_date=None, nb_statements=1, **kwargs):
+        """
+        Returns the lines of a CODA file with 'nb_statements' statements,
+        cf. statement() for the other arguments.
+        """
+        creation_date = creation_date or datetime.date.today()
+        lines = []
+        for i in xrange(nb_statements):
+            date = creation_date - datetime.timedelta(
+                days=nb_statements - i - 1)
+            records = self.statement(date, **kwargs)
+            nb_records = len(records)
+            header = _record(
+                '0', '0000', _date(date), '725', '05', ' ', _fmt('', 7),
+                _fmt('BENCH', 10), _fmt(self.acc_holder, 26),
+                _fmt(self.bic, 11), _fmt('', 11), ' ', '00000',
+                _fmt('', 16), _fmt('', 16), _fmt('', 7), '2')
+            trailer = _record(
+                '9', _fmt('', 15), '%06d' % nb_records,
+                _amount(self.debit)[1], _amount(self.credit)[1],
+                _fmt('', 75), '2')
+            lines += [header] + records + [trailer]
+        return lines
+
+    @staticmethod
+    def to_string(lines):
+        return '\r\n'.join(lines) + '\r\n'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Generate a synthetic CODA V2 file.')
+    parser.add_argument('output', help="output file, '-' for stdout")
+    parser.add_argument('--statements', type=int, default=1)
+    parser.add_argument('--lines', type=int, default=100,
+                        help='transactions per statement')
+    parser.add_argument('--glob-depth', type=int, default=0,
+                        help='globalisation depth (0 = no globalisation)')
+    parser.add_argument('--glob-ratio', type=float, default=0.1,
+                        help='ratio of globalised movements')
+    parser.add_argument('--glob-size', type=int, default=5,
+                        help='details per globalisation level')
+    parser.add_argument('--comm-types', default=','.join(COMM_TYPES),
+                        help='structured communication types')
+    parser.add_argument('--structured-ratio', type=float, default=0.5)
+    parser.add_argument('--acc-number', default='BE33737018595246')
+    parser.add_argument('--currency', default='EUR')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    gen = CodaGenerator(acc_number=args.acc_number, currency=args.currency,
+                        seed=args.seed)
+    lines = gen.coda_file(
+        nb_statements=args.statements, nb_lines=args.lines,
+        glob_depth=args.glob_depth, glob_ratio=args.glob_ratio,
+        glob_size=args.glob_size,
+        comm_types=[x for x in args.comm_types.split(',') if x],
+        structured_ratio=args.structured_ratio)
+    data = CodaGenerator.to_string(lines)
+    if args.output == '-':
+        sys.stdout.write(data)
+    else:
+        with open(args.output, 'wb') as f:
+            f.write(data)
+    sys.stderr.write('%s\n' % ', '.join(
+        ['%s: %s' % x for x in sorted(gen.stats.items())]))
+
+
+if __name__ == '__main__':
+    main()
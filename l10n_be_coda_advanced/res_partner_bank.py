@@ -0,0 +1,40 @@
+# -*- encoding: utf-8 -*-
+##############################################################################
+#
+#    Odoo, Open Source Management Solution
+#
+#    Copyright (c) 2010-now Noviat nv/sa (www.noviat.com).
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+from openerp import models, api
+
+
+class res_partner_bank(models.Model):
+    _inherit = 'res.partner.bank'
+
+    @api.multi
+    def write(self, vals):
+        if 'acc_number' in vals:
+            # the bank account number is cached
+            # in the CODA Bank Account table
+            self.env['coda.bank.account'].clear_caches()
+        return super(res_partner_bank, self).write(vals)
+
+    @api.multi
+    def unlink(self):
+        self.env['coda.bank.account'].clear_caches()
+        return super(res_partner_bank, self).unlink()
@@ -0,0 +1,62 @@
+# -*- encoding: utf-8 -*-
+##############################################################################
+#
+#    Odoo, Open Source Management Solution
+#
+#    Copyright (c) 2010-now Noviat nv/sa (www.noviat.com).
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+from openerp.tests import common
+
+from openerp.addons.l10n_be_coda_advanced.wizard.coda_decoder \
+    import CodaDecoder
+
+RECORD_0 = \
+    '0000011011172505        00178299  DE MEYER LUC              ' \
+    'KREDBEBB   00820512013 00000                                       2'
+RECORD_1 = \
+    '1%s135BE33737018595246                  EUR0000000011812700270710' \
+    'NOVIAT NV                 KBC-Business Comfortrekening       003'
+
+
+class TestCodaDecoder(common.TransactionCase):
+
+    def setUp(self):
+        super(TestCodaDecoder, self).setUp()
+        self.coda_import = self.registry('account.coda.import')
+        self.decode = CodaDecoder().decode
+        self.decode(RECORD_0)
+
+    def test_record_1(self):
+        record = self.decode(RECORD_1 % '2')
+        self.assertEqual(record.acc_structure, '2')
+        self.assertEqual(record.acc_number, 'BE33737018595246')
+        self.assertEqual(record.currency, 'EUR')
+
+    def test_record_1_unsupported_acc_structure(self):
+        record = self.decode(RECORD_1 % '4')
+        self.assertEqual(record.record_type, '1')
+        self.assertEqual(record.acc_structure, '4')
+        batch = getattr(self.coda_import, '_batch', False)
+        self.coda_import._batch = True
+        try:
+            res = self.coda_import._coda_record_1(
+                self.cr, self.uid, {'coda_version': '2'}, record, '', {},
+                context={})
+        finally:
+            self.coda_import._batch = batch
+        self.assertEqual(res[0], 'R1003')
@@ -21,3 +21,4 @@
 ##############################################################################
 
 from . import coda_import
+from . import coda_batch_import
@@ -0,0 +1,291 @@
+# -*- encoding: utf-8 -*-
+##############################################################################
+#
+#    Odoo, Open Source Management Solution
+#
+#    Copyright (c) 2010-now Noviat nv/sa (www.noviat.com).
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+from openerp.osv import orm, fields
+from openerp.tools.translate import _
+from openerp import api
+from openerp.addons.l10n_be_coda_advanced.wizard.coda_helpers import \
+    coda_records
+from openerp.addons.l10n_be_coda_advanced.wizard.coda_decoder import \
+    CodaDecoder
+import multiprocessing
+import Queue
+import threading
+import time
+from traceback import format_exception
+from sys import exc_info
+import logging
+_logger = logging.getLogger(__name__)
+
+
+def _coda_batch_worker(registry, uid, context, groups, results):
+    """
+    Process groups of CODA files in a worker thread.
+
+    The worker takes the groups from the 'groups' queue until it is
+    empty and uses its own cursor of the registry connection pool.
+    """
+    threading.current_thread().dbname = registry.db_name
+    with api.Environment.manage():
+        try:
+            cr = registry.cursor()
+        except Exception, e:
+            # e.g. db_maxconn reached, the groups are left to the
+            # other workers
+            _logger.error("CODA batch import worker failed: %s", e)
+            return
+        try:
+            while True:
+                try:
+                    group = groups.get_nowait()
+                except Queue.Empty:
+                    break
+                results.extend(_coda_batch_process(
+                    registry, cr, uid, group, context))
+        finally:
+            cr.close()
+
+
+def _coda_batch_process(registry, cr, uid, group, context):
+    """
+    Process the CODA files of a group in sequence.
+
+    Returns a list of (filename, err_code, err_string) tuples.
+    """
+    import_obj = registry['account.coda.import']
+    results = []
+    for codafile in group:
+        ctx = dict(context)
+        if codafile.get('coda_id'):
+            ctx['coda_id'] = codafile['coda_id']
+        try:
+            res = import_obj.coda_parsing(
+                cr, uid, [], context=ctx,
+                codafile=codafile['data'], codafilename=codafile['name'],
+                batch=True)
+        except Exception, e:
+            cr.rollback()
+            tb = ''.join(format_exception(*exc_info()))
+            _logger.error(
+                "Error while processing CODA File %s\n%s",
+                codafile['name'], tb)
+            res = ('G0003', _('\nSystem Error : ') + str(e))
+        err_code, err_string = res or (None, None)
+        results.append((codafile['name'], err_code, err_string))
+    return results
+
+
+class account_coda_batch_import(orm.TransientModel):
+    _name = 'account.coda.batch.import'
+    _description = 'CODA Batch Import'
+    _columns = {
+        'coda_ids': fields.many2many(
+            'account.coda', string='CODA Files',
+            domain=[('state', '=', 'draft')]),
+        'nb_workers': fields.integer(
+            'Number of Workers',
+            help="Number of threads that import CODA Files in parallel."
+                 "\nThe CODA Files of the same Bank Journal are always "
+                 "processed in sequence."),
+        'note': fields.text('Log', readonly=True),
+    }
+
+    def _default_coda_ids(self, cr, uid, context=None):
+        if context and context.get('active_model') == 'account.coda':
+            return context.get('active_ids', [])
+        return []
+
+    def _default_nb_workers(self, cr, uid, context=None):
+        return int(self.pool['ir.config_parameter'].get_param(
+            cr, uid, 'coda.batch.workers',
+            default=multiprocessing.cpu_count()))
+
+    _defaults = {
+        'coda_ids': _default_coda_ids,
+        'nb_workers': _default_nb_workers,
+    }
+
+    def _get_file_journals(self, cr, uid, codafile, coda_bank_table,
+                           context=None):
+        """
+        Returns the journals (or CODA Bank Accounts without journal)
+        of the statements in a CODA file and the key
+        to sort the CODA files of the same journal.
+        """
+        decode = CodaDecoder().decode
+        version = '2'
+        journals = set()
+        creation_date = coda_seq_number = ''
+        for line in coda_records(codafile):
+            if not line or line[0] not in '01':
+                continue
+            record = decode(line)
+            if line[0] == '0':
+                version = record.version
+                creation_date = creation_date or record.creation_date or ''
+                continue
+            currency = record.currency
+            if version == '1' and not currency.strip():
+                currency = 'EUR'
+            cbas = [
+                x for x in coda_bank_table.get(record.acc_number, [])
+                if x['currency_name'] == currency
+                and record.description in [x['description1'] or '',
+                                           x['description2'] or '']]
+            if cbas:
+                cba = cbas[0]
+                journals.add(
+                    cba['journal_id'] and ('journal', cba['journal_id'][0])
+                    or ('cba', cba['id']))
+            coda_seq_number = coda_seq_number or record.coda_seq_number
+        return journals, (creation_date, coda_seq_number)
+
+    def _group_coda_files(self, cr, uid, codafiles, context=None):
+        """
+        Group the CODA files that have a journal in common.
+        The files within a group are sorted on
+        CODA creation date and CODA sequence number.
+        """
+        cba_obj = self.pool['coda.bank.account']
+        coda_bank_table = cba_obj.get_coda_bank_table(
+            cr, uid, context=context)
+        groups = []
+        for codafile in codafiles:
+            try:
+                journals, sort_key = self._get_file_journals(
+                    cr, uid, codafile['data'], coda_bank_table,
+                    context=context)
+            except Exception:
+                # errors are reported by the import of the file
+                journals, sort_key = set(), ('', '')
+            codafile['sort_key'] = sort_key
+            group = {'journals': journals, 'files': [codafile]}
+            for other in groups[:]:
+                if other['journals'] & journals:
+                    group['journals'] |= other['journals']
+                    group['files'] += other['files']
+                    groups.remove(other)
+            groups.append(group)
+        res = []
+        for group in groups:
+            res.append(sorted(group['files'], key=lambda x: x['sort_key']))
+        # start with the largest groups
+        res.sort(key=lambda x: -len(x))
+        return res
+
+    def coda_batch_import(self, cr, uid, codafiles, nb_workers=None,
+                          context=None):
+        """
+        Import a set of CODA files.
+
+        codafiles: list of dictionaries with keys
+          - 'name': CODA filename
+          - 'data': base64 encoded CODA file
+          - 'coda_id': (optional) account.coda record in state 'draft'
+
+        The CODA files are processed by a pool of worker threads,
+        every worker has its own database cursor.
+        CODA files with statements of the same journal are processed
+        by the same worker, in CODA sequence number order.
+
+        Returns a list of (filename, err_code, err_string) tuples,
+        err_code is None when the file has been imported successfully.
+        """
+        if context is None:
+            context = {}
+        groups = self._group_coda_files(cr, uid, codafiles, context=context)
+        if nb_workers is None:
+            nb_workers = self._default_nb_workers(cr, uid, context=context)
+        nb_workers = max(1, min(nb_workers, len(groups)))
+        ctx = dict(context)
+        ctx.pop('active_ids', None)
+        ctx.pop('active_model', None)
+
+        results = []
+        queue = Queue.Queue()
+        for group in groups:
+            queue.put(group)
+        if nb_workers == 1:
+            _coda_batch_worker(self.pool, uid, ctx, queue, results)
+        else:
+            workers = [
+                threading.Thread(
+                    target=_coda_batch_worker,
+                    name='coda_batch_import_%s' % i,
+                    args=(self.pool, uid, ctx, queue, results))
+                for i in range(nb_workers)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        while not queue.empty():
+            # no worker could get a cursor
+            for codafile in queue.get_nowait():
+                results.append((
+                    codafile['name'], 'G0003',
+                    _('\nSystem Error : ') + _(
+                        "No database connection available.")))
+        return results
+
+    def action_import(self, cr, uid, ids, context=None):
+        mod_obj = self.pool['ir.model.data']
+        wiz = self.browse(cr, uid, ids[0], context=context)
+
+        codafiles = [
+            {'name': coda.name, 'data': coda.coda_data, 'coda_id': coda.id}
+            for coda in wiz.coda_ids if coda.state == 'draft']
+        start = time.time()
+        results = self.coda_batch_import(
+            cr, uid, codafiles, nb_workers=wiz.nb_workers or None,
+            context=context)
+        duration = time.time() - start
+        nb_err = len([x for x in results if x[1]])
+
+        note = '>>> ' + time.strftime('%Y-%m-%d %H:%M:%S') + ' '
+        note += _("CODA Batch Import")
+        for codafilename, err_code, err_string in sorted(results):
+            if err_code:
+                note += '\n\n%s: ' % codafilename + _("Error") \
+                    + ' %s%s' % (err_code, err_string)
+            else:
+                note += '\n\n%s: OK' % codafilename
+        note += '\n\n' + _("Number of files processed") \
+            + ' : %s' % len(results)
+        note += '\n' + _("Number of errors") + ' : %s' % nb_err
+        note += '\n' + _("Duration") + ' : %.1f s' % duration
+        self.write(cr, uid, ids, {'note': note}, context=context)
+
+        result_view = mod_obj.get_object(
+            cr, uid,
+            'l10n_be_coda_advanced',
+            'account_coda_batch_import_result_view')
+
+        return {
+            'name': _('CODA Batch Import'),
+            'res_id': ids[0],
+            'view_type': 'form',
+            'view_mode': 'form',
+            'res_model': 'account.coda.batch.import',
+            'view_id': result_view.id,
+            'target': 'new',
+            'type': 'ir.actions.act_window',
+        }
@@ -0,0 +1,604 @@
+# -*- encoding: utf-8 -*-
+##############################################################################
+#
+#    Odoo, Open Source Management Solution
+#
+#    Copyright (c) 2010-now Noviat nv/sa (www.noviat.com).
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+##############################################################################
+"""
+Decoding of the CODA Structured Format Communications.
+
+The decoders are registered per Structured Communication Type code,
+cf. register_comm_decoder.
+
+A decoder is called as decoder(comm, line, desc, t) with
+- comm: the structured communication
+- line: the CODA statement line
+- desc: the description of the Structured Communication Type
+- t: dictionary with the translated texts, cf. comm_labels
+
+and returns a (name, rows) tuple with
+- name: the transaction name
+- rows: the communication as a list of (label, value) tuples,
+  the first row being the title. Rows with value None
+  are rendered without value. A string is returned as is.
+
+The translated texts are built once per CODA import, hence the per line
+cost is limited to the slicing of the communication.
+"""
+
+from openerp.addons.l10n_be_coda_advanced.wizard.coda_decoder import \
+    str2date, str2time, list2float, number2float
+from openerp.addons.l10n_be_coda_advanced.wizard.coda_helpers import \
+    check_bban
+
+indent = '\n' + 8*' '
+st_line_name_families = ['13', '35', '41', '80']
+
+# Structured Communication Types of movement and information records
+COMM_MOVE_DECODERS = {}
+COMM_INFO_DECODERS = {}
+
+
+def register_comm_decoder(codes, decoder, info=False):
+    """
+    Register the decoder of Structured Communication Types 'codes'
+    for the movement records (info=False) or
+    the information records (info=True).
+    """
+    decoders = COMM_INFO_DECODERS if info else COMM_MOVE_DECODERS
+    if isinstance(codes, basestring):
+        codes = [codes]
+    for code in codes:
+        decoders[code] = decoder
+
+
+def render_comm(rows):
+    if isinstance(rows, basestring):
+        return rows
+    return '\n' + ''.join([
+        indent + (value is None and label or label + ': ' + value)
+        for label, value in rows])
+
+
+def comm_labels(_):
+    """
+    Returns the translated texts of the communication decoders.
+
+    _: function returning the translation of a source text,
+    the texts are marked with _() for the extraction of the terms.
+    """
+    return {
+        # 100
+        'Payment with ISO 11649 structured format communication': _(
+            "Payment with ISO 11649 structured format communication"),
+        'Payment with a structured format communication applying '
+        'the ISO standard 11649': _(
+            "Payment with a structured format communication "
+            "applying the ISO standard 11649"),
+        'Structured creditor reference to remittance information': _(
+            "Structured creditor reference to remittance information"),
+        # 103
+        'Number': _('Number'),
+        # 105, 106, 108
+        'Gross amount in the currency of the account': _(
+            "Gross amount in the currency of the account"),
+        'Gross amount in the original currency': _(
+            "Gross amount in the original currency"),
+        'Rate': _('Rate'),
+        'Currency': _('Currency'),
+        'Structured format communication': _(
+            'Structured format communication'),
+        'Country code of the principal': _('Country code of the principal'),
+        'Equivalent in EUR': _('Equivalent in EUR'),
+        'VAT, withholding tax on income, commission, etc.': _(
+            "VAT, withholding tax on income, commission, etc."),
+        'Equivalent in the currency of the account': _(
+            "Equivalent in the currency of the account"),
+        'Amount on which % is calculated': _(
+            'Amount on which % is calculated'),
+        'Percent': _('Percent'),
+        'Minimum applicable': _('Minimum applicable'),
+        'Minimum not applicable': _('Minimum not applicable'),
+        'Closing, period from %s to %s': _('Closing, period from %s to %s'),
+        'Interest rates, calculation basis': _(
+            'Interest rates, calculation basis'),
+        'Interest': _('Interest'),
+        # 107
+        'paid': _('paid'),
+        'direct debit cancelled or nonexistent': _(
+            'direct debit cancelled or nonexistent'),
+        'refusal - other reason': _('refusal - other reason'),
+        'payer disagrees': _('payer disagrees'),
+        'direct debit number linked to another identification number '
+        'of the creditor': _(
+            'direct debit number linked to another '
+            'identification number of the creditor'),
+        'Direct debit - DOM\'80': _('Direct debit - DOM\'80'),
+        'Direct Debit Number': _('Direct Debit Number'),
+        'Central (Pivot) Date': _('Central (Pivot) Date'),
+        'Communication Zone': _('Communication Zone'),
+        'Paid or reason for refusal': _('Paid or reason for refusal'),
+        "Creditor's Number": _("Creditor's Number"),
+        # 111, 113, 114
+        'Private': _('Private'),
+        'Other': _('Other'),
+        'Withdrawal': _('Withdrawal'),
+        'Cumulative on network': _('Cumulative on network'),
+        'Proton loading': _('Proton loading'),
+        'Reimbursement Proton balance': _('Reimbursement Proton balance'),
+        'Reversal of purchases': _('Reversal of purchases'),
+        'Distribution sector': _('Distribution sector'),
+        'Teledata': _('Teledata'),
+        'Fuel': _('Fuel'),
+        'premium with lead substitute': _('premium with lead substitute'),
+        'europremium': _('europremium'),
+        'diesel': _('diesel'),
+        'LPG': _('LPG'),
+        'premium plus 98 oct': _('premium plus 98 oct'),
+        'regular unleaded': _('regular unleaded'),
+        'domestic fuel oil': _('domestic fuel oil'),
+        'lubricants': _('lubricants'),
+        'petrol': _('petrol'),
+        'premium 99+': _('premium 99+'),
+        'Avgas': _('Avgas'),
+        'other types': _('other types'),
+        'POS credit - globalisation': _('POS credit - globalisation'),
+        'ATM/POS debit': _('ATM/POS debit'),
+        'POS credit - individual transaction': _(
+            'POS credit - individual transaction'),
+        'Card Scheme': _('Card Scheme'),
+        'Card Number': _('Card Number'),
+        'POS Number': _('POS Number'),
+        'Period Number': _('Period Number'),
+        'First Transaction Sequence Number': _(
+            'First Transaction Sequence Number'),
+        'Date of first transaction': _('Date of first transaction'),
+        'Last Transaction Sequence Number': _(
+            'Last Transaction Sequence Number'),
+        'Date of last transaction': _('Date of last transaction'),
+        'Terminal Number': _('Terminal Number'),
+        'Transaction Sequence Number': _('Transaction Sequence Number'),
+        'Time': _('Time'),
+        'Transaction Type': _('Transaction Type'),
+        'Terminal Identification': _('Terminal Identification'),
+        'Original Amount': _('Original Amount'),
+        'Volume': _('Volume'),
+        'Product Code': _('Product Code'),
+        'Unit Price': _('Unit Price'),
+        'Transaction Reference': _('Transaction Reference'),
+        # 123, 124, 125
+        'guarantee without fixed term': _('guarantee without fixed term'),
+        'Starting Date': _('Starting Date'),
+        'Maturity Date': _('Maturity Date'),
+        'Basic Amount': _('Basic Amount'),
+        'Percentage': _('Percentage'),
+        'Term in days': _('Term in days'),
+        'Guarantee Number': _('Guarantee Number'),
+        'Settlement credit cards': _('Settlement credit cards'),
+        'Issuing Institution': _('Issuing Institution'),
+        'Invoice Number': _('Invoice Number'),
+        'Identification Number': _('Identification Number'),
+        'Date': _('Date'),
+        'Credit': _('Credit'),
+        'Credit Account Number': _('Credit Account Number'),
+        'Old Balance': _('Old Balance'),
+        'New Balance': _('New Balance'),
+        'Amount': _('Amount'),
+        'End Date': _('End Date'),
+        'Nominal Interest Rate or Rate of Charge': _(
+            'Nominal Interest Rate or Rate of Charge'),
+        # 127
+        'unspecified': _('unspecified'),
+        'recurrent': _('recurrent'),
+        'one-off': _('one-off'),
+        '1-st (recurrent)': _('1-st (recurrent)'),
+        'last (recurrent)': _('last (recurrent)'),
+        'SEPA core': _('SEPA core'),
+        'SEPA B2B': _('SEPA B2B'),
+        'technical problem': _('technical problem'),
+        'refusal - reason not specified': _('refusal - reason not specified'),
+        'debtor disagrees': _('debtor disagrees'),
+        'debtor\'s account problem': _('debtor\'s account problem'),
+        'reject': _('reject'),
+        'return': _('return'),
+        'refund': _('refund'),
+        'reversal': _('reversal'),
+        'cancellation': _('cancellation'),
+        'European direct debit (SEPA)': _('European direct debit (SEPA)'),
+        'Settlement_Date': _('Settlement_Date'),
+        'Direct Debit Type': _('Direct Debit Type'),
+        'Direct Debit Scheme': _('Direct Debit Scheme'),
+        'Creditor\'s Identification Code': _(
+            'Creditor\'s Identification Code'),
+        'Mandate Reference': _('Mandate Reference'),
+        'Communication': _('Communication'),
+        'R transaction Type': _('R transaction Type'),
+        'Reason': _('Reason'),
+        # information records
+        'Name': _('Name'),
+        'Street': _('Street'),
+        'Locality': _('Locality'),
+        'Identification Code': _('Identification Code'),
+        'Description of the detail': _('Description of the detail'),
+        'Category': _('Category'),
+        'Number of notes/coins': _('Number of notes/coins'),
+        'Note/coin denomination': _('Note/coin denomination'),
+        'Total amount': _('Total amount'),
+    }
+
+
+def _comm_100(comm, line, desc, t):
+    return t['Payment with ISO 11649 structured format communication'], [
+        (t['Payment with a structured format communication applying '
+           'the ISO standard 11649'] + ':', None),
+        (t['Structured creditor reference to remittance information'],
+         None),
+        (comm, None)]
+
+
+def _comm_101(comm, line, desc, t):
+    bba = '+++' + comm[0:3] + '/' + comm[3:7] + '/' + comm[7:12] + '+++'
+    return bba, bba
+
+
+def _comm_103(comm, line, desc, t):
+    return ', '.join([line['trans_family_desc'], t['Number']]), comm
+
+
+def _comm_105(comm, line, desc, t):
+    return desc, [
+        (desc, None),
+        (t['Gross amount in the currency of the account'],
+         '%.2f' % list2float(comm[0:15])),
+        (t['Gross amount in the original currency'],
+         '%.2f' % list2float(comm[15:30])),
+        (t['Rate'], '%.4f' % number2float(comm[30:42], 8)),
+        (t['Currency'], '%s' % comm[42:45]),
+        (t['Structured format communication'], '%s' % comm[45:57].strip()),
+        (t['Country code of the principal'], '%s' % comm[57:59]),
+        (t['Equivalent in EUR'], '%.2f' % list2float(comm[59:74]))]
+
+
+def _comm_106(comm, line, desc, t):
+    name = t['VAT, withholding tax on income, commission, etc.']
+    return name, [
+        (name, None),
+        (t['Equivalent in the currency of the account'],
+         '%.2f' % list2float(comm[0:15])),
+        (t['Amount on which % is calculated'],
+         '%.2f' % list2float(comm[15:30])),
+        (t['Percent'], '%.4f' % number2float(comm[30:42], 8)),
+        (comm[42] == 1 and t['Minimum applicable']
+         or t['Minimum not applicable'], None),
+        (t['Equivalent in EUR'], '%.2f' % list2float(comm[43:58]))]
+
+
+def _comm_107(comm, line, desc, t):
+    paid_refusals = {
+        '0': 'paid',
+        '1': 'direct debit cancelled or nonexistent',
+        '2': 'refusal - other reason',
+        'D': 'payer disagrees',
+        'E': 'direct debit number linked to another '
+             'identification number of the creditor'}
+    name = t['Direct debit - DOM\'80']
+    paid_refusal = paid_refusals.get(comm[48])
+    return name, [
+        (name, None),
+        (t['Direct Debit Number'], '%s' % comm[0:12].strip()),
+        (t['Central (Pivot) Date'], '%s' % str2date(comm[12:18])),
+        (t['Communication Zone'], '%s' % comm[18:48]),
+        (t['Paid or reason for refusal'],
+         paid_refusal and t[paid_refusal] or ''),
+        (t["Creditor's Number"], '%s' % comm[49:60].strip())]
+
+
+def _comm_108(comm, line, desc, t):
+    name = t['Closing, period from %s to %s'] % (
+        str2date(comm[42:48]), str2date(comm[48:54]))
+    rows = [
+        (name, None),
+        (t['Equivalent in the currency of the account'],
+         '%.2f' % list2float(comm[0:15]))]
+    if comm[30:42].strip('0'):
+        rows += [
+            (t['Interest rates, calculation basis'],
+             '%.2f' % list2float(comm[15:30])),
+            (t['Interest'], '%.2f' % list2float(comm[30:42]))]
+    return name, rows
+
+
+def _comm_111(comm, line, desc, t):
+    card_schemes = {
+        '1': 'Bancontact/Mister Cash',
+        '2': t['Private'],
+        '3': 'Maestro',
+        '5': 'TINA',
+        '9': t['Other']}
+    trans_types = {
+        '1': 'Withdrawal',
+        '2': 'Cumulative on network',
+        '7': 'Distribution sector',
+        '8': 'Teledata',
+        '9': 'Fuel'}
+    name = t['POS credit - globalisation']
+    trans_type = trans_types.get(comm[34])
+    return name, [
+        (name, None),
+        (t['Card Scheme'], card_schemes.get(comm[0], '')),
+        (t['POS Number'], '%s' % comm[1:7].strip()),
+        (t['Period Number'], '%s' % comm[7:10].strip()),
+        (t['First Transaction Sequence Number'],
+         '%s' % comm[10:16].strip()),
+        (t['Date of first transaction'], '%s' % str2date(comm[16:22])),
+        (t['Last Transaction Sequence Number'],
+         '%s' % comm[22:28].strip()),
+        (t['Date of last transaction'], '%s' % str2date(comm[28:34])),
+        (t['Transaction Type'], trans_type and t[trans_type] or ''),
+        (t['Terminal Identification'],
+         '%s' % comm[35:50].strip() + ', ' + comm[51:60].strip())]
+
+
+def _comm_113(comm, line, desc, t):
+    card_schemes = {
+        '1': 'Bancontact/Mister Cash',
+        '2': 'Maestro',
+        '3': t['Private'],
+        '9': t['Other']}
+    trans_types = {
+        '1': 'Withdrawal',
+        '2': 'Proton loading',
+        '3': 'Reimbursement Proton balance',
+        '4': 'Reversal of purchases',
+        '7': 'Distribution sector',
+        '8': 'Teledata',
+        '9': 'Fuel'}
+    product_codes = {
+        '01': 'premium with lead substitute',
+        '02': 'europremium',
+        '03': 'diesel',
+        '04': 'LPG',
+        '06': 'premium plus 98 oct',
+        '07': 'regular unleaded',
+        '08': 'domestic fuel oil',
+        '09': 'lubricants',
+        '10': 'petrol',
+        '11': 'premium 99+',
+        '12': 'Avgas',
+        '16': 'other types',
+        }
+    name = t['ATM/POS debit']
+    terminal_number = comm[17:23].strip()
+    trans_date = comm[29:35].strip() and str2date(comm[29:35]) or ''
+    trans_hour = comm[35:39].strip() and str2time(comm[35:39]) or ''
+    trans_type = trans_types.get(comm[39])
+    orig_amount = comm[66:81].strip() and list2float(comm[66:81])
+    volume = number2float(comm[96:101], 2)
+    product_code = product_codes.get(comm[101:103])
+    unit_price = number2float(comm[103:108], 2)
+    rows = [
+        (name, None),
+        (t['Card Number'], '%s' % comm[0:16].strip()),
+        (t['Card Scheme'], card_schemes.get(comm[16], ''))]
+    if terminal_number:
+        rows.append((t['Terminal Number'], '%s' % terminal_number))
+    rows += [
+        (t['Transaction Sequence Number'], '%s' % comm[23:29].strip()),
+        (t['Time'], '%s' % trans_date + ' ' + trans_hour),
+        (t['Transaction Type'], trans_type and t[trans_type] or ''),
+        (t['Terminal Identification'],
+         '%s' % comm[40:56].strip() + ', ' + comm[56:66].strip())]
+    if orig_amount:
+        rows += [
+            (t['Original Amount'], '%.2f' % orig_amount),
+            (t['Rate'], '%.4f' % number2float(comm[81:93], 8)),
+            (t['Currency'], '%s' % comm[93:96])]
+    if volume:
+        rows.append((t['Volume'], '%.2f' % volume))
+    if product_code:
+        rows.append((t['Product Code'], '%s' % t[product_code]))
+    if unit_price:
+        rows.append((t['Unit Price'], '%.2f' % unit_price))
+    return name, rows
+
+
+def _comm_114(comm, line, desc, t):
+    card_schemes = {
+        '1': 'Bancontact/Mister Cash',
+        '2': 'Maestro',
+        '3': t['Private'],
+        '5': 'TINA',
+        '9': t['Other']}
+    trans_types = {
+        '1': 'Withdrawal',
+        '7': 'Distribution sector',
+        '8': 'Teledata',
+        '9': 'Fuel'}
+    name = t['POS credit - individual transaction']
+    trans_type = trans_types.get(comm[26])
+    return name, [
+        (name, None),
+        (t['Card Scheme'], card_schemes.get(comm[0], '')),
+        (t['POS Number'], '%s' % comm[1:7].strip()),
+        (t['Period Number'], '%s' % comm[7:10].strip()),
+        (t['Transaction Sequence Number'], '%s' % comm[10:16].strip()),
+        (t['Time'], '%s' % str2date(comm[16:22]) + ' '
+         + str2time(comm[22:26])),
+        (t['Transaction Type'], trans_type and t[trans_type] or ''),
+        (t['Terminal Identification'],
+         '%s' % comm[27:43].strip() + ', ' + comm[43:53].strip()),
+        (t['Transaction Reference'], '%s' % comm[53:69].strip())]
+
+
+def _comm_123(comm, line, desc, t):
+    maturity_date = comm[6:12] == '999999' \
+        and t['guarantee without fixed term'] or str2date(comm[0:6])
+    return line['name'], [
+        (line['name'], None),
+        (t['Starting Date'], '%s' % str2date(comm[0:6])),
+        (t['Maturity Date'], '%s' % maturity_date),
+        (t['Basic Amount'], '%.2f' % list2float(comm[12:27])),
+        (t['Percentage'], '%.4f' % number2float(comm[27:39], 8)),
+        (t['Term in days'], '%s' % comm[39:43].lstrip('0')),
+        (comm[43] == '1' and t['Minimum applicable']
+         or t['Minimum not applicable'], None),
+        (t['Guarantee Number'], '%s' % comm[44:57].strip())]
+
+
+def _comm_124(comm, line, desc, t):
+    card_issuers = {
+        '1': 'Mastercard',
+        '2': 'Visa',
+        '3': 'American Express',
+        '4': 'Diners Club',
+        '9': t['Other']}
+    name = t['Settlement credit cards']
+    date = comm[48:54].strip() and str2date(comm[48:54]) or ''
+    return name, [
+        (name, None),
+        (t['Card Number'], '%s' % comm[0:20].strip()),
+        (t['Issuing Institution'], card_issuers.get(comm[20], '')),
+        (t['Invoice Number'], '%s' % comm[21:33].strip()),
+        (t['Identification Number'], '%s' % comm[33:48].strip()),
+        (t['Date'], '%s' % date)]
+
+
+def _comm_125(comm, line, desc, t):
+    name = line['name']
+    if line['trans_family'] not in st_line_name_families:
+        name = t['Credit']
+    credit_account = comm[0:27].strip()
+    if check_bban('BE', credit_account):
+        credit_account = '-'.join(
+            [credit_account[:3],
+             credit_account[3:10],
+             credit_account[10:]])
+    return name, [
+        (name, None),
+        (t['Credit Account Number'], '%s' % credit_account),
+        (t['Old Balance'], '%.2f' % list2float(comm[27:42])),
+        (t['New Balance'], '%.2f' % list2float(comm[42:57])),
+        (t['Amount'], '%.2f' % list2float(comm[57:72])),
+        (t['Currency'], '%s' % comm[72:75]),
+        (t['Starting Date'], '%s' % str2date(comm[75:81])),
+        (t['End Date'], '%s' % str2date(comm[81:87])),
+        (t['Nominal Interest Rate or Rate of Charge'],
+         '%.4f' % number2float(comm[87:99], 8)),
+        (t['Transaction Reference'], '%s' % comm[99:112].strip())]
+
+
+def _comm_127(comm, line, desc, t):
+    direct_debit_types = {
+        '0': 'unspecified',
+        '1': 'recurrent',
+        '2': 'one-off',
+        '3': '1-st (recurrent)',
+        '4': 'last (recurrent)'}
+    direct_debit_schemes = {
+        '0': 'unspecified',
+        '1': 'SEPA core',
+        '2': 'SEPA B2B'}
+    paid_refusals = {
+        '0': 'paid',
+        '1': 'technical problem',
+        '2': 'refusal - reason not specified',
+        '3': 'debtor disagrees',
+        '4': 'debtor\'s account problem'}
+    R_types = {
+        '0': 'paid',
+        '1': 'reject',
+        '2': 'return',
+        '3': 'refund',
+        '4': 'reversal',
+        '5': 'cancellation'}
+
+    def lookup(table, key):
+        return key in table and t[table[key]] or ''
+
+    name = t['European direct debit (SEPA)']
+    return name, [
+        (name, None),
+        (t['Settlement_Date'], '%s' % str2date(comm[0:6])),
+        (t['Direct Debit Type'], lookup(direct_debit_types, comm[6])),
+        (t['Direct Debit Scheme'], lookup(direct_debit_schemes, comm[7])),
+        (t['Paid or reason for refusal'], lookup(paid_refusals, comm[8])),
+        (t['Creditor\'s Identification Code'], '%s' % comm[9:44].strip()),
+        (t['Mandate Reference'], '%s' % comm[44:79].strip()),
+        (t['Communication'], '%s' % comm[79:141]),
+        (t['R transaction Type'], lookup(R_types, comm[141])),
+        (t['Reason'], '%s' % comm[142:146].strip())]
+
+
+def _comm_info_001(comm, line, desc, t):
+    return desc, [
+        (desc, None),
+        (t['Name'], '%s' % comm[0:70].strip()),
+        (t['Street'], '%s' % comm[70:105].strip()),
+        (t['Locality'], '%s' % comm[105:140].strip()),
+        (t['Identification Code'], '%s' % comm[140:175].strip())]
+
+
+def _comm_info_002(comm, line, desc, t):
+    return desc, comm.strip()
+
+
+def _comm_info_006(comm, line, desc, t):
+    amount_sign = comm[48]
+    amount = (comm[48] == '1' and '-' or '') \
+        + ('%.2f' % list2float(comm[33:48])) + ' ' + comm[30:33]
+    return desc, [
+        (desc, None),
+        (t['Description of the detail'], '%s' % comm[0:30].strip()),
+        (t['Amount'], '%s%s' % (amount_sign, amount)),
+        (t['Category'], '%s' % comm[49:52].strip())]
+
+
+def _comm_info_007(comm, line, desc, t):
+    return desc, [
+        (desc, None),
+        (t['Number of notes/coins'], '%s' % comm[0:7]),
+        (t['Note/coin denomination'], '%s' % comm[7:13]),
+        (t['Total amount'], '%.2f' % list2float(comm[13:28]))]
+
+
+def _comm_info_008(comm, line, desc, t):
+    return desc, [
+        (desc, None),
+        (t['Name'], '%s' % comm[0:70].strip()),
+        (t['Identification Code'], '%s' % comm[70:105].strip())]
+
+
+register_comm_decoder('100', _comm_100)
+register_comm_decoder(['101', '102'], _comm_101)
+register_comm_decoder('103', _comm_103)
+register_comm_decoder('105', _comm_105)
+register_comm_decoder('106', _comm_106)
+register_comm_decoder('107', _comm_107)
+register_comm_decoder('108', _comm_108)
+register_comm_decoder('111', _comm_111)
+register_comm_decoder('113', _comm_113)
+register_comm_decoder('114', _comm_114)
+register_comm_decoder('123', _comm_123)
+register_comm_decoder('124', _comm_124)
+register_comm_decoder('125', _comm_125)
+register_comm_decoder('127', _comm_127)
+register_comm_decoder('001', _comm_info_001, info=True)
+register_comm_decoder(['002', '004', '005'], _comm_info_002, info=True)
+register_comm_decoder('006', _comm_info_006, info=True)
+register_comm_decoder('007', _comm_info_007, info=True)
+register_comm_decoder(['008', '009'], _comm_info_008, info=True)
@@ -0,0 +1,355 @@
+# -*- encoding: utf-8 -*-
+##############################################################################
+#
+#    Odoo, Open Source Management Solution
+#
+#    Copyright (c) 2010-now Noviat nv/sa (www.noviat.com).
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+##############################################################################
+"""
+Decoding of the fixed-width CODA records.
+
+This module has no Odoo dependencies so that the decoding can be
+benchmarked and profiled without a database, e.g.
+
+    python coda_decoder.py <coda file> [repeat]
+
+The record layouts are compiled into decode functions at import time.
+Each decode function turns a raw CODA line into a compact record object
+(a namedtuple) with already converted field values.
+"""
+
+from collections import namedtuple
+import sys
+import time
+
+
+def str2date(date_str):
+    try:
+        return time.strftime('%Y-%m-%d', time.strptime(date_str, '%d%m%y'))
+    except:
+        return False
+
+
+def str2time(time_str):
+    return time_str[:2] + ':' + time_str[2:]
+
+
+def str2float(str):
+    try:
+        return float(str)
+    except:
+        return 0.0
+
+
+def list2float(lst):
+            try:
+                return str2float((lambda s: s[:-3] + '.' + s[-3:])(lst))
+            except:
+                return 0.0
+
+
+def number2float(s, d):
+    try:
+        return float(s[:len(s) - d] + '.' + s[len(s) - d:])
+    except:
+        return False
+
+
+def signed_amount(sign, amount):
+    """ sign '1' = Debit """
+    amount = list2float(amount)
+    return sign == '1' and -amount or amount
+
+
+def _strip(s):
+    return s.strip()
+
+
+_converters = {
+    'date': 'str2date',
+    'float': 'list2float',
+    'int': 'int',
+    'strip': '_strip',
+}
+
+"""
+Record layouts.
+
+Field definitions:
+(name, start, stop[, conversion[, sign position]])
+
+- conversion: None (raw string), 'date', 'float', 'int', 'strip'
+  or 'amount' (signed amount, the sign is at position 'sign position').
+- (name, None, None, default) for fields that are not present
+  in a specific layout variant.
+
+Layout keys:
+- the record identification ('0', '1', '21', '22', ...)
+- variants are selected in CodaDecoder.decode:
+  - '1v1', '10', '11', '12', '13': record 1 for CODA V1 and
+    the different bank account structures of CODA V2,
+    '1' for an unsupported bank account structure
+  - '23v1', '23', '23l': record 2.3 for CODA V1, CODA V2 and
+    CODA V2 with a long counterparty account number
+"""
+RECORD_LAYOUTS = {
+    '0': [
+        ('creation_date', 5, 11, 'date'),
+        ('separate_application', 83, 88),
+        ('version', 127, 128),
+    ],
+    '1': [
+        ('acc_structure', 1, 2),
+        ('paper_ob_seq_number', 2, 5),
+        ('acc_number', 5, 17),
+        ('currency', 18, 21),
+        ('balance_start', 43, 58, 'amount', 42),
+        ('old_balance_date', 58, 64, 'date'),
+        ('acc_holder', 64, 90),
+        ('description', 90, 125, 'strip'),
+        ('coda_seq_number', 125, 128),
+    ],
+    '12': [
+        ('acc_structure', 1, 2),
+        ('paper_ob_seq_number', 2, 5),
+        ('acc_number', 5, 21),
+        ('currency', 39, 42),
+        ('balance_start', 43, 58, 'amount', 42),
+        ('old_balance_date', 58, 64, 'date'),
+        ('acc_holder', 64, 90),
+        ('description', 90, 125, 'strip'),
+        ('coda_seq_number', 125, 128),
+    ],
+    '21': [
+        ('ref', 2, 10),
+        ('ref_move', 2, 6),
+        ('ref_move_detail', 6, 10),
+        ('trans_ref', 10, 31),
+        ('amount', 32, 47, 'amount', 31),
+        ('val_date', 47, 53, 'date'),
+        ('trans_type', 53, 54),
+        ('trans_family', 54, 56),
+        ('trans_code', 56, 58),
+        ('trans_category', 58, 61),
+        ('comm_structured', 61, 62),
+        ('struct_comm_type', 62, 65),
+        ('struct_comm', 65, 115),
+        ('free_comm', 62, 115),
+        ('entry_date', 115, 121, 'date'),
+        ('glob_lvl_flag', 124, 125, 'int'),
+    ],
+    '22': [
+        ('ref', 2, 10),
+        ('communication', 10, 63),
+        ('payment_reference', 63, 98, 'strip'),
+        ('counterparty_bic', 98, 109, 'strip'),
+    ],
+    '23': [
+        ('ref', 2, 10),
+        ('counterparty_number', 10, 22, 'strip'),
+        ('counterparty_currency', 23, 26, 'strip'),
+        ('counterparty_name', 47, 82, 'strip'),
+        ('communication', 82, 125),
+    ],
+    '23l': [
+        ('ref', 2, 10),
+        ('counterparty_number', 10, 44, 'strip'),
+        ('counterparty_currency', 44, 47, 'strip'),
+        ('counterparty_name', 47, 82, 'strip'),
+        ('communication', 82, 125),
+    ],
+    '23v1': [
+        ('ref', 2, 10),
+        ('counterparty_number', 10, 22, 'strip'),
+        ('counterparty_currency', None, None, ''),
+        ('counterparty_name', 47, 125, 'strip'),
+        ('communication', None, None, ''),
+    ],
+    '31': [
+        ('ref', 2, 10),
+        ('ref_move', 2, 6),
+        ('ref_move_detail', 6, 10),
+        ('trans_ref', 10, 31),
+        ('trans_type', 31, 32),
+        ('trans_family', 32, 34),
+        ('trans_code', 34, 36),
+        ('trans_category', 36, 39),
+        ('comm_structured', 39, 40),
+        ('struct_comm_type', 40, 43),
+        ('struct_comm', 43, 113),
+        ('free_comm', 40, 113),
+    ],
+    '32': [
+        ('ref', 2, 10),
+        ('ref_move', 2, 6),
+        ('communication', 10, 115),
+    ],
+    '33': [
+        ('ref', 2, 10),
+        ('ref_move', 2, 6),
+        ('communication', 10, 100),
+    ],
+    '4': [
+        ('ref', 2, 10),
+        ('communication', 32, 112),
+    ],
+    '8': [
+        ('paper_nb_seq_number', 1, 4),
+        ('balance_end_real', 42, 57, 'amount', 41),
+        ('new_balance_date', 57, 63, 'date'),
+    ],
+    '9': [
+        ('balance_min', 22, 37, 'float'),
+        ('balance_plus', 37, 52, 'float'),
+    ],
+}
+for _key in ['1v1', '10', '11', '13']:
+    RECORD_LAYOUTS[_key] = RECORD_LAYOUTS['1']
+
+"""
+Record identification of the layout variants,
+the record objects of the variants share the same class.
+"""
+RECORD_VARIANTS = {
+    '1v1': '1', '10': '1', '11': '1', '12': '1', '13': '1',
+    '23l': '23', '23v1': '23',
+}
+
+UnknownRecord = namedtuple('UnknownRecord', ['record_type', 'line'])
+
+
+def _compile_layouts(layouts, variants):
+    """
+    Compile the record layouts into decode functions.
+
+    Returns a dictionary with the layout key as key and
+    the decode function as value.
+    """
+    namespace = {
+        'str2date': str2date,
+        'list2float': list2float,
+        'signed_amount': signed_amount,
+        '_strip': _strip,
+    }
+    classes = {}
+    decoders = {}
+    for key in sorted(layouts):
+        layout = layouts[key]
+        record_type = variants.get(key, key)
+        if record_type not in classes:
+            cls = namedtuple(
+                'CodaRecord%s' % record_type, [x[0] for x in layout])
+            cls.record_type = record_type
+            classes[record_type] = cls
+        cls = classes[record_type]
+        if list(cls._fields) != [x[0] for x in layout]:
+            raise ValueError(
+                "Layout '%s' does not match the fields of record '%s'"
+                % (key, record_type))
+        exprs = []
+        for field in layout:
+            start, stop = field[1:3]
+            conv = len(field) > 3 and field[3] or None
+            if start is None:
+                exprs.append(repr(field[3]))
+            elif conv == 'amount':
+                exprs.append('signed_amount(line[%s], line[%s:%s])'
+                             % (field[4], start, stop))
+            elif conv:
+                exprs.append('%s(line[%s:%s])'
+                             % (_converters[conv], start, stop))
+            else:
+                exprs.append('line[%s:%s]' % (start, stop))
+        src = 'def decode(line):\n    return _cls(%s)\n' % ', '.join(exprs)
+        ns = dict(namespace, _cls=cls)
+        exec src in ns
+        decoders[key] = ns['decode']
+    return decoders
+
+
+DECODERS = _compile_layouts(RECORD_LAYOUTS, RECORD_VARIANTS)
+
+
+class CodaDecoder(object):
+    """
+    Decoder for the records of a single CODA file.
+
+    The decoder keeps track of the CODA version
+    of the statement that is being decoded.
+    """
+
+    def __init__(self, decoders=None):
+        self.decoders = decoders or DECODERS
+        self.version = '2'
+
+    def decode(self, line):
+        rtype = line[0]
+        if rtype == '0':
+            self.version = line[127:128]
+        elif rtype == '1':
+            rtype = self.version == '1' and '1v1' or '1' + line[1:2]
+            if rtype not in self.decoders:
+                # unsupported bank account structure (error R1003)
+                rtype = '1'
+        elif rtype == '2':
+            rtype = line[:2]
+            if rtype == '23':
+                if self.version == '1':
+                    rtype = '23v1'
+                elif line[22:23] != ' ':
+                    rtype = '23l'
+        elif rtype == '3':
+            rtype = line[:2]
+        decode = self.decoders.get(rtype)
+        if not decode:
+            return UnknownRecord(line[:2], line)
+        return decode(line)
+
+
+def decode_records(lines):
+    """
+    Generator returning the decoded records of a CODA file.
+    """
+    decode = CodaDecoder().decode
+    for line in lines:
+        if line:
+            yield decode(line)
+
+
+def benchmark(lines, repeat=1):
+    """
+    Returns the number of decoded lines and the throughput in lines/sec.
+    """
+    lines = [x for x in lines if x]
+    start = time.time()
+    for i in xrange(repeat):
+        for record in decode_records(lines):
+            pass
+    duration = time.time() - start
+    nb_lines = len(lines) * repeat
+    return nb_lines, duration and nb_lines / duration or 0.0
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        sys.exit('usage: %s <coda file> [repeat]' % sys.argv[0])
+    with open(sys.argv[1]) as f:
+        coda_lines = unicode(f.read(), 'windows-1252').split('\n')
+    nb_repeat = len(sys.argv) > 2 and int(sys.argv[2]) or 1000
+    nb_lines, rate = benchmark(coda_lines, nb_repeat)
+    sys.stdout.write(
+        '%d lines decoded, %.0f lines/sec\n' % (nb_lines, rate))
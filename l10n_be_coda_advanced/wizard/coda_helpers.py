@@ -21,6 +21,13 @@
 ##############################################################################
 
 from openerp.addons.base_iban.base_iban import _ref_iban, _format_iban
+from openerp.addons.l10n_be_coda_advanced.wizard.coda_decoder \
+    import str2date, str2time, str2float, list2float, number2float  # noqa
+from collections import deque
+from contextlib import contextmanager
+import binascii
+import hashlib
+import re
 import time
 
 
@@ -90,38 +97,222 @@ def get_iban_and_bban(number):
     return [number]
 
 
+def coda_chunks(codafile, chunk_size=65536):
+    """
+    Generator returning the decoded chunks of a base64 encoded CODA file.
+    """
+    pending = ''
+    for i in xrange(0, len(codafile), chunk_size):
+        chunk = pending + ''.join(codafile[i:i + chunk_size].split())
+        cut = len(chunk) - len(chunk) % 4
+        pending = chunk[cut:]
+        yield binascii.a2b_base64(chunk[:cut])
+    if pending:
+        yield binascii.a2b_base64(pending)
+
+
+def coda_records(codafile, chunk_size=65536):
+    """
+    Generator returning the records of a base64 encoded CODA file.
+
+    The file is decoded chunk by chunk, hence the decoded file is never
+    held in memory as a whole.
+    """
+    buf = ''
+    for chunk in coda_chunks(codafile, chunk_size):
+        buf += chunk
+        records = buf.split('\n')
+        buf = records.pop()
+        for record in records:
+            yield unicode(record, 'windows-1252', 'strict')
+    if buf:
+        yield unicode(buf, 'windows-1252', 'strict')
+
+
+def coda_digest(codafile):
+    """
+    SHA-1 digest of the content of a base64 encoded CODA file.
+    """
+    sha1 = hashlib.sha1()
+    for chunk in coda_chunks(codafile):
+        sha1.update(chunk)
+    return sha1.hexdigest()
+
+
 def repl_special(s):
     s = s.replace("\'", "\'" + "'")
     return s
 
 
-def str2date(date_str):
-    try:
-        return time.strftime('%Y-%m-%d', time.strptime(date_str, '%d%m%y'))
-    except:
-        return False
+class AhoCorasick(object):
+    """
+    Aho-Corasick automaton for the lookup of a large number of keywords
+    in a text, the text is scanned in a single pass.
+
+    Usage:
+    ac = AhoCorasick()
+    ac.add(keyword, value)
+    ac.search(text) returns the values of the keywords found in text
+    """
 
+    def __init__(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        self._built = False
 
-def str2time(time_str):
-    return time_str[:2] + ':' + time_str[2:]
+    def add(self, keyword, value):
+        state = 0
+        for c in keyword:
+            next_state = self._goto[state].get(c)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][c] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = next_state
+        self._out[state].append(value)
+        self._built = False
 
+    def build(self):
+        goto, fail, out = self._goto, self._fail, self._out
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for c, next_state in goto[state].iteritems():
+                queue.append(next_state)
+                f = fail[state]
+                while f and c not in goto[f]:
+                    f = fail[f]
+                f = goto[f].get(c, 0)
+                fail[next_state] = f
+                if out[f]:
+                    out[next_state] = out[next_state] + out[f]
+        self._built = True
 
-def str2float(str):
-    try:
-        return float(str)
-    except:
-        return 0.0
+    def search(self, text):
+        if not self._built:
+            self.build()
+        goto, fail, out = self._goto, self._fail, self._out
+        res = []
+        state = 0
+        for c in text:
+            while state and c not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(c, 0)
+            if out[state]:
+                res.extend(out[state])
+        return res
 
 
-def list2float(lst):
+def like2regex(pattern):
+    """
+    Convert a SQL LIKE pattern into a regular expression
+    matching texts that contain the pattern.
+    """
+    regex = ''
+    escape = False
+    for c in pattern:
+        if escape:
+            regex += re.escape(c)
+            escape = False
+        elif c == '\\':
+            escape = True
+        elif c == '%':
+            regex += '.*'
+        elif c == '_':
+            regex += '.'
+        else:
+            regex += re.escape(c)
+    return re.compile(regex, re.IGNORECASE | re.UNICODE | re.DOTALL)
+
+
+class PhaseTimer(object):
+    """
+    Wall time, SQL query count and number of records processed
+    per phase of a CODA import.
+
+    Phases can be nested, the figures of a phase include
+    those of the nested phases.
+
+    Usage:
+    timer = PhaseTimer(cr)
+    with timer.phase('create_lines', rows=len(lines)):
+        ...
+    """
+
+    def __init__(self, cr):
+        self.cr = cr
+        self.phases = {}
+        self.snapshot = {}
+
+    def _query_count(self):
+        return getattr(self.cr, 'sql_log_count', 0)
+
+    def add(self, name, duration, queries, rows):
+        res = self.phases.setdefault(name, [0, 0.0, 0, 0])
+        res[0] += 1
+        res[1] += duration
+        res[2] += queries
+        res[3] += rows
+
+    @contextmanager
+    def phase(self, name, rows=0):
+        start = time.time()
+        queries = self._query_count()
+        try:
+            yield
+        finally:
+            self.add(name, time.time() - start,
+                     self._query_count() - queries, rows)
+
+    def iterate(self, name, iterable):
+        """
+        Generator timing the retrieval of the items of 'iterable'.
+        """
+        iterator = iter(iterable)
+        while True:
+            start = time.time()
+            queries = self._query_count()
             try:
-                return str2float((lambda s: s[:-3] + '.' + s[-3:])(lst))
-            except:
-                return 0.0
+                item = iterator.next()
+            except StopIteration:
+                self.add(name, time.time() - start,
+                         self._query_count() - queries, 0)
+                return
+            self.add(name, time.time() - start,
+                     self._query_count() - queries, 1)
+            yield item
 
+    def delta(self):
+        """
+        Returns the figures since the previous call.
+        """
+        res = {}
+        for name, values in self.phases.iteritems():
+            old = self.snapshot.get(name, [0, 0.0, 0, 0])
+            diff = [x - y for x, y in zip(values, old)]
+            if diff[0]:
+                res[name] = diff
+        self.snapshot = dict([(x, list(y)) for x, y in self.phases.items()])
+        return res
 
-def number2float(s, d):
-    try:
-        return float(s[:len(s) - d] + '.' + s[len(s) - d:])
-    except:
-        return False
+    @staticmethod
+    def format_log(phases):
+        """
+        key=value format for the log files:
+        phase=time(s)/queries/rows
+        """
+        return ' '.join([
+            '%s=%.3f/%d/%d' % (name, x[1], x[2], x[3])
+            for name, x in sorted(phases.items())])
+
+    @staticmethod
+    def format_table(phases):
+        lines = ['%-28s %8s %10s %9s %8s' % (
+            'Phase', 'Calls', 'Time (s)', 'Queries', 'Rows')]
+        for name, x in sorted(phases.items()):
+            lines.append('%-28s %8d %10.3f %9d %8d' % (
+                name, x[0], x[1], x[2], x[3]))
+        return '\n'.join(lines)
@@ -21,20 +21,26 @@
 ##############################################################################
 
 from openerp.osv import orm, fields
+from openerp import SUPERUSER_ID
+from openerp.tools.float_utils import float_repr, float_round
 from openerp.tools.translate import _
 from openerp.addons.l10n_be_coda_advanced.wizard.coda_helpers import \
-    calc_iban_checksum, check_bban, check_iban, get_iban_and_bban, \
-    repl_special, str2date, str2time, list2float, number2float
+    AhoCorasick, PhaseTimer, calc_iban_checksum, check_bban, check_iban, \
+    coda_digest, coda_records, get_iban_and_bban, like2regex
+from openerp.addons.l10n_be_coda_advanced.wizard.coda_decoder import \
+    CodaDecoder
+from openerp.addons.l10n_be_coda_advanced.wizard.coda_comm import \
+    COMM_INFO_DECODERS, COMM_MOVE_DECODERS, comm_labels, render_comm, \
+    st_line_name_families
+import hashlib
+import json
 import time
-import base64
 import re
 from traceback import format_exception
 from sys import exc_info
 import logging
 _logger = logging.getLogger(__name__)
 
-indent = '\n' + 8*' '
-st_line_name_families = ['13', '35', '41', '80']
 parse_comms_move = [
     '100', '101', '102', '103', '105', '106', '107', '108', '111', '113',
     '114', '115', '121', '122', '123', '124', '125', '126', '127']
@@ -57,9 +63,20 @@ class account_coda_import(orm.TransientModel):
             domain=[('state', '=', 'draft'), ('special', '=', False)],
             help="Keep empty to use the period of the bank statement date."),
         'note': fields.text('Log'),
+        'deferred_reconcile': fields.boolean(
+            'Deferred Reconciliation',
+            help="Create the Bank Statements first, the moves and "
+                 "reconciliations are created afterwards "
+                 "by a background job."),
     }
+
+    def _default_deferred_reconcile(self, cr, uid, context=None):
+        return self.pool['ir.config_parameter'].get_param(
+            cr, uid, 'coda.reconcile.deferred') in ['1', 'True']
+
     _defaults = {
         'coda_fname': lambda *a: '',
+        'deferred_reconcile': _default_deferred_reconcile,
     }
 
     """
@@ -78,12 +95,12 @@ class account_coda_import(orm.TransientModel):
     def onchange_fdata(self, cr, uid, ids, coda_fname):
         return {'value': {'coda_fname_dummy': coda_fname}}
 
-    def _coda_record_0(self, cr, uid, coda_statement, line,
+    def _coda_record_0(self, cr, uid, coda_statement, record,
                        coda_parsing_note, context=None):
 
         coda_statement['currency'] = 'EUR'  # default currency
-        coda_statement['version'] = line[127]
-        coda_version = line[127]
+        coda_statement['version'] = record.version
+        coda_version = record.version
         if coda_version not in ['1', '2']:
             err_string = _(
                 "'\nCODA V%s statements are not supported, "
@@ -94,9 +111,9 @@ class account_coda_import(orm.TransientModel):
             raise orm.except_orm(_('Data Error!'), err_string)
         coda_statement['coda_version'] = coda_version
         coda_statement['coda_statement_lines'] = {}
-        coda_statement['date'] = str2date(line[5:11])
-        coda_statement['coda_creation_date'] = str2date(line[5:11])
-        coda_statement['separate_application'] = line[83:88]
+        coda_statement['date'] = record.creation_date
+        coda_statement['coda_creation_date'] = record.creation_date
+        coda_statement['separate_application'] = record.separate_application
         coda_statement['first_transaction_date'] = False
         coda_statement['state'] = 'draft'
         coda_statement['coda_note'] = ''
@@ -105,7 +122,7 @@ class account_coda_import(orm.TransientModel):
         coda_statement['glob_lvl_stack'] = []
         return coda_parsing_note
 
-    def _coda_record_1(self, cr, uid, coda_statement, line,
+    def _coda_record_1(self, cr, uid, coda_statement, record,
                        coda_parsing_note, coda_bank_table, context=None):
 
         bank_st_obj = self.pool['account.bank.statement']
@@ -113,24 +130,25 @@ class account_coda_import(orm.TransientModel):
         partner_bank_obj = self.pool['res.partner.bank']
 
         skip = False
+        acc_structure = record.acc_structure
         if coda_statement['coda_version'] == '1':
-            coda_statement['acc_number'] = line[5:17]
-            if line[18:21].strip():
-                coda_statement['currency'] = line[18:21]
-        elif line[1] == '0':  # Belgian bank account BBAN structure
-            coda_statement['acc_number'] = line[5:17]
-            coda_statement['currency'] = line[18:21]
-        elif line[1] == '1':  # foreign bank account BBAN structure
+            coda_statement['acc_number'] = record.acc_number
+            if record.currency.strip():
+                coda_statement['currency'] = record.currency
+        elif acc_structure == '0':  # Belgian bank account BBAN structure
+            coda_statement['acc_number'] = record.acc_number
+            coda_statement['currency'] = record.currency
+        elif acc_structure == '1':  # foreign bank account BBAN structure
             err_string = _("\nForeign bank accounts with "
                            "BBAN structure are not supported !")
             err_code = 'R1001'
             if self._batch:
                 return err_code, err_string
             raise orm.except_orm(_('Data Error!'), err_string)
-        elif line[1] == '2':  # Belgian bank account IBAN structure
-            coda_statement['acc_number'] = line[5:21]
-            coda_statement['currency'] = line[39:42]
-        elif line[1] == '3':  # foreign bank account IBAN structure
+        elif acc_structure == '2':  # Belgian bank account IBAN structure
+            coda_statement['acc_number'] = record.acc_number
+            coda_statement['currency'] = record.currency
+        elif acc_structure == '3':  # foreign bank account IBAN structure
             err_string = _("\nForeign bank accounts with "
                            "IBAN structure are not supported !")
             err_code = 'R1002'
@@ -143,21 +161,22 @@ class account_coda_import(orm.TransientModel):
             if self._batch:
                 return err_code, err_string
             raise orm.except_orm(_('Data Error!'), err_string)
-        coda_statement['description'] = line[90:125].strip()
+        coda_statement['description'] = record.description
 
         def cba_filter(coda_bank):
-            cba_numbers = get_iban_and_bban(coda_bank['acc_number'])
             cba_currency = coda_bank['currency_name']
             cba_descriptions = [
                 coda_bank['description1'] or '',
                 coda_bank['description1'] or '']
-            if coda_statement['acc_number'] in cba_numbers \
-                    and coda_statement['currency'] == cba_currency \
+            if coda_statement['currency'] == cba_currency \
                     and coda_statement['description'] in cba_descriptions:
                 return True
             return False
 
-        cba = filter(cba_filter, coda_bank_table)
+        # coda_bank_table: CODA Bank Accounts indexed by Bank Account Number
+        cba = filter(
+            cba_filter,
+            coda_bank_table.get(coda_statement['acc_number'], []))
 
         if cba:
             # cba: dict with CODA Bank Account Configuration settings
@@ -210,7 +229,6 @@ class account_coda_import(orm.TransientModel):
                 if self._batch:
                     return err_code, err_string
                 raise orm.except_orm(_('Data Error!'), err_string)
-        bal_start = list2float(line[43:58])  # old balance data
         if cba['state'] == 'skip':
             self._coda_import_note += _(
                 "\n\nThe CODA File contains a statement which is not "
@@ -231,13 +249,31 @@ class account_coda_import(orm.TransientModel):
             coda_statement['skip'] = skip
             return coda_parsing_note
 
-        if line[42] == '1':  # 1= Debit
-            bal_start = - bal_start
-        coda_statement['balance_start'] = bal_start
-        coda_statement['old_balance_date'] = str2date(line[58:64])
-        coda_statement['acc_holder'] = line[64:90]
-        coda_statement['paper_ob_seq_number'] = line[2:5]
-        coda_statement['coda_seq_number'] = line[125:128]
+        coda_statement['balance_start'] = record.balance_start
+        coda_statement['old_balance_date'] = record.old_balance_date
+        coda_statement['acc_holder'] = record.acc_holder
+        coda_statement['paper_ob_seq_number'] = record.paper_ob_seq_number
+        coda_statement['coda_seq_number'] = record.coda_seq_number
+        coda_statement['coda_hash'] = self._coda_statement_hash(
+            cr, uid, coda_statement, context=context)
+        dup = self._coda_statement_duplicate(
+            cr, uid, coda_statement['coda_hash'], context=context)
+        if dup:
+            if context.get('coda_id') and dup[0] == context['coda_id']:
+                # statement processed already when we reprocess CODA file
+                skip = True
+            elif cba['discard_dup']:
+                self._coda_import_note += _(
+                    "\n\nThe CODA Statement with Bank Account Number %s "
+                    "and Sequence Number %s has already been imported "
+                    "via CODA File '%s', hence it has been discarded."
+                    ) % (coda_statement['acc_number'],
+                         coda_statement['coda_seq_number'], dup[1])
+                skip = True
+            else:
+                # duplicates are allowed, only the first one
+                # keeps the fingerprint
+                coda_statement['coda_hash'] = False
         # we already initialise the coda_statement['name'] field
         # with the currently available date
         # in case an 8 record is present, this data will be updated
@@ -271,29 +307,30 @@ class account_coda_import(orm.TransientModel):
 
         return coda_parsing_note
 
-    def _coda_record_2(self, cr, uid, coda_statement, line,
+    def _coda_record_2(self, cr, uid, coda_statement, record,
                        coda_parsing_note, st_line_seq, context=None):
 
-        if line[1] == '1':
+        record_type = record.record_type
+        if record_type == '21':
             coda_parsing_note, st_line_seq = self._coda_record_21(
-                cr, uid, coda_statement, line, coda_parsing_note,
+                cr, uid, coda_statement, record, coda_parsing_note,
                 st_line_seq, context=context)
 
-        elif line[1] == '2':
+        elif record_type == '22':
             coda_parsing_note = self._coda_record_22(
-                cr, uid, coda_statement, line, coda_parsing_note,
+                cr, uid, coda_statement, record, coda_parsing_note,
                 st_line_seq, context=context)
 
-        elif line[1] == '3':
+        elif record_type == '23':
             coda_parsing_note = self._coda_record_23(
-                cr, uid, coda_statement, line, coda_parsing_note,
+                cr, uid, coda_statement, record, coda_parsing_note,
                 st_line_seq, context=context)
 
         else:
             # movement data record 2.x (x <> 1,2,3)
             err_string = _(
                 "'\nMovement data records of type 2.%s are not supported !"
-                ) % line[1]
+                ) % record_type[1:]
             err_code = 'R2009'
             if self._batch:
                 return err_code, err_string
@@ -301,7 +338,7 @@ class account_coda_import(orm.TransientModel):
 
         return coda_parsing_note, st_line_seq
 
-    def _coda_record_21(self, cr, uid, coda_statement, line,
+    def _coda_record_21(self, cr, uid, coda_statement, record,
                         coda_parsing_note, st_line_seq, context=None):
 
         # list of lines parsed already
@@ -336,9 +373,9 @@ class account_coda_import(orm.TransientModel):
         st_line['globalisation_amount'] = False
         st_line['amount'] = False
 
-        st_line['ref'] = line[2:10]
-        st_line['ref_move'] = line[2:6]
-        st_line['ref_move_detail'] = line[6:10]
+        st_line['ref'] = record.ref
+        st_line['ref_move'] = record.ref_move
+        st_line['ref_move_detail'] = record.ref_move_detail
 
         if st_line_seq == 1:
             # initialise main_move_stack
@@ -352,15 +389,11 @@ class account_coda_import(orm.TransientModel):
             # re-initialise globalisation stack
             glob_lvl_stack = [0]
 
-        st_line['trans_ref'] = line[10:31]
-        st_line_amt = list2float(line[32:47])
-        if line[31] == '1':    # 1=debit
-            st_line_amt = - st_line_amt
+        st_line['trans_ref'] = record.trans_ref
+        st_line_amt = record.amount
 
-        st_line['trans_type'] = line[53]
-        trans_type = filter(
-            lambda x: st_line['trans_type'] == x['type'],
-            self._trans_type_table)
+        st_line['trans_type'] = record.trans_type
+        trans_type = self._trans_type_table.get(st_line['trans_type'])
         if not trans_type:
             err_string = _(
                 "\nThe File contains an invalid CODA Transaction Type : %s!"
@@ -369,11 +402,11 @@ class account_coda_import(orm.TransientModel):
             if self._batch:
                 return err_code, err_string
             raise orm.except_orm(_('Data Error!'), err_string)
-        st_line['trans_type_id'] = trans_type[0]['id']
-        st_line['trans_type_desc'] = trans_type[0]['description']
+        st_line['trans_type_id'] = trans_type['id']
+        st_line['trans_type_desc'] = trans_type['description']
 
         # processing of amount depending on globalisation code
-        glob_lvl_flag = int(line[124])
+        glob_lvl_flag = record.glob_lvl_flag
         if glob_lvl_flag > 0:
             if glob_lvl_stack[-1] == glob_lvl_flag:
                 st_line['glob_lvl_flag'] = glob_lvl_flag
@@ -424,13 +457,11 @@ class account_coda_import(orm.TransientModel):
                     main_move_stack[-1]['detail_cnt'] += 1
 
         # positions 48-53 : Value date or 000000 if not known (DDMMYY)
-        st_line['val_date'] = str2date(line[47:53])
+        st_line['val_date'] = record.val_date
         # positions 54-61 : transaction code
-        st_line['trans_family'] = line[54:56]
-        trans_family = filter(
-            lambda x: (x['type'] == 'family') and (
-                st_line['trans_family'] == x['code']),
-            self._trans_code_table)
+        st_line['trans_family'] = record.trans_family
+        trans_family = self._trans_code_table.get(
+            ('family', st_line['trans_family'], False))
         if not trans_family:
             err_string = _(
                 "'\nThe File contains an invalid "
@@ -440,40 +471,35 @@ class account_coda_import(orm.TransientModel):
             if self._batch:
                 return err_code, err_string
             raise orm.except_orm(_('Data Error!'), err_string)
-        st_line['trans_family_id'] = trans_family[0]['id']
-        st_line['trans_family_desc'] = trans_family[0]['description']
-        st_line['trans_code'] = line[56:58]
-        trans_code = filter(
-            lambda x:
-            (x['type'] == 'code') and (st_line['trans_code'] == x['code'])
-            and (trans_family[0]['id'] == x['parent_id'][0]),
-            self._trans_code_table)
+        st_line['trans_family_id'] = trans_family['id']
+        st_line['trans_family_desc'] = trans_family['description']
+        st_line['trans_code'] = record.trans_code
+        trans_code = self._trans_code_table.get(
+            ('code', st_line['trans_code'], trans_family['id']))
         if trans_code:
-            st_line['trans_code_id'] = trans_code[0]['id']
-            st_line['trans_code_desc'] = trans_code[0]['description']
+            st_line['trans_code_id'] = trans_code['id']
+            st_line['trans_code_desc'] = trans_code['description']
         else:
             st_line['trans_code_id'] = None
             st_line['trans_code_desc'] = _(
                 "Transaction Code unknown, "
                 "please consult your bank.")
-        st_line['trans_category'] = line[58:61]
-        trans_category = filter(
-            lambda x: st_line['trans_category'] == x['category'],
-            self._trans_category_table)
+        st_line['trans_category'] = record.trans_category
+        trans_category = self._trans_category_table.get(
+            st_line['trans_category'])
         if trans_category:
-            st_line['trans_category_id'] = trans_category[0]['id']
-            st_line['trans_category_desc'] = trans_category[0]['description']
+            st_line['trans_category_id'] = trans_category['id']
+            st_line['trans_category_desc'] = trans_category['description']
         else:
             st_line['trans_category_id'] = None
             st_line['trans_category_desc'] = _(
                 "Transaction Category unknown, "
                 "please consult your bank.")
         # positions 61-115 : communication
-        if line[61] == '1':
-            st_line['struct_comm_type'] = line[62:65]
-            comm_type = filter(
-                lambda x: st_line['struct_comm_type'] == x['code'],
-                self._comm_type_table)
+        if record.comm_structured == '1':
+            st_line['struct_comm_type'] = record.struct_comm_type
+            comm_type = self._comm_type_table.get(
+                st_line['struct_comm_type'])
             if not comm_type:
                 err_string = _(
                     "\nThe File contains an invalid "
@@ -483,11 +509,11 @@ class account_coda_import(orm.TransientModel):
                 if self._batch:
                     return err_code, err_string
                 raise orm.except_orm(_('Data Error!'), err_string)
-            st_line['struct_comm_type_id'] = comm_type[0]['id']
-            st_line['struct_comm_type_desc'] = comm_type[0]['description']
-            st_line['communication'] = st_line['name'] = line[65:115]
+            st_line['struct_comm_type_id'] = comm_type['id']
+            st_line['struct_comm_type_desc'] = comm_type['description']
+            st_line['communication'] = st_line['name'] = record.struct_comm
             if st_line['struct_comm_type'] in ['101', '102']:
-                bbacomm = line[65:77]
+                bbacomm = record.struct_comm[:12]
                 st_line['struct_comm_bba'] = st_line['name'] = \
                     '+++' + bbacomm[0:3] + '/' + bbacomm[3:7] + \
                     '/' + bbacomm[7:] + '+++'
@@ -496,8 +522,8 @@ class account_coda_import(orm.TransientModel):
                 # SEPA SCT <CdtrRefInf> reference
                 st_line['creditor_reference'] = bbacomm
         else:
-            st_line['communication'] = st_line['name'] = line[62:115]
-        st_line['entry_date'] = str2date(line[115:121])
+            st_line['communication'] = st_line['name'] = record.free_comm
+        st_line['entry_date'] = record.entry_date
         if st_line['sequence'] == 1:
             coda_statement['first_transaction_date'] = st_line['entry_date']
         # positions 122-124 not processed
@@ -537,57 +563,46 @@ class account_coda_import(orm.TransientModel):
 
         return coda_parsing_note, st_line_seq
 
-    def _coda_record_22(self, cr, uid, coda_statement, line,
+    def _coda_record_22(self, cr, uid, coda_statement, record,
                         coda_parsing_note, st_line_seq, context=None):
 
         st_line = coda_statement['coda_statement_lines'][st_line_seq]
-        if st_line['ref'][0:4] != line[2:6]:
+        if st_line['ref'][0:4] != record.ref[0:4]:
             err_string = _(
                 "\nCODA parsing error on movement data record 2.2, seq nr %s!"
                 "\nPlease report this issue via your Odoo support channel."
-                ) % line[2:10]
+                ) % record.ref
             err_code = 'R2004'
             if self._batch:
                 return err_code, err_string
             raise orm.except_orm(_('Error!'), err_string)
-        st_line['name'] += line[10:63]
-        st_line['communication'] += line[10:63]
-        st_line['payment_reference'] = line[63:98].strip()
-        st_line['counterparty_bic'] = line[98:109].strip()
+        st_line['name'] += record.communication
+        st_line['communication'] += record.communication
+        st_line['payment_reference'] = record.payment_reference
+        st_line['counterparty_bic'] = record.counterparty_bic
 
         return coda_parsing_note
 
-    def _coda_record_23(self, cr, uid, coda_statement, line,
+    def _coda_record_23(self, cr, uid, coda_statement, record,
                         coda_parsing_note, st_line_seq, context=None):
 
         st_line = coda_statement['coda_statement_lines'][st_line_seq]
-        if st_line['ref'][0:4] != line[2:6]:
+        if st_line['ref'][0:4] != record.ref[0:4]:
             err_string = _(
                 "\nCODA parsing error on movement data record 2.3, seq nr %s!"
                 "'\nPlease report this issue via your Odoo support channel."
-                ) % line[2:10]
+                ) % record.ref
             err_code = 'R2005'
             if self._batch:
                 return err_code, err_string
             raise orm.except_orm(_('Error!'), err_string)
 
-        if coda_statement['coda_version'] == '1':
-            counterparty_number = line[10:22].strip()
-            counterparty_name = line[47:125].strip()
-            counterparty_currency = ''
-        else:
-            if line[22] == ' ':
-                counterparty_number = line[10:22].strip()
-                counterparty_currency = line[23:26].strip()
-            else:
-                counterparty_number = line[10:44].strip()
-                counterparty_currency = line[44:47].strip()
-            counterparty_name = line[47:82].strip()
-            st_line['name'] += line[82:125]
-            st_line['communication'] += line[82:125]
-        st_line['counterparty_number'] = counterparty_number
-        st_line['counterparty_currency'] = counterparty_currency
-        st_line['counterparty_name'] = counterparty_name
+        if coda_statement['coda_version'] != '1':
+            st_line['name'] += record.communication
+            st_line['communication'] += record.communication
+        st_line['counterparty_number'] = record.counterparty_number
+        st_line['counterparty_currency'] = record.counterparty_currency
+        st_line['counterparty_name'] = record.counterparty_name
         """
         TO DO:
         replace code infra by check on flag 128 and copy info in Notes Field.
@@ -596,7 +611,7 @@ class account_coda_import(orm.TransientModel):
             err_string = _(
                 "\nCODA parsing error on movement data record 2.3, seq nr %s!"
                 "\nPlease report this issue via your Odoo support channel."
-                ) % line[2:10]
+                ) % record.ref
             err_code = 'R2006'
             if self._batch:
                 return err_code, err_string
@@ -604,33 +619,35 @@ class account_coda_import(orm.TransientModel):
         """
 
         if st_line['type'] == 'regular':
-            coda_parsing_note = self._match_and_reconcile(
-                cr, uid, coda_statement, st_line, coda_parsing_note,
-                context=context)
+            with self._timer.phase('match', rows=1):
+                coda_parsing_note = self._match_and_reconcile(
+                    cr, uid, coda_statement, st_line, coda_parsing_note,
+                    context=context)
 
         return coda_parsing_note
 
-    def _coda_record_3(self, cr, uid, coda_statement, line,
+    def _coda_record_3(self, cr, uid, coda_statement, record,
                        coda_parsing_note, st_line_seq, context=None):
 
-        if line[1] == '1':
+        record_type = record.record_type
+        if record_type == '31':
             coda_parsing_note, st_line_seq = self._coda_record_31(
-                cr, uid, coda_statement, line, coda_parsing_note,
+                cr, uid, coda_statement, record, coda_parsing_note,
                 st_line_seq, context=context)
 
-        elif line[1] == '2':
+        elif record_type == '32':
             coda_parsing_note = self._coda_record_32(
-                cr, uid, coda_statement, line, coda_parsing_note,
+                cr, uid, coda_statement, record, coda_parsing_note,
                 st_line_seq, context=context)
 
-        elif line[1] == '3':
+        elif record_type == '33':
             coda_parsing_note = self._coda_record_33(
-                cr, uid, coda_statement, line, coda_parsing_note,
+                cr, uid, coda_statement, record, coda_parsing_note,
                 st_line_seq, context=context)
 
         return coda_parsing_note, st_line_seq
 
-    def _coda_record_31(self, cr, uid, coda_statement, line,
+    def _coda_record_31(self, cr, uid, coda_statement, record,
                         coda_parsing_note, st_line_seq, context=None):
 
         # list of lines parsed already
@@ -644,15 +661,13 @@ class account_coda_import(orm.TransientModel):
         info_line['struct_comm_type'] = ''
         info_line['struct_comm_type_desc'] = ''
         info_line['communication'] = ''
-        info_line['ref'] = line[2:10]
-        info_line['ref_move'] = line[2:6]
-        info_line['ref_move_detail'] = line[6:10]
-        info_line['trans_ref'] = line[10:31]
+        info_line['ref'] = record.ref
+        info_line['ref_move'] = record.ref_move
+        info_line['ref_move_detail'] = record.ref_move_detail
+        info_line['trans_ref'] = record.trans_ref
         # positions 32-38 : transaction code
-        info_line['trans_type'] = line[31]
-        trans_type = filter(
-            lambda x: info_line['trans_type'] == x['type'],
-            self._trans_type_table)
+        info_line['trans_type'] = record.trans_type
+        trans_type = self._trans_type_table.get(info_line['trans_type'])
         if not trans_type:
             err_string = _(
                 "'\nThe File contains an invalid CODA Transaction Type : %s!"
@@ -661,12 +676,10 @@ class account_coda_import(orm.TransientModel):
             if self._batch:
                 return err_code, err_string
             raise orm.except_orm(_('Data Error!'), err_string)
-        info_line['trans_type_desc'] = trans_type[0]['description']
-        info_line['trans_family'] = line[32:34]
-        trans_family = filter(
-            lambda x: (x['type'] == 'family')
-            and (info_line['trans_family'] == x['code']),
-            self._trans_code_table)
+        info_line['trans_type_desc'] = trans_type['description']
+        info_line['trans_family'] = record.trans_family
+        trans_family = self._trans_code_table.get(
+            ('family', info_line['trans_family'], False))
         if not trans_family:
             err_string = _(
                 "\nThe File contains an invalid CODA Transaction Family : %s!"
@@ -675,34 +688,29 @@ class account_coda_import(orm.TransientModel):
             if self._batch:
                 return err_code, err_string
             raise orm.except_orm(_('Data Error!'), err_string)
-        info_line['trans_family_desc'] = trans_family[0]['description']
-        info_line['trans_code'] = line[34:36]
-        trans_code = filter(
-            lambda x: (x['type'] == 'code')
-            and (info_line['trans_code'] == x['code'])
-            and (trans_family[0]['id'] == x['parent_id'][0]),
-            self._trans_code_table)
+        info_line['trans_family_desc'] = trans_family['description']
+        info_line['trans_code'] = record.trans_code
+        trans_code = self._trans_code_table.get(
+            ('code', info_line['trans_code'], trans_family['id']))
         if trans_code:
-            info_line['trans_code_desc'] = trans_code[0]['description']
+            info_line['trans_code_desc'] = trans_code['description']
         else:
             info_line['trans_code_desc'] = _(
                 "Transaction Code unknown, please consult your bank.")
-        info_line['trans_category'] = line[36:39]
-        trans_category = filter(
-            lambda x: info_line['trans_category'] == x['category'],
-            self._trans_category_table)
+        info_line['trans_category'] = record.trans_category
+        trans_category = self._trans_category_table.get(
+            info_line['trans_category'])
         if trans_category:
             info_line['trans_category_desc'] = \
-                trans_category[0]['description']
+                trans_category['description']
         else:
             info_line['trans_category_desc'] = _(
                 "Transaction Category unknown, please consult your bank.")
         # positions 40-113 : communication
-        if line[39] == '1':
-            info_line['struct_comm_type'] = line[40:43]
-            comm_type = filter(
-                lambda x: info_line['struct_comm_type'] == x['code'],
-                self._comm_type_table)
+        if record.comm_structured == '1':
+            info_line['struct_comm_type'] = record.struct_comm_type
+            comm_type = self._comm_type_table.get(
+                info_line['struct_comm_type'])
             if not comm_type:
                 err_string = _(
                     "'\nThe File contains an invalid "
@@ -712,68 +720,70 @@ class account_coda_import(orm.TransientModel):
                 if self._batch:
                     return err_code, err_string
                 raise orm.except_orm(_('Data Error!'), err_string)
-            info_line['struct_comm_type_desc'] = comm_type[0]['description']
-            info_line['communication'] = info_line['name'] = line[43:113]
+            info_line['struct_comm_type_desc'] = comm_type['description']
+            info_line['communication'] = info_line['name'] = \
+                record.struct_comm
         else:
-            info_line['communication'] = info_line['name'] = line[40:113]
+            info_line['communication'] = info_line['name'] = \
+                record.free_comm
         # positions 114-128 not processed
 
         # store transaction
         coda_statement['coda_statement_lines'][st_line_seq] = info_line
         return coda_parsing_note, st_line_seq
 
-    def _coda_record_32(self, cr, uid, coda_statement, line,
+    def _coda_record_32(self, cr, uid, coda_statement, record,
                         coda_parsing_note, st_line_seq, context=None):
 
         st_line = coda_statement['coda_statement_lines'][st_line_seq]
-        if st_line['ref_move'] != line[2:6]:
+        if st_line['ref_move'] != record.ref_move:
             err_string = _(
                 "'\nCODA parsing error on "
                 "information data record 3.2, seq nr %s!"
                 "\nPlease report this issue via your Odoo support channel."
-                ) % line[2:10]
+                ) % record.ref
             err_code = 'R3004'
             if self._batch:
                 return err_code, err_string
             raise orm.except_orm(_('Error!'), err_string)
-        st_line['name'] += line[10:115]
-        st_line['communication'] += line[10:115]
+        st_line['name'] += record.communication
+        st_line['communication'] += record.communication
 
         return coda_parsing_note
 
-    def _coda_record_33(self, cr, uid, coda_statement, line,
+    def _coda_record_33(self, cr, uid, coda_statement, record,
                         coda_parsing_note, st_line_seq, context=None):
 
         st_line = coda_statement['coda_statement_lines'][st_line_seq]
-        if st_line['ref_move'] != line[2:6]:
+        if st_line['ref_move'] != record.ref_move:
             err_string = _(
                 "'\nCODA parsing error on "
                 "information data record 3.3, seq nr %s!"
                 "\nPlease report this issue via your Odoo support channel."
-                ) % line[2:10]
+                ) % record.ref
             err_code = 'R3005'
             if self._batch:
                 return err_code, err_string
             raise orm.except_orm(_('Error!'), err_string)
-        st_line['name'] += line[10:100]
-        st_line['communication'] += line[10:100]
+        st_line['name'] += record.communication
+        st_line['communication'] += record.communication
 
         return coda_parsing_note
 
-    def _coda_record_4(self, cr, uid, coda_statement, line,
+    def _coda_record_4(self, cr, uid, coda_statement, record,
                        coda_parsing_note, st_line_seq, context=None):
 
         comm_line = {}
         comm_line['type'] = 'communication'
         st_line_seq = st_line_seq + 1
         comm_line['sequence'] = st_line_seq
-        comm_line['ref'] = line[2:10]
-        comm_line['communication'] = comm_line['name'] = line[32:112]
+        comm_line['ref'] = record.ref
+        comm_line['communication'] = comm_line['name'] = record.communication
         coda_statement['coda_statement_lines'][st_line_seq] = comm_line
 
         return coda_parsing_note, st_line_seq
 
-    def _coda_record_8(self, cr, uid, coda_statement, line,
+    def _coda_record_8(self, cr, uid, coda_statement, record,
                        coda_parsing_note, st_line_seq, period_id,
                        context=None):
 
@@ -807,12 +817,9 @@ class account_coda_import(orm.TransientModel):
                 closeglobalise = coda_statement_lines[st_line_seq - 1]
                 closeglobalise.update({
                     'glob_lvl_flag': last_transaction['glob_lvl_flag']})
-        coda_statement['paper_nb_seq_number'] = line[1:4]
-        bal_end = list2float(line[42:57])
-        coda_statement['new_balance_date'] = str2date(line[57:63])
-        if line[41] == '1':    # 1=Debit
-            bal_end = - bal_end
-        coda_statement['balance_end_real'] = bal_end
+        coda_statement['paper_nb_seq_number'] = record.paper_nb_seq_number
+        coda_statement['new_balance_date'] = record.new_balance_date
+        coda_statement['balance_end_real'] = record.balance_end_real
         if not period_id:
             if coda_statement['new_balance_date']:
                 period_id = period_obj.search(
@@ -873,11 +880,11 @@ class account_coda_import(orm.TransientModel):
 
         return coda_parsing_note
 
-    def _coda_record_9(self, cr, uid, coda_statement, line,
+    def _coda_record_9(self, cr, uid, coda_statement, record,
                        coda_parsing_note, context=None):
 
-        coda_statement['balance_min'] = list2float(line[22:37])
-        coda_statement['balance_plus'] = list2float(line[37:52])
+        coda_statement['balance_min'] = record.balance_min
+        coda_statement['balance_plus'] = record.balance_plus
         if not coda_statement.get('balance_end_real'):
             coda_statement['balance_end_real'] = \
                 coda_statement['balance_start'] \
@@ -919,6 +926,40 @@ class account_coda_import(orm.TransientModel):
                 "to check the contents of %s."
                 ) % (coda_statement['name'], coda_statement['name'])
 
+    def _coda_statement_hash(self, cr, uid, coda_statement, context=None):
+        """
+        Fingerprint of a CODA statement, the statement is identified
+        by the fields of the old balance record (record 1).
+        """
+        key = '|'.join([
+            coda_statement['acc_number'],
+            coda_statement['currency'],
+            coda_statement['description'] or '',
+            coda_statement['coda_seq_number'],
+            coda_statement['paper_ob_seq_number'],
+            coda_statement['old_balance_date'] or '',
+            '%.2f' % coda_statement['balance_start']])
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def _coda_statement_duplicate(self, cr, uid, coda_hash, context=None):
+        """
+        Lookup via the coda_hash_uniq constraints of the
+        (CODA) Bank Statements.
+
+        Returns None or the (id, name) of the CODA File
+        of the statement with fingerprint 'coda_hash'.
+        """
+        cr.execute(
+            "SELECT ac.id, ac.name FROM account_bank_statement abs "
+            "LEFT OUTER JOIN account_coda ac ON ac.id = abs.coda_id "
+            "WHERE abs.coda_hash = %s "
+            "UNION ALL "
+            "SELECT ac.id, ac.name FROM coda_bank_statement cbs "
+            "LEFT OUTER JOIN account_coda ac ON ac.id = cbs.coda_id "
+            "WHERE cbs.coda_hash = %s "
+            "LIMIT 1", (coda_hash, coda_hash))
+        return cr.fetchone()
+
     def _check_duplicate(self, cr, uid, coda_statement, context=None):
 
         bank_st_obj = self.pool['account.bank.statement']
@@ -958,9 +999,66 @@ class account_coda_import(orm.TransientModel):
             'new_balance_date': coda_statement.get('new_balance_date'),
             'balance_start': coda_statement['balance_start'],
             'balance_end_real': coda_statement['balance_end_real'],
+            'coda_hash': coda_statement.get('coda_hash'),
         })
         return coda_st_id
 
+    def _get_previous_balance_end(self, cr, uid, journal_id, date,
+                                  context=None):
+        """
+        Returns the Closing Balance of the last Bank Statement of the
+        journal before 'date' or None if there is no such statement.
+
+        The date and Closing Balance of the latest statement per journal
+        are kept in self._journal_balances, hence the statements of
+        a CODA File are chained without database lookups.
+        """
+        if journal_id not in self._journal_balances:
+            cr.execute(
+                "SELECT date, balance_end_real "
+                "FROM account_bank_statement "
+                "WHERE journal_id = %s "
+                "ORDER BY date DESC, id DESC LIMIT 1",
+                (journal_id,))
+            self._journal_balances[journal_id] = cr.fetchone()
+        latest = self._journal_balances[journal_id]
+        if not latest:
+            return None
+        if latest[0] < date:
+            return latest[1]
+        # statement dated before the latest statement of the journal
+        cr.execute(
+            "SELECT balance_end_real "
+            "FROM account_bank_statement "
+            "WHERE journal_id = %s and date < %s "
+            "ORDER BY date DESC,id DESC LIMIT 1",
+            (journal_id, date))
+        res = cr.fetchone()
+        if not res:
+            return None
+        return res[0]
+
+    def _set_latest_balance_end(self, cr, uid, st_vals, context=None):
+        """
+        Update self._journal_balances with a new Bank Statement.
+        """
+        journal_id = st_vals['journal_id']
+        if journal_id not in self._journal_balances:
+            return
+        if not st_vals['date']:
+            # lookup the latest statement again
+            del self._journal_balances[journal_id]
+            return
+        latest = self._journal_balances[journal_id]
+        if latest and st_vals['date'] < latest[0]:
+            return
+        # the Closing Balance as stored in the database
+        digits = self.pool['decimal.precision'].precision_get(
+            cr, uid, 'Account')
+        balance_end = float(float_repr(float_round(
+            st_vals['balance_end_real'], precision_digits=digits), digits))
+        self._journal_balances[journal_id] = (st_vals['date'], balance_end)
+
     def _create_bank_statement(self, cr, uid,
                                coda_statement, context=None):
 
@@ -972,16 +1070,9 @@ class account_coda_import(orm.TransientModel):
             cr, uid, coda_statement['journal_id'], context=context)
         balance_start_check_date = coda_statement[
             'first_transaction_date'] or coda_statement['date']
-        cr.execute(
-            "SELECT balance_end_real "
-            "FROM account_bank_statement "
-            "WHERE journal_id = %s and date < %s "
-            "ORDER BY date DESC,id DESC LIMIT 1",
-            (coda_statement['journal_id'], balance_start_check_date))
-        res = cr.fetchone()
-        if res:
-            balance_start_check = res[0]
-        else:
+        balance_start_check = self._get_previous_balance_end(
+            cr, uid, journal.id, balance_start_check_date, context=context)
+        if balance_start_check is None:
             if journal.default_debit_account_id and \
                     (journal.default_credit_account_id
                      == journal.default_debit_account_id):
@@ -1021,13 +1112,16 @@ class account_coda_import(orm.TransientModel):
             'balance_end_real': coda_statement['balance_end_real'],
             'state': 'draft',
             'company_id': coda_statement['company_id'],
+            'coda_hash': coda_statement.get('coda_hash'),
         }
 
         try:
-            bank_st_id = bank_st_obj.create(
+            with cr.savepoint():
+                bank_st_id = bank_st_obj.create(
+                    cr, uid, st_vals, context=context)
+            self._set_latest_balance_end(
                 cr, uid, st_vals, context=context)
         except orm.except_orm, e:
-            cr.rollback()
             self._nb_err += 1
             self._err_string += _('\nError ! ') + str(e)
             tb = ''.join(format_exception(*exc_info()))
@@ -1035,7 +1129,6 @@ class account_coda_import(orm.TransientModel):
                 "Application Error while processing Statement %s\n%s",
                 coda_statement.get('name', '/'), tb)
         except Exception, e:
-            cr.rollback()
             self._nb_err += 1
             self._err_string += _('\nSystem Error : ') + str(e)
             tb = ''.join(format_exception(*exc_info()))
@@ -1043,7 +1136,6 @@ class account_coda_import(orm.TransientModel):
                 "System Error while processing Statement %s\n%s",
                 coda_statement.get('name',  '/'), tb)
         except:
-            cr.rollback()
             self._nb_err += 1
             self._err_string = _('\nUnknown Error')
             tb = ''.join(format_exception(*exc_info()))
@@ -1053,13 +1145,50 @@ class account_coda_import(orm.TransientModel):
 
         return bank_st_id
 
+    def _reserve_globalisations(self, cr, uid, coda_statement,
+                                context=None):
+        """
+        Reserve the codes and ids of the globalisations of the statement.
+        The number of globalisations is derived from the globalisation
+        levels of the transactional records, cf. _prepare_statement_line.
+        """
+        glob_obj = self.pool['account.bank.statement.line.global']
+        lines = coda_statement['coda_statement_lines']
+        nb_globs = 0
+        glob_lvl_stack = [0]
+        for x in lines:
+            line = lines[x]
+            if line['type'] not in ['globalisation', 'regular']:
+                continue
+            if line['ref_move_detail'] == '0000':
+                glob_lvl_stack = [0]
+            glob_lvl_flag = line['glob_lvl_flag']
+            if glob_lvl_flag:
+                if glob_lvl_stack[-1] == glob_lvl_flag:
+                    glob_lvl_stack.pop()
+                else:
+                    glob_lvl_stack.append(glob_lvl_flag)
+                    nb_globs += 1
+        reserved = glob_obj._reserve(
+            cr, uid, nb_globs, 'statement.line.global')
+        reserved.reverse()
+        coda_statement['glob_reserved'] = reserved
+        coda_statement['glob_vals'] = []
+
+    def _create_globalisations(self, cr, uid, coda_statement, context=None):
+        glob_vals = coda_statement['glob_vals']
+        if glob_vals:
+            with self._timer.phase('create_globalisations',
+                                   rows=len(glob_vals)):
+                self.pool['account.bank.statement.line.global']._bulk_insert(
+                    cr, uid, glob_vals, context=context)
+            coda_statement['glob_vals'] = []
+
     def _prepare_statement_line(self, cr, uid, coda_statement, line,
                                 st_line_seq, context=None):
 
-        account_mapping_obj = self.pool['coda.account.mapping.rule']
         coda_st_line_obj = self.pool['coda.bank.statement.line']
         glob_obj = self.pool['account.bank.statement.line.global']
-        seq_obj = self.pool['ir.sequence']
 
         glob_id_stack = coda_statement['glob_id_stack']
         create_bank_st_line = False
@@ -1100,8 +1229,12 @@ class account_coda_import(orm.TransientModel):
                     glob_id_stack.pop()
                 else:
                     glob_name = line['name'].strip() or '/'
-                    glob_code = seq_obj.get(cr, uid, 'statement.line.global')
-                    glob_id = glob_obj.create(cr, uid, {
+                    if not coda_statement['glob_reserved']:
+                        coda_statement['glob_reserved'] = glob_obj._reserve(
+                            cr, uid, 1, 'statement.line.global')
+                    glob_id, glob_code = coda_statement['glob_reserved'].pop()
+                    coda_statement['glob_vals'].append({
+                        'id': glob_id,
                         'code': glob_code,
                         'name': glob_name,
                         'type': 'coda',
@@ -1137,6 +1270,11 @@ class account_coda_import(orm.TransientModel):
                      line['payment_reference'],
                      line['communication'])
 
+            if coda_statement['type'] == 'info':
+                # the CODA statement lines refer to the globalisations
+                self._create_globalisations(
+                    cr, uid, coda_statement, context=context)
+
             if line['type'] == 'globalisation' \
                     and coda_statement['type'] == 'info':
 
@@ -1191,25 +1329,9 @@ class account_coda_import(orm.TransientModel):
                         # defined in rules engine
                         if not line['reconcile'] \
                                 and coda_statement['account_mapping_ids']:
-                            kwargs = {
-                                'coda_bank_account_id':
-                                    coda_statement['coda_bank_account_id'],
-                                'trans_type_id': line['trans_type_id'],
-                                'trans_family_id': line['trans_family_id'],
-                                'trans_code_id': line['trans_code_id'],
-                                'trans_category_id':
-                                    line['trans_category_id'],
-                                'struct_comm_type_id':
-                                    line['struct_comm_type_id'],
-                                'partner_id': line['partner_id'],
-                                'freecomm': line['communication']
-                                    if not line['struct_comm_type'] else None,
-                                'structcomm': line['communication']
-                                    if line['struct_comm_type'] else None,
-                                'context': context,
-                            }
-                            rule = account_mapping_obj.rule_get(
-                                cr, uid, **kwargs)
+                            rule = self._get_account_mapping_rule(
+                                cr, uid, coda_statement, line,
+                                context=context)
                             if rule:
                                 line['account_id'] = rule['account_id']
                                 line['tax_code_id'] = rule['tax_code_id']
@@ -1282,6 +1404,26 @@ class account_coda_import(orm.TransientModel):
         coda_statement['glob_id_stack'] = glob_id_stack
         return create_bank_st_line
 
+    def _get_account_mapping_rule(self, cr, uid, coda_statement, line,
+                                  context=None):
+        account_mapping_obj = self.pool['coda.account.mapping.rule']
+        kwargs = {
+            'coda_bank_account_id': coda_statement['coda_bank_account_id'],
+            'trans_type_id': line['trans_type_id'],
+            'trans_family_id': line['trans_family_id'],
+            'trans_code_id': line['trans_code_id'],
+            'trans_category_id': line['trans_category_id'],
+            'struct_comm_type_id': line['struct_comm_type_id'],
+            'partner_id': line['partner_id'],
+            'freecomm': line['communication']
+                if not line['struct_comm_type'] else None,
+            'structcomm': line['communication']
+                if line['struct_comm_type'] else None,
+            'context': context,
+        }
+        with self._timer.phase('mapping_rules', rows=1):
+            return account_mapping_obj.rule_get(cr, uid, **kwargs)
+
     def _prepare_st_line_vals(self, cr, uid, coda_statement, line,
                               context=None):
 
@@ -1305,23 +1447,30 @@ class account_coda_import(orm.TransientModel):
             st_line_vals['account_id'] = line['account_id']
         if line.get('bank_account_id'):
              st_line_vals['bank_account_id'] = line['bank_account_id']
+        if line.get('coda_reconcile_data'):
+            st_line_vals['coda_reconcile_data'] = line['coda_reconcile_data']
 
         return st_line_vals
 
-    def _create_bank_statement_line(self, cr, uid, coda_statement, line,
-                                    context=None):
-
+    def _create_bank_statement_lines(self, cr, uid, coda_statement, lines,
+                                     context=None):
+        """
+        The statement lines are created in bulk,
+        cf. account.bank.statement.line, _bulk_create method.
+        """
         absl_obj = self.pool['account.bank.statement.line']
 
-        st_line_vals = self._prepare_st_line_vals(
-            cr, uid, coda_statement, line, context=context)
-        st_line_id = absl_obj.create(cr, uid, st_line_vals, context=context)
-        line['st_line_id'] = st_line_id
-
-    def _create_move_and_reconcile(self, cr, uid, coda_statement, line,
-                                   context=None):
+        vals_list = [
+            self._prepare_st_line_vals(
+                cr, uid, coda_statement, line, context=context)
+            for line in lines]
+        st_line_ids = absl_obj._bulk_create(
+            cr, uid, vals_list, context=context)
+        for line, st_line_id in zip(lines, st_line_ids):
+            line['st_line_id'] = st_line_id
 
-        absl_obj = self.pool['account.bank.statement.line']
+    def _prepare_mv_line_dict(self, cr, uid, coda_statement, line,
+                              context=None):
         mv_line_dict = {}
 
         # the process_reconciliation method takes assumes that the
@@ -1337,8 +1486,10 @@ class account_coda_import(orm.TransientModel):
             cp_aml_id = line['reconcile']
             # Check if the same counterparty entry hasn't been processed
             # already. This happens when the same invoice is paid several
-            # times in the same bank statement.
-            if cp_aml_id not in coda_statement['reconcile_ids']:
+            # times in the same bank statement or, in case of deferred
+            # reconciliation, in the same CODA file.
+            if cp_aml_id not in coda_statement['reconcile_ids'] \
+                    and cp_aml_id not in self._deferred_aml_ids:
                 coda_statement['reconcile_ids'].append(cp_aml_id)
                 mv_line_dict['counterpart_move_line_id'] = cp_aml_id
 
@@ -1349,12 +1500,21 @@ class account_coda_import(orm.TransientModel):
             if line.get('analytic_account_id'):
                 mv_line_dict['analytic_account_id'] = \
                     line['analytic_account_id']
+        return mv_line_dict
+
+    def _create_move_and_reconcile(self, cr, uid, coda_statement, line,
+                                   context=None):
+
+        absl_obj = self.pool['account.bank.statement.line']
+        mv_line_dict = self._prepare_mv_line_dict(
+            cr, uid, coda_statement, line, context=context)
 
         try:
             err_string = ''
-            absl_obj.process_reconciliation(
-                cr, uid, line['st_line_id'], [mv_line_dict],
-                context=context)
+            with cr.savepoint():
+                absl_obj.process_reconciliation(
+                    cr, uid, line['st_line_id'], [mv_line_dict],
+                    context=context)
         except orm.except_orm, e:
             err_string = _('\nApplication Error : ') + str(e)
         except Exception, e:
@@ -1365,9 +1525,542 @@ class account_coda_import(orm.TransientModel):
             coda_statement['coda_parsing_note'] += err_string
 
 
+    def _split_coda_statements(self, records):
+        """
+        Generator returning the lines of the CODA file per statement.
+        """
+        st_lines = []
+        for line in records:
+            if not line:
+                continue
+            if line[0] == '0' and st_lines:
+                yield st_lines
+                st_lines = []
+            st_lines.append(line)
+        if st_lines:
+            yield st_lines
+
+    def _coda_statements(self, cr, uid, codafilename, records, period_id,
+                         coda_bank_table, context=None):
+        """
+        Generator returning the parsed CODA statements.
+
+        A statement is returned as soon as its trailer record has been
+        parsed. Only the statement being parsed is kept in memory.
+        The lines of a statement are read before its records are parsed
+        so that lookups can be done for the statement as a whole.
+
+        Remark:
+        Errors that are returned (instead of raised) in batch mode
+        are stored in self._parse_error.
+        """
+        coda_obj = self.pool['account.coda']
+
+        decode = CodaDecoder().decode
+        coda_statement = {}
+        st_ordinal = 0
+        for st_lines in self._split_coda_statements(records):
+
+            if st_lines[0][0] == '0':
+                st_ordinal += 1
+                if str(st_ordinal) in self._checkpoint['statements']:
+                    # statement processed by a previous run
+                    self._nb_checkpoint += 1
+                    continue
+
+            # records decoded ahead of the parsing, by line index
+            st_records = {}
+            for i, line in enumerate(st_lines):
+
+                rtype = line[0]
+                skip = coda_statement.get('skip')
+                if skip and rtype in '2348':
+                    continue
+                record = st_records.pop(i, None) or decode(line)
+
+                if rtype == '0':
+                    # start of a new statement within the CODA file
+                    coda_statement = {}
+                    st_line_seq = 0
+                    coda_parsing_note = ''
+                    coda_statement['ordinal'] = st_ordinal
+
+                    coda_parsing_note = self._coda_record_0(
+                        cr, uid, coda_statement, record, coda_parsing_note,
+                        context=context)
+                    self._coda_creation_date = coda_statement['date']
+
+                    if not self._coda_id:
+                        coda_id = coda_obj.search(
+                            cr, uid,
+                            [('name', '=', codafilename),
+                             ('coda_creation_date', '=',
+                              coda_statement['date'])])
+                        if coda_id:
+                            err_string = _(
+                                "\nCODA File with Filename '%s' and "
+                                "Creation Date '%s' has already been "
+                                "imported !") % (
+                                    codafilename, coda_statement['date'])
+                            err_code = 'W0001'
+                            if self._batch:
+                                self._parse_error = (err_code, err_string)
+                                return
+                            raise orm.except_orm(_('Warning !'), err_string)
+
+                elif rtype == '1':
+                    coda_parsing_note = self._coda_record_1(
+                        cr, uid, coda_statement, record, coda_parsing_note,
+                        coda_bank_table, context=context)
+                    cba = coda_statement.get('coda_bank_params')
+                    if cba and cba['find_partner'] \
+                            and not coda_statement['skip']:
+                        # the counterparty lookup is done at once for the
+                        # whole statement before the movement records
+                        # are matched
+                        with self._timer.phase('prefetch_counterparties'):
+                            for j, x in enumerate(st_lines):
+                                if x[:2] == '23':
+                                    st_records[j] = decode(x)
+                            self._prefetch_counterparty_banks(
+                                cr, uid,
+                                [x.counterparty_number
+                                 for x in st_records.itervalues()],
+                                context=context)
+
+                elif rtype == '2':
+                    # movement data record 2
+                    coda_parsing_note, st_line_seq = self._coda_record_2(
+                        cr, uid, coda_statement, record, coda_parsing_note,
+                        st_line_seq, context=context)
+
+                elif rtype == '3':
+                    # information data record 3
+                    coda_parsing_note, st_line_seq = self._coda_record_3(
+                        cr, uid, coda_statement, record, coda_parsing_note,
+                        st_line_seq, context=context)
+
+                elif rtype == '4':
+                    # free communication data record 4
+                    coda_parsing_note, st_line_seq = self._coda_record_4(
+                        cr, uid, coda_statement, record, coda_parsing_note,
+                        st_line_seq, context=context)
+
+                elif rtype == '8':
+                    # new balance record
+                    coda_parsing_note = self._coda_record_8(
+                        cr, uid, coda_statement, record, coda_parsing_note,
+                        st_line_seq, period_id, context=context)
+
+                elif rtype == '9':
+                    # footer record
+                    coda_parsing_note = self._coda_record_9(
+                        cr, uid, coda_statement, record, coda_parsing_note,
+                        context=context)
+                    if not coda_statement['skip']:
+                        yield coda_statement
+
+    def _process_coda_statement(self, cr, uid, coda_statement,
+                                context=None):
+        """
+        Create the (CODA) Bank Statement, the statement lines
+        and the account moves of a parsed CODA statement.
+
+        Returns False when the Bank Statement could not be created.
+        """
+        bank_st_obj = self.pool['account.bank.statement']
+        journal_obj = self.pool['account.journal']
+
+        cba = coda_statement['coda_bank_params']
+        self._normal2info(cr, uid, coda_statement, context=context)
+        discard = self._check_duplicate(
+            cr, uid, coda_statement, context=context)
+
+        if coda_statement['type'] == 'info':
+            with self._timer.phase('create_statement', rows=1):
+                coda_st_id = self._create_info_statement(
+                    cr, uid, coda_statement, context=context)
+            coda_statement['coda_st_id'] = coda_st_id
+
+        elif not discard:
+            with self._timer.phase('create_statement', rows=1):
+                bank_st_id = self._create_bank_statement(
+                    cr, uid, coda_statement, context=context)
+            if bank_st_id:
+                coda_statement['bank_st_id'] = bank_st_id
+            else:
+                return False
+
+        # prepare bank statement line values and merge
+        # information records into the statement line
+        st_line_seq = 0
+        coda_statement['reconcile_ids'] = []
+        coda_statement['glob_id_stack'] = []
+
+        lines = coda_statement['coda_statement_lines']
+        with self._timer.phase('reserve_globalisations'):
+            self._reserve_globalisations(
+                cr, uid, coda_statement, context=context)
+        bank_st_lines = []
+        for x in lines:
+            line = lines[x]
+            with self._timer.phase('prepare_line', rows=1):
+                create_bank_st_line = self._prepare_statement_line(
+                    cr, uid, coda_statement, line, st_line_seq,
+                    context=context)
+                if create_bank_st_line:
+                    res_line_hook = self._st_line_hook(
+                        cr, uid, coda_statement, line, context=context)
+                    if res_line_hook:
+                        bank_st_lines += res_line_hook
+        self._create_globalisations(cr, uid, coda_statement, context=context)
+
+        # creation of bank statement lines, account moves
+        if coda_statement['type'] == 'normal':
+            # resequence since _st_line_hook may add/remove lines
+            st_line_seq = 0
+            st_balance_end = round(coda_statement['balance_start'], 2)
+            for st_line in bank_st_lines:
+                st_line_seq += 1
+                st_line['sequence'] = st_line_seq
+                st_balance_end += round(st_line['amount'], 2)
+            if self._deferred_reconcile:
+                # the moves and reconciliations are created by the
+                # account.coda reconcile_deferred background job
+                nb_deferred = 0
+                deferred_aml_ids = []
+                for st_line in bank_st_lines:
+                    if st_line.get('reconcile') \
+                            or st_line.get('account_id'):
+                        mv_line_dict = self._prepare_mv_line_dict(
+                            cr, uid, coda_statement, st_line,
+                            context=context)
+                        st_line['coda_reconcile_data'] = json.dumps(
+                            mv_line_dict)
+                        if mv_line_dict.get('counterpart_move_line_id'):
+                            deferred_aml_ids.append(
+                                mv_line_dict['counterpart_move_line_id'])
+                        nb_deferred += 1
+                # the counterparts are still open until the background
+                # job has run, hence they are excluded from the matching
+                # of the next statements
+                self._deferred_aml_ids.update(deferred_aml_ids)
+            with self._timer.phase('create_lines', rows=len(bank_st_lines)):
+                self._create_bank_statement_lines(
+                    cr, uid, coda_statement, bank_st_lines, context=context)
+            if self._deferred_reconcile:
+                if nb_deferred:
+                    cr.execute(
+                        "UPDATE account_coda SET "
+                        "reconcile_state = 'pending', "
+                        "reconcile_total = "
+                        "COALESCE(reconcile_total, 0) + %s "
+                        "WHERE id = %s", (nb_deferred, self._coda_id))
+            else:
+                for st_line in bank_st_lines:
+                    if st_line.get('reconcile') \
+                            or st_line.get('account_id'):
+                        with self._timer.phase('reconcile', rows=1):
+                            self._create_move_and_reconcile(
+                                cr, uid, coda_statement, st_line,
+                                context=context)
+
+            if round(st_balance_end
+                     - coda_statement['balance_end_real'], 2):
+                err_string = _(
+                    "\nIncorrect ending Balance in CODA Statement %s "
+                    "for Bank Account %s!") % (
+                        coda_statement['coda_seq_number'],
+                        coda_statement['acc_number']
+                        + ' (' + coda_statement['currency']
+                        + ') - ' + coda_statement['description'])
+                coda_statement['coda_parsing_note'] += '\n' + err_string
+
+            # calculate balance_end
+            bank_st_obj.button_dummy(
+                cr, uid, [bank_st_id], context=context)
+            journal = journal_obj.browse(
+                cr, uid, cba['journal_id'][0], context=context)
+            journal_name = journal.name
+
+        else:  # type 'info'
+            journal_name = _('None')
+
+        self._coda_import_note = self._coda_import_note + \
+            _('\n\nBank Journal: %s'
+              '\nCODA Version: %s'
+              '\nCODA Sequence Number: %s'
+              '\nPaper Statement Sequence Number: %s'
+              '\nBank Account: %s'
+              '\nAccount Holder Name: %s'
+              '\nDate: %s, Starting Balance:  %.2f, Ending Balance: %.2f'
+              '%s'
+              ) % (journal_name,
+                   coda_statement['coda_version'],
+                   coda_statement['coda_seq_number'],
+                   coda_statement.get('paper_nb_seq_number')
+                   or coda_statement['paper_ob_seq_number'],
+                   coda_statement['acc_number']
+                   + ' (' + coda_statement['currency'] + ') - '
+                   + coda_statement['description'],
+                   coda_statement['acc_holder'],
+                   coda_statement['date'],
+                   float(coda_statement['balance_start']),
+                   float(coda_statement['balance_end_real']),
+                   coda_statement['coda_parsing_note'] % {
+                       'name': coda_statement['name']})
+
+        if coda_statement.get('separate_application') != '00000':
+            self._coda_import_note += _(
+                "'\nCode Separate Application: %s"
+                ) % coda_statement['separate_application']
+        if coda_statement['type'] == 'normal' \
+                and coda_statement['coda_note']:
+            bank_st_obj.write(
+                cr, uid, coda_statement['bank_st_id'],
+                {'coda_note': coda_statement['coda_note']})
+
+        return True
+
+    def _dry_run_statement(self, cr, uid, coda_statement, context=None):
+        """
+        Match statistics and proposed reconciliations of a parsed
+        CODA statement, cf. coda_dry_run.
+        The matching has been performed while parsing the statement,
+        the account mapping rules are evaluated here.
+
+        Returns the report of the statement.
+        """
+        move_line_obj = self.pool['account.move.line']
+
+        self._normal2info(cr, uid, coda_statement, context=context)
+        discard = self._check_duplicate(
+            cr, uid, coda_statement, context=context)
+        lines = coda_statement['coda_statement_lines']
+        transactions = [
+            lines[x] for x in lines
+            if lines[x]['type'] in ['globalisation', 'regular']
+            and lines[x]['amount']]
+        report = '\n\n' + _("Statement %s (%s %s) : %s transactions") % (
+            coda_statement.get('name', '/'), coda_statement['acc_number'],
+            coda_statement['currency'], len(transactions))
+        if coda_statement['type'] == 'info':
+            if discard:
+                report += '\n    ' + _("Duplicate, no Bank Statement.")
+            else:
+                report += '\n    ' + _("CODA Bank Statement only.")
+            return report
+
+        labels = [
+            ('payment_reference', _('Payment Reference')),
+            ('invoice', _('Invoice')),
+            ('sale_order', _('Sale Order')),
+            ('counterparty', _('Counterparty')),
+            ('transfer_account', _('Internal Transfer')),
+            ('account_mapping', _('Account Mapping Rule')),
+            (None, _('Not matched')),
+        ]
+        stats = dict.fromkeys([x[0] for x in labels], 0)
+        for line in transactions:
+            matched_by = line.get('matched_by')
+            if not line.get('reconcile') \
+                    and not matched_by == 'transfer_account' \
+                    and coda_statement['account_mapping_ids']:
+                if self._get_account_mapping_rule(
+                        cr, uid, coda_statement, line, context=context):
+                    matched_by = 'account_mapping'
+            stats[matched_by] = stats.get(matched_by, 0) + 1
+        report += '\n    ' + ', '.join(
+            ['%s: %s' % (label, stats[key]) for key, label in labels])
+
+        st_lines = [x for x in transactions if x.get('reconcile')]
+        if st_lines:
+            report += '\n    ' + _("Proposed reconciliations :")
+            move_lines = dict([
+                (x.id, x) for x in move_line_obj.browse(
+                    cr, uid, [x['reconcile'] for x in st_lines],
+                    context=context)])
+            for line in st_lines:
+                aml = move_lines[line['reconcile']]
+                report += '\n        %s  %.2f  %s -> %s %s (%s)' % (
+                    line['ref'], line['amount'],
+                    aml.partner_id.name or line['counterparty_name'] or '',
+                    aml.move_id.name, aml.ref or '',
+                    dict(labels).get(line.get('matched_by'), ''))
+        return report
+
+    def _read_checkpoint(self, cr, uid, context=None):
+        """
+        Checkpoint of a CODA File that is processed again.
+
+        The statements are identified by their position in the CODA File,
+        hence the checkpoint is ignored when the CODA File has changed.
+        Statements of which the (CODA) Bank Statement has been removed
+        are processed again.
+        """
+        checkpoint = {'statements': {}}
+        if not self._coda_id:
+            return checkpoint
+        coda = self.pool['account.coda'].read(
+            cr, uid, self._coda_id, ['checkpoint', 'coda_hash'],
+            context=context)
+        if not coda['checkpoint']:
+            return checkpoint
+        res = json.loads(coda['checkpoint'])
+        if res.get('coda_hash') != self._coda_hash:
+            return checkpoint
+        for model, field in [('account.bank.statement', 'bank_st_id'),
+                             ('coda.bank.statement', 'coda_st_id')]:
+            st_ids = [x[field] for x in res['statements'].values()
+                      if x.get(field)]
+            if not st_ids:
+                continue
+            st_ids = set(self.pool[model].search(
+                cr, uid, [('id', 'in', st_ids)], context=context))
+            for key, st in res['statements'].items():
+                if st.get(field) and st[field] not in st_ids:
+                    del res['statements'][key]
+        checkpoint['statements'] = res['statements']
+        return checkpoint
+
+    def _write_checkpoint(self, cr, uid, coda_statement, error=None,
+                          context=None):
+        """
+        Record the outcome of the processing of a statement
+        in the checkpoint of the CODA File.
+        """
+        checkpoint = self._checkpoint
+        checkpoint['coda_hash'] = self._coda_hash
+        if error:
+            checkpoint['failed'] = {
+                'statement': coda_statement.get('ordinal'),
+                'coda_seq_number': coda_statement.get('coda_seq_number'),
+                'error': error,
+            }
+        else:
+            checkpoint['statements'][str(coda_statement['ordinal'])] = {
+                'coda_seq_number': coda_statement.get('coda_seq_number'),
+                'acc_number': coda_statement.get('acc_number'),
+                'bank_st_id': coda_statement.get('bank_st_id'),
+                'coda_st_id': coda_statement.get('coda_st_id'),
+            }
+            checkpoint.pop('failed', None)
+        self.pool['account.coda'].write(
+            cr, uid, [self._coda_id],
+            {'checkpoint': json.dumps(checkpoint, sort_keys=True)},
+            context=context)
+
+    def _get_commit_interval(self, cr, uid, context=None):
+        """
+        Number of statements per commit:
+        0 = commit once per CODA File, 1 = commit after each statement.
+        Defined via the 'coda_commit_interval' context key or the
+        'coda.import.commit_interval' system parameter.
+        """
+        if context and 'coda_commit_interval' in context:
+            return int(context['coda_commit_interval'])
+        return int(self.pool['ir.config_parameter'].get_param(
+            cr, uid, 'coda.import.commit_interval', default=1))
+
+    def _coda_commit(self, cr, uid, force=False, context=None):
+        """
+        Commit according to the commit interval,
+        or unconditionally with force=True.
+        """
+        if not force:
+            self._nb_uncommitted += 1
+            if not self._commit_interval \
+                    or self._nb_uncommitted < self._commit_interval:
+                return
+        cr.commit()
+        self._nb_uncommitted = 0
+
+    def _log_statement_stats(self, cr, uid, codafilename, coda_statement,
+                             context=None):
+        """
+        Log the timings of the statement that has been processed.
+        """
+        stats = PhaseTimer.format_log(self._timer.delta())
+        name = coda_statement.get('name', '/')
+        _logger.info(
+            "CODA import file=%s statement=%s %s", codafilename, name, stats)
+        self._import_stats += '\n%s: %s' % (name, stats)
+
+    def _get_import_stats(self, cr, uid, codafilename, context=None):
+        """
+        Returns the timings summary of the CODA import.
+        """
+        _logger.info(
+            "CODA import file=%s total %s", codafilename,
+            PhaseTimer.format_log(self._timer.phases))
+        return PhaseTimer.format_table(self._timer.phases) \
+            + '\n\n' + _("Statements (phase=time(s)/queries/rows) :") \
+            + self._import_stats
+
+    def _create_coda(self, cr, uid, codafilename, codafile,
+                     coda_creation_date, context=None):
+        """
+        Store the CODA File.
+
+        Returns: None or (err_code, err_string) in batch mode
+        """
+        coda_obj = self.pool['account.coda']
+
+        err_string = ''
+        try:
+            with cr.savepoint():
+                coda_id = coda_obj.create(cr, uid, {
+                    'name': codafilename,
+                    'coda_data': codafile,
+                    'coda_creation_date': coda_creation_date,
+                    'coda_hash': self._coda_hash,
+                    'date': fields.date.context_today(
+                        self, cr, uid, context=context),
+                    'user_id': uid,
+                    })
+            self._coda_id = coda_id
+
+        except orm.except_orm, e:
+            err_string = _('\nApplication Error : ') + str(e)
+        except Exception, e:
+            err_string = _('\nSystem Error : ') + str(e)
+        except:
+            err_string = _('\nUnknown Error')
+        if err_string:
+            err_code = 'G0001'
+            if self._batch:
+                return (err_code, err_string)
+            raise orm.except_orm(_('CODA Import failed !'), err_string)
+
+    def _coda_run(self):
+        """
+        Returns a copy of the model instance for a single CODA import.
+
+        The state of an import is kept in attributes of the model instance,
+        e.g. self._coda_id, self._checkpoint or the matching indexes.
+        Hence every import runs on its own copy in order to isolate imports
+        that run at the same time within the same server process
+        (interactive imports, scheduled spool imports, batch imports).
+        """
+        run = object.__new__(type(self))
+        run.__dict__.update(self.__dict__)
+        return run
+
     def coda_parsing(self, cr, uid, ids, context=None,
                      codafile=None, codafilename=None, period_id=None,
                      batch=False):
+        return self._coda_run()._coda_parsing(
+            cr, uid, ids, context=context, codafile=codafile,
+            codafilename=codafilename, period_id=period_id, batch=batch)
+
+    def _coda_parsing(self, cr, uid, ids, context=None,
+                      codafile=None, codafilename=None, period_id=None,
+                      batch=False):
+        """
+        CODA import, cf. coda_parsing.
+        Modules that keep state for the duration of an import
+        initialise it by overriding this method.
+        """
         if context is None:
             context = {}
 
@@ -1382,278 +2075,150 @@ class account_coda_import(orm.TransientModel):
             codafilename = data.coda_fname
             period_id = data.period_id and data.period_id.id or False
         self._coda_id = context.get('coda_id')
+        self._dry_run = context.get('coda_dry_run', False)
+        self._dry_run_report = ''
+        if 'coda_deferred_reconcile' in context:
+            self._deferred_reconcile = context['coda_deferred_reconcile']
+        elif batch:
+            self._deferred_reconcile = self._default_deferred_reconcile(
+                cr, uid, context=context)
+        else:
+            self._deferred_reconcile = data.deferred_reconcile
 
-        bank_st_obj = self.pool['account.bank.statement']
         cba_obj = self.pool['coda.bank.account']
-        currency_obj = self.pool['res.currency']
         coda_obj = self.pool['account.coda']
         comm_type_obj = self.pool['account.coda.comm.type']
-        journal_obj = self.pool['account.journal']
-        partner_bank_obj = self.pool['res.partner.bank']
         trans_type_obj = self.pool['account.coda.trans.type']
         trans_code_obj = self.pool['account.coda.trans.code']
         trans_category_obj = self.pool['account.coda.trans.category']
         mod_obj = self.pool['ir.model.data']
 
-        coda_bank_table = cba_obj.read(
-            cr, uid, cba_obj.search(cr, uid, []), context=context)
-        for coda_bank in coda_bank_table:
-            coda_bank.update(
-                {'journal_code': coda_bank['journal_id']
-                    and journal_obj.browse(
-                        cr, uid, coda_bank['journal_id'][0],
-                        context=context).code
-                    or ''}
-                )
-            coda_bank.update(
-                {'iban': partner_bank_obj.browse(
-                    cr, uid, coda_bank['bank_id'][0], context=context).iban})
-            coda_bank.update(
-                {'acc_number': partner_bank_obj.browse(
-                    cr, uid, coda_bank['bank_id'][0],
-                    context=context).acc_number})
-            coda_bank.update(
-                {'currency_name': currency_obj.browse(
-                    cr, uid, coda_bank['currency_id'][0],
-                    context=context).name})
-
-        self._trans_type_table = trans_type_obj.read(
-            cr, uid, trans_type_obj.search(cr, uid, []), context=context)
-        self._trans_code_table = trans_code_obj.read(
-            cr, uid, trans_code_obj.search(cr, uid, []), context=context)
-        self._trans_category_table = trans_category_obj.read(
-            cr, uid, trans_category_obj.search(cr, uid, []), context=context)
-        self._comm_type_table = comm_type_obj.read(
-            cr, uid, comm_type_obj.search(cr, uid, []), context=context)
+        coda_bank_table = cba_obj.get_coda_bank_table(
+            cr, uid, context=context)
+
+        self._trans_type_table = trans_type_obj.get_code_table(
+            cr, uid, context=context)
+        self._trans_code_table = trans_code_obj.get_code_table(
+            cr, uid, context=context)
+        self._trans_category_table = trans_category_obj.get_code_table(
+            cr, uid, context=context)
+        self._comm_type_table = comm_type_obj.get_code_table(
+            cr, uid, context=context)
+        lang = context.get('lang') or \
+            self.pool['res.users'].context_get(cr, uid)['lang']
+        self._comm_labels = self._get_comm_labels(cr, uid, lang)
 
         self._error_log = ''
         self._coda_import_note = ''
-        coda_statements = []
-        recordlist = unicode(
-            base64.decodestring(codafile),
-            'windows-1252', 'strict').split('\n')
-
-        # parse lines in coda file and store result in coda_statements list
-        coda_statement = {}
-        skip = False
-        for line in recordlist:
-
-            skip = coda_statement.get('skip')
-            if not line:
-                pass
-            elif line[0] == '0':
-                # start of a new statement within the CODA file
-                coda_statement = {}
-                st_line_seq = 0
-                coda_parsing_note = ''
-
-                coda_parsing_note = self._coda_record_0(
-                    cr, uid, coda_statement, line, coda_parsing_note,
-                    context=context)
-
-                if not self._coda_id:
-                    coda_id = coda_obj.search(
-                        cr, uid,
-                        [('name', '=', codafilename),
-                         ('coda_creation_date', '=', coda_statement['date'])])
-                    if coda_id:
-                        err_string = _(
-                            "\nCODA File with Filename '%s' and Creation Date"
-                            " '%s' has already been imported !") % (
-                                codafilename, coda_statement['date'])
-                        err_code = 'W0001'
-                        if batch:
-                            return err_code, err_string
-                        raise orm.except_orm(_('Warning !'), err_string)
-
-            elif line[0] == '1':
-                coda_parsing_note = self._coda_record_1(
-                    cr, uid, coda_statement, line, coda_parsing_note,
-                    coda_bank_table, context=context)
-
-            elif line[0] == '2' and not skip:
-                # movement data record 2
-                coda_parsing_note, st_line_seq = self._coda_record_2(
-                    cr, uid, coda_statement, line, coda_parsing_note,
-                    st_line_seq, context=context)
-
-            elif line[0] == '3' and not skip:
-                # information data record 3
-                coda_parsing_note, st_line_seq = self._coda_record_3(
-                    cr, uid, coda_statement, line, coda_parsing_note,
-                    st_line_seq, context=context)
-
-            elif line[0] == '4' and not skip:
-                # free communication data record 4
-                coda_parsing_note, st_line_seq = self._coda_record_4(
-                    cr, uid, coda_statement, line, coda_parsing_note,
-                    st_line_seq, context=context)
-
-            elif line[0] == '8' and not skip:
-                # new balance record
-                coda_parsing_note = self._coda_record_8(
-                    cr, uid, coda_statement, line, coda_parsing_note,
-                    st_line_seq, period_id, context=context)
-
-            elif line[0] == '9':
-                # footer record
-                coda_parsing_note = self._coda_record_9(
-                    cr, uid, coda_statement, line, coda_parsing_note,
-                    context=context)
-                if not coda_statement['skip']:
-                    coda_statements.append(coda_statement)
-
-        # end for line in recordlist:
-
-        if not self._coda_id:
-            err_string = ''
-            try:
-                coda_id = coda_obj.create(cr, uid, {
-                    'name': codafilename,
-                    'coda_data': codafile,
-                    'coda_creation_date': coda_statement['date'],
-                    'date': fields.date.context_today(
-                        self, cr, uid, context=context),
-                    'user_id': uid,
-                    })
-                self._coda_id = coda_id
-                cr.commit()
-
-            except orm.except_orm, e:
-                cr.rollback()
-                err_string = _('\nApplication Error : ') + str(e)
-            except Exception, e:
-                cr.rollback()
-                err_string = _('\nSystem Error : ') + str(e)
-            except:
-                cr.rollback()
-                err_string = _('\nUnknown Error : ') + str(e)
-            if err_string:
-                err_code = 'G0001'
-                if self._batch:
-                    return (err_code, err_string)
-                raise orm.except_orm(_('CODA Import failed !'), err_string)
-
+        self._coda_creation_date = False
+        self._parse_error = None
+        self._bba_index = None
+        self._inv_number_index = {}
+        self._cp_bank_cache = {}
+        self._journal_balances = {}
+        self._commit_interval = self._get_commit_interval(
+            cr, uid, context=context)
+        self._nb_uncommitted = 0
+        self._nb_checkpoint = 0
+        self._timer = PhaseTimer(cr)
+        self._import_stats = ''
         self._nb_err = 0
         self._err_string = ''
+        nb_statements = 0
         coda_st_ids = []
         bank_st_ids = []
 
-        for coda_statement in coda_statements:
-
-            cba = coda_statement['coda_bank_params']
-            self._normal2info(cr, uid, coda_statement, context=context)
-            discard = self._check_duplicate(
-                cr, uid, coda_statement, context=context)
-
-            if coda_statement['type'] == 'info':
-                coda_st_id = self._create_info_statement(
-                    cr, uid, coda_statement, context=context)
-                coda_st_ids.append(coda_st_id)
-                coda_statement['coda_st_id'] = coda_st_id
+        # reject exact re-deliveries before any parsing work
+        with self._timer.phase('digest'):
+            self._coda_hash = coda_digest(codafile)
+        if not self._coda_id:
+            cr.execute(
+                "SELECT name, coda_creation_date FROM account_coda "
+                "WHERE coda_hash = %s", (self._coda_hash,))
+            dup = cr.fetchone()
+            if dup:
+                err_string = _(
+                    "\nCODA File '%s' is identical to CODA File '%s' with "
+                    "Creation Date '%s' which has already been imported !"
+                    ) % (codafilename, dup[0], dup[1])
+                err_code = 'W0001'
+                if self._batch:
+                    return err_code, err_string
+                raise orm.except_orm(_('Warning !'), err_string)
+        self._checkpoint = self._read_checkpoint(cr, uid, context=context)
+        self._deferred_aml_ids = self._get_deferred_aml_ids(
+            cr, uid, context=context)
+
+        # The statements are parsed one at a time while the CODA file
+        # is being decoded, hence the processing of a statement can start
+        # before the remainder of the file has been parsed.
+        coda_statements = self._timer.iterate(
+            'parse', self._coda_statements(
+                cr, uid, codafilename, coda_records(codafile), period_id,
+                coda_bank_table, context=context))
 
-            elif not discard:
-                bank_st_id = self._create_bank_statement(
-                    cr, uid, coda_statement, context=context)
-                if bank_st_id:
-                    bank_st_ids.append(bank_st_id)
-                    coda_statement['bank_st_id'] = bank_st_id
-                else:
-                    break
+        for coda_statement in coda_statements:
 
-            # prepare bank statement line values and merge
-            # information records into the statement line
-            st_line_seq = 0
-            coda_statement['reconcile_ids'] = []
-            coda_statement['glob_id_stack'] = []
+            nb_statements += 1
+            if self._dry_run:
+                with self._timer.phase('dry_run', rows=1):
+                    self._dry_run_report += self._dry_run_statement(
+                        cr, uid, coda_statement, context=context)
+                continue
+            if not self._coda_id:
+                res = self._create_coda(
+                    cr, uid, codafilename, codafile,
+                    coda_statement['date'], context=context)
+                if res:
+                    return res
 
-            lines = coda_statement['coda_statement_lines']
-            bank_st_lines = []
-            for x in lines:
-                line = lines[x]
-                create_bank_st_line = self._prepare_statement_line(
-                    cr, uid, coda_statement, line, st_line_seq,
+            try:
+                # a failing statement only rolls back its own work
+                with cr.savepoint():
+                    processed = self._process_coda_statement(
+                        cr, uid, coda_statement, context=context)
+            except Exception, e:
+                processed = False
+                self._nb_err += 1
+                self._err_string += _(
+                    "\nError while processing Statement %s : %s"
+                    ) % (coda_statement.get('name', '/'), e)
+                tb = ''.join(format_exception(*exc_info()))
+                _logger.error(
+                    "Error while processing Statement %s\n%s",
+                    coda_statement.get('name', '/'), tb)
+            if not processed:
+                self._write_checkpoint(
+                    cr, uid, coda_statement,
+                    error=self._err_string.strip() or _('Unknown Error'),
                     context=context)
-                if create_bank_st_line:
-                    res_line_hook = self._st_line_hook(
-                        cr, uid, coda_statement, line, context=context)
-                    if res_line_hook:
-                        bank_st_lines += res_line_hook
+                break
+            self._write_checkpoint(cr, uid, coda_statement, context=context)
+            if coda_statement.get('coda_st_id'):
+                coda_st_ids.append(coda_statement['coda_st_id'])
+            if coda_statement.get('bank_st_id'):
+                bank_st_ids.append(coda_statement['bank_st_id'])
+
+            with self._timer.phase('commit'):
+                self._coda_commit(cr, uid, context=context)
+            self._log_statement_stats(
+                cr, uid, codafilename, coda_statement, context=context)
 
-            # creation of bank statement lines, account moves
-            if coda_statement['type'] == 'normal':
-                # resequence since _st_line_hook may add/remove lines
-                st_line_seq = 0
-                st_balance_end = round(coda_statement['balance_start'], 2)
-                for st_line in bank_st_lines:
-                    st_line_seq += 1
-                    st_line['sequence'] = st_line_seq
-                    st_balance_end += round(st_line['amount'], 2)
-                    self._create_bank_statement_line(
-                        cr, uid, coda_statement, st_line, context=context)
-                    if st_line.get('reconcile') or st_line.get('account_id'):
-                        self._create_move_and_reconcile(
-                            cr, uid, coda_statement, st_line, context=context)
-
-                if round(st_balance_end
-                         - coda_statement['balance_end_real'], 2):
-                    err_string += _(
-                        "\nIncorrect ending Balance in CODA Statement %s "
-                        "for Bank Account %s!") % (
-                            coda_statement['coda_seq_number'],
-                            coda_statement['acc_number']
-                            + ' (' + coda_statement['currency']
-                            + ') - ' + coda_statement['description'])
-                    coda_statement['coda_parsing_note'] += '\n' + err_string
-
-                # calculate balance_end
-                bank_st_obj.button_dummy(
-                    cr, uid, [bank_st_id], context=context)
-                journal = journal_obj.browse(
-                    cr, uid, cba['journal_id'][0], context=context)
-                journal_name = journal.name
-
-            else:  # type 'info'
-                journal_name = _('None')
-
-            self._coda_import_note = self._coda_import_note + \
-                _('\n\nBank Journal: %s'
-                  '\nCODA Version: %s'
-                  '\nCODA Sequence Number: %s'
-                  '\nPaper Statement Sequence Number: %s'
-                  '\nBank Account: %s'
-                  '\nAccount Holder Name: %s'
-                  '\nDate: %s, Starting Balance:  %.2f, Ending Balance: %.2f'
-                  '%s'
-                  ) % (journal_name,
-                       coda_statement['coda_version'],
-                       coda_statement['coda_seq_number'],
-                       coda_statement.get('paper_nb_seq_number')
-                       or coda_statement['paper_ob_seq_number'],
-                       coda_statement['acc_number']
-                       + ' (' + coda_statement['currency'] + ') - '
-                       + coda_statement['description'],
-                       coda_statement['acc_holder'],
-                       coda_statement['date'],
-                       float(coda_statement['balance_start']),
-                       float(coda_statement['balance_end_real']),
-                       coda_statement['coda_parsing_note'] % {
-                           'name': coda_statement['name']})
-
-            if coda_statement.get('separate_application') != '00000':
-                self._coda_import_note += _(
-                    "'\nCode Separate Application: %s"
-                    ) % coda_statement['separate_application']
-            if coda_statement['type'] == 'normal' \
-                    and coda_statement['coda_note']:
-                bank_st_obj.write(
-                    cr, uid, coda_statement['bk_st_id'],
-                    {'coda_note': coda_statement['coda_note']})
+        # end 'for coda_statement in coda_statements'
 
-            # commit after each statement in the coda file
-            cr. commit()
+        if self._dry_run:
+            return self._parse_error
 
-        # end 'for coda_statement in coda_statements'
+        if self._parse_error:
+            self._coda_commit(cr, uid, force=True, context=context)
+            return self._parse_error
+
+        if not self._coda_id:
+            res = self._create_coda(
+                cr, uid, codafilename, codafile,
+                self._coda_creation_date, context=context)
+            if res:
+                return res
 
         user = self.pool['res.users'].browse(
             cr, uid, uid, context=context).name
@@ -1661,7 +2226,11 @@ class account_coda_import(orm.TransientModel):
         coda_note_header += _("The CODA File has been processed by")
         coda_note_header += " %s :" % user
         coda_note_footer = '\n\n' + _("Number of statements processed") \
-            + ' : ' + str(len(coda_statements))
+            + ' : ' + str(nb_statements)
+        if self._nb_checkpoint:
+            coda_note_footer += '\n' + _(
+                "Number of statements skipped (processed by a previous run)"
+                ) + ' : ' + str(self._nb_checkpoint)
         self._error_log = self._error_log + '\n' + _("Number of errors") + ' : ' \
             + str(self._nb_err) + '\n'
 
@@ -1676,11 +2245,22 @@ class account_coda_import(orm.TransientModel):
             note = coda_note_header + self._coda_import_note + coda_note_footer
             coda_obj.write(
                 cr, uid, [self._coda_id],
-                {'note': old_note + note, 'state': 'done'})
-            cr.commit()
+                {'note': old_note + note, 'state': 'done',
+                 'import_stats': self._get_import_stats(
+                     cr, uid, codafilename, context=context)})
+            self._coda_commit(cr, uid, force=True, context=context)
             if self._batch:
                 return None
         else:
+            # keep the statements that have been processed successfully,
+            # processing the CODA File again resumes from the checkpoint
+            if self._coda_id:
+                coda_obj.write(
+                    cr, uid, [self._coda_id],
+                    {'state': 'draft',
+                     'import_stats': self._get_import_stats(
+                        cr, uid, codafilename, context=context)})
+            self._coda_commit(cr, uid, force=True, context=context)
             if self._batch:
                 err_code = 'G0002'
                 return (err_code, self._err_string)
@@ -1712,6 +2292,55 @@ class account_coda_import(orm.TransientModel):
             'type': 'ir.actions.act_window',
         }
 
+    def coda_dry_run(self, cr, uid, ids, context=None,
+                     codafile=None, codafilename=None, period_id=None,
+                     batch=False):
+        """
+        Preview of the CODA import.
+
+        The CODA File is parsed and matched but no (CODA) Bank Statements,
+        moves, partner bank accounts or sequence numbers are created.
+        Hooks of other modules run within a savepoint that is
+        rolled back afterwards.
+
+        Returns: the result view or, in batch mode, a tuple
+        (None or (err_code, err_string), report)
+        """
+        if context is None:
+            context = {}
+        ctx = dict(context, coda_dry_run=True)
+        start = time.time()
+        run = self._coda_run()
+        cr.execute('SAVEPOINT coda_dry_run')
+        try:
+            res = run._coda_parsing(
+                cr, uid, ids, context=ctx, codafile=codafile,
+                codafilename=codafilename, period_id=period_id, batch=batch)
+        finally:
+            cr.execute('ROLLBACK TO SAVEPOINT coda_dry_run')
+            self.invalidate_cache(cr, uid, context=ctx)
+        note = _("Preview of the CODA File (nothing has been created)") \
+            + run._dry_run_report + '\n\n' \
+            + _("Duration : %.1f s") % (time.time() - start)
+        if batch:
+            return res, note
+
+        self.write(cr, uid, ids, {'note': note}, context=context)
+        result_view = self.pool['ir.model.data'].get_object(
+            cr, uid, 'l10n_be_coda_advanced',
+            'account_coda_import_result_view')
+        return {
+            'name': _('Preview CODA File'),
+            'res_id': ids[0],
+            'view_type': 'form',
+            'view_mode': 'form',
+            'res_model': 'account.coda.import',
+            'view_id': result_view.id,
+            'target': 'new',
+            'context': context,
+            'type': 'ir.actions.act_window',
+        }
+
     def _match_and_reconcile(self, cr, uid, coda_statement, line,
                              coda_parsing_note, context=None):
         """
@@ -1725,28 +2354,41 @@ class account_coda_import(orm.TransientModel):
         """
 
         # match on payment reference
-        coda_parsing_note, match = self._match_payment_reference(
-            cr, uid, coda_statement, line, coda_parsing_note, context=context)
+        with self._timer.phase('match.payment_reference', rows=1):
+            coda_parsing_note, match = self._match_payment_reference(
+                cr, uid, coda_statement, line, coda_parsing_note,
+                context=context)
         if match:
+            line['matched_by'] = 'payment_reference'
             return coda_parsing_note
 
         # match on invoice
-        coda_parsing_note, match = self._match_invoice(
-            cr, uid, coda_statement, line, coda_parsing_note, context=context)
+        with self._timer.phase('match.invoice', rows=1):
+            coda_parsing_note, match = self._match_invoice(
+                cr, uid, coda_statement, line, coda_parsing_note,
+                context=context)
         if match:
+            line['matched_by'] = 'invoice'
             return coda_parsing_note
 
         # match on sale order
-        coda_parsing_note, match = self._match_sale_order(
-            cr, uid, coda_statement, line, coda_parsing_note, context=context)
+        with self._timer.phase('match.sale_order', rows=1):
+            coda_parsing_note, match = self._match_sale_order(
+                cr, uid, coda_statement, line, coda_parsing_note,
+                context=context)
         if match:
+            line['matched_by'] = 'sale_order'
             return coda_parsing_note
 
         # check if internal_transfer or partner via counterparty_number
         # when invoice lookup failed
-        coda_parsing_note, match = self._match_counterparty(
-            cr, uid, coda_statement, line, coda_parsing_note, context=context)
+        with self._timer.phase('match.counterparty', rows=1):
+            coda_parsing_note, match = self._match_counterparty(
+                cr, uid, coda_statement, line, coda_parsing_note,
+                context=context)
         if match:
+            line['matched_by'] = match.get('transfer_account') \
+                and 'transfer_account' or 'counterparty'
             return coda_parsing_note
 
         return coda_parsing_note
@@ -1766,6 +2408,145 @@ class account_coda_import(orm.TransientModel):
         """
         return coda_parsing_note, {}
 
+    def _get_bba_index(self, cr, uid, context=None):
+        """
+        Returns a dictionary with the digits of the
+        Structured Communication of the open invoices as key
+        and a list of (invoice id, invoice type) tuples as value.
+
+        The index is built once per CODA import.
+        """
+        if self._bba_index is None:
+            cr.execute(
+                "SELECT id, type, reference FROM account_invoice "
+                "WHERE state = 'open' AND reference_type = 'bba' "
+                "AND reference IS NOT NULL")
+            bba_index = {}
+            for inv_id, inv_type, reference in cr.fetchall():
+                digits = re.sub('\D', '', reference)
+                if digits:
+                    bba_index.setdefault(digits, []).append(
+                        (inv_id, inv_type))
+            self._bba_index = bba_index
+            self._bba_index_lengths = sorted(
+                set([len(x) for x in bba_index]))
+        return self._bba_index
+
+    def _bba_index_lookup(self, cr, uid, free_comm_digits, inv_types,
+                          context=None):
+        """
+        Returns the ids of the open invoices of type 'inv_types'
+        with a Structured Communication that is contained in
+        'free_comm_digits'.
+        """
+        bba_index = self._get_bba_index(cr, uid, context=context)
+        inv_ids = set()
+        size = len(free_comm_digits)
+        for length in self._bba_index_lengths:
+            if length > size:
+                break
+            for i in xrange(size - length + 1):
+                hits = bba_index.get(free_comm_digits[i:i + length])
+                if hits:
+                    inv_ids.update(
+                        [x[0] for x in hits if x[1] in inv_types])
+        return self._filter_open_invoices(cr, uid, inv_ids, context=context)
+
+    def _filter_open_invoices(self, cr, uid, inv_ids, context=None):
+        """
+        Invoices may have been reconciled since the invoice indexes
+        have been built, hence we check the state of the candidates.
+        Invoices with a counterpart awaiting deferred reconciliation
+        are also excluded.
+        """
+        if not inv_ids:
+            return []
+        select = \
+            "SELECT id FROM account_invoice " \
+            "WHERE id IN %s AND state = 'open' "
+        params = [tuple(inv_ids)]
+        if self._deferred_aml_ids:
+            select += \
+                "AND move_id NOT IN (" \
+                "SELECT move_id FROM account_move_line WHERE id IN %s) "
+            params.append(tuple(self._deferred_aml_ids))
+        cr.execute(select + "ORDER BY id", params)
+        return [x[0] for x in cr.fetchall()]
+
+    def _get_deferred_aml_ids(self, cr, uid, context=None):
+        """
+        Returns the set of counterpart move lines of the statement lines
+        of the CODA File awaiting deferred reconciliation.
+        """
+        res = set()
+        if not self._coda_id:
+            return res
+        cr.execute(
+            "SELECT l.coda_reconcile_data "
+            "FROM account_bank_statement_line l "
+            "JOIN account_bank_statement s ON s.id = l.statement_id "
+            "WHERE s.coda_id = %s AND l.coda_reconcile_data IS NOT NULL",
+            (self._coda_id,))
+        for data in cr.fetchall():
+            aml_id = json.loads(data[0]).get('counterpart_move_line_id')
+            if aml_id:
+                res.add(aml_id)
+        return res
+
+    def _get_inv_number_index(self, cr, uid, company_id, context=None):
+        """
+        Returns a dictionary with the invoice type as key and an
+        (AhoCorasick automaton, list of (regex, value) tuples) as value.
+
+        The keywords are the invoice numbers of the customer invoices
+        and refunds and the references of the supplier invoices and refunds.
+        The value of a keyword is an (invoice id, amount) tuple.
+        Keywords containing SQL LIKE wildcards are matched via a regex.
+
+        The index is built once per CODA import and company.
+        """
+        if company_id not in self._inv_number_index:
+            cr.execute(
+                "SELECT id, type, amount_total, number, reference "
+                "FROM account_invoice "
+                "WHERE state = 'open' AND company_id = %s", (company_id,))
+            inv_number_index = {}
+            for inv_id, inv_type, amount_total, number, reference \
+                    in cr.fetchall():
+                if inv_type in ['out_invoice', 'out_refund']:
+                    keyword = number
+                else:
+                    keyword = reference
+                if not keyword:
+                    continue
+                if inv_type not in inv_number_index:
+                    inv_number_index[inv_type] = (AhoCorasick(), [])
+                automaton, patterns = inv_number_index[inv_type]
+                value = (inv_id, '%.2f' % amount_total)
+                if re.search(r'[%_\\]', keyword):
+                    patterns.append((like2regex(keyword), value))
+                else:
+                    automaton.add(keyword.lower(), value)
+            self._inv_number_index[company_id] = inv_number_index
+        return self._inv_number_index[company_id]
+
+    def _inv_number_lookup(self, cr, uid, company_id, free_comm,
+                           amount_rounded, inv_type, context=None):
+        """
+        Returns the ids of the open invoices of type 'inv_type'
+        with amount 'amount_rounded' and a number (customer invoices)
+        or reference (supplier invoices) contained in 'free_comm'.
+        """
+        inv_number_index = self._get_inv_number_index(
+            cr, uid, company_id, context=context)
+        if inv_type not in inv_number_index:
+            return []
+        automaton, patterns = inv_number_index[inv_type]
+        hits = automaton.search(free_comm.lower())
+        hits += [x[1] for x in patterns if x[0].search(free_comm)]
+        inv_ids = set([x[0] for x in hits if x[1] == amount_rounded])
+        return self._filter_open_invoices(cr, uid, inv_ids, context=context)
+
     def _match_invoice(self, cr, uid, coda_statement, line,
                        coda_parsing_note, context=None):
 
@@ -1788,6 +2569,9 @@ class account_coda_import(orm.TransientModel):
                        ('reference', '=', line['struct_comm_bba']),
                        ('reference_type', '=', 'bba')]
             inv_ids = inv_obj.search(cr, uid, domain)
+            if self._deferred_aml_ids:
+                inv_ids = self._filter_open_invoices(
+                    cr, uid, inv_ids, context=context)
             if not inv_ids:
                 coda_parsing_note += _(
                     "\n    Bank Statement '%%(name)s' line '%s':"
@@ -1811,76 +2595,35 @@ class account_coda_import(orm.TransientModel):
             # and try to find matching invoice
             free_comm_digits = re.sub(
                 '\D', '', line['communication'] or '')
-            select = \
-                "SELECT id FROM " \
-                "(SELECT id, type, state, amount_total, number, " \
-                "reference_type, reference, " \
-                "'%s'::text AS free_comm_digits FROM account_invoice) sq " \
-                "WHERE state = 'open' AND reference_type = 'bba' " \
-                "AND free_comm_digits LIKE" \
-                " '%%'||regexp_replace(reference, '\\\D', '', 'g')||'%%'" \
-                % (free_comm_digits)
             if line['amount'] > 0:
-                select2 = " AND type IN ('out_invoice', 'in_refund')"
+                inv_types = ['out_invoice', 'in_refund']
             else:
-                select2 = " AND type IN ('in_invoice', 'out_refund')"
-            cr.execute(select + select2)
-            res = cr.fetchall()
-            if res:
-                inv_ids = [x[0] for x in res]
-                if len(inv_ids) == 1:
-                    match['invoice_id'] = inv_ids[0]
+                inv_types = ['in_invoice', 'out_refund']
+            inv_ids = self._bba_index_lookup(
+                cr, uid, free_comm_digits, inv_types, context=context)
+            if len(inv_ids) == 1:
+                match['invoice_id'] = inv_ids[0]
         if not match and line['communication'] and find_inv_number:
             # check matching invoice number in free form communication
             # combined with matching amount
-            free_comm = repl_special(line['communication'].strip())
+            free_comm = line['communication'].strip()
             amount_fmt = '%.2f'
             if line['amount'] > 0:
                 amount_rounded = \
                     amount_fmt % round(line['amount'], 2)
+                # 'out_invoice', 'in_refund'
+                inv_types = ['out_invoice', 'in_refund']
             else:
                 amount_rounded = \
                     amount_fmt % round(-line['amount'], 2)
-            select = \
-                "SELECT id FROM " \
-                "(SELECT id, type, state, amount_total, number, " \
-                "reference_type, reference, " \
-                "'%s'::text AS free_comm FROM account_invoice " \
-                "WHERE state = 'open' AND company_id = %s) sq " \
-                "WHERE amount_total = %s" \
-                % (free_comm, coda_statement['company_id'], amount_rounded)
-
-            # 'out_invoice', 'in_refund'
-            if line['amount'] > 0:
-                select2 = " AND type = 'out_invoice' AND " \
-                    "free_comm ilike '%'||number||'%'"
-                cr.execute(select + select2)
-                res = cr.fetchall()
-                if res:
-                    inv_ids = [x[0] for x in res]
-                else:
-                    select2 = " AND type = 'in_refund' AND " \
-                        "free_comm ilike '%'||reference||'%'"
-                    cr.execute(select + select2)
-                    res = cr.fetchall()
-                    if res:
-                        inv_ids = [x[0] for x in res]
-
-            # 'in_invoice', 'out_refund'
-            else:
-                select2 = " AND type = 'in_invoice' AND " \
-                    "free_comm ilike '%'||reference||'%'"
-                cr.execute(select + select2)
-                res = cr.fetchall()
-                if res:
-                    inv_ids = [x[0] for x in res]
-                else:
-                    select2 = " AND type = 'out_refund' AND " \
-                        "free_comm ilike '%'||number||'%'"
-                    cr.execute(select + select2)
-                    res = cr.fetchall()
-                    if res:
-                        inv_ids = [x[0] for x in res]
+                # 'in_invoice', 'out_refund'
+                inv_types = ['in_invoice', 'out_refund']
+            for inv_type in inv_types:
+                inv_ids = self._inv_number_lookup(
+                    cr, uid, coda_statement['company_id'], free_comm,
+                    amount_rounded, inv_type, context=context)
+                if inv_ids:
+                    break
             if inv_ids:
                 if len(inv_ids) == 1:
                     match['invoice_id'] = inv_ids[0]
@@ -1917,6 +2660,76 @@ class account_coda_import(orm.TransientModel):
 
         return coda_parsing_note, match
 
+    def _prefetch_counterparty_banks(self, cr, uid, cp_numbers,
+                                     context=None):
+        """
+        Resolve the counterparty bank account numbers in a single query.
+
+        The lookup follows the res.partner.bank 'acc_number' search logic
+        (cf. account_bank_statement_advanced/res_partner_bank.py).
+        The results are memoized for the remainder of the CODA import:
+        {counterparty number: [(partner bank id, partner id,
+                                partner company id, partner readable)]}
+        """
+        partner_bank_obj = self.pool['res.partner.bank']
+        partner_obj = self.pool['res.partner']
+        numbers = {}
+        for cp_number in set(cp_numbers):
+            if cp_number and cp_number not in self._cp_bank_cache:
+                numbers[cp_number] = \
+                    cp_number.replace(' ', '').replace('-', '').upper()
+        if not numbers:
+            return
+        bbans = ['%%%s%%' % x for x in numbers.values() if len(x) == 12]
+        # the conditions on the indexed acc_number_norm column select
+        # a superset of the matches, the exact lookup is done below
+        select = \
+            "SELECT pb.id, pb.acc_number, pb.state, " \
+            "pb.partner_id, p.company_id " \
+            "FROM res_partner_bank pb " \
+            "LEFT JOIN res_partner p ON p.id = pb.partner_id " \
+            "WHERE pb.acc_number_norm IN %s "
+        params = [tuple(set(numbers.values()))]
+        if bbans:
+            select += \
+                "OR (pb.state = 'iban' " \
+                "AND SUBSTRING(pb.acc_number FOR 2) = 'BE' " \
+                "AND pb.acc_number_norm LIKE ANY (%s)) "
+            params.append(bbans)
+        cr.execute(select + "ORDER BY pb.id", params)
+        rows = cr.fetchall()
+
+        # apply the record rules
+        pb_ids = partner_bank_obj.search(
+            cr, uid, [('id', 'in', [x[0] for x in rows])], context=context)
+        pb_ids = set(pb_ids)
+        rows = [x for x in rows if x[0] in pb_ids]
+        ctx = dict(context or {}, active_test=False)
+        partner_ids = partner_obj.search(
+            cr, uid, [('id', 'in', list(set([x[3] for x in rows if x[3]])))],
+            context=ctx)
+        partner_ids = set(partner_ids)
+
+        for cp_number, number in numbers.iteritems():
+            res = []
+            for pb_id, acc_number, state, partner_id, company_id in rows:
+                acc = acc_number.replace(' ', '')
+                if acc.replace('-', '') == number or (
+                        len(number) == 12 and state == 'iban'
+                        and acc_number[:2] == 'BE' and number in acc):
+                    res.append(pb_id)
+            if not res:
+                res = [x[0] for x in rows if x[1] == cp_number]
+            self._cp_bank_cache[cp_number] = [
+                (x[0], x[3], x[4], not x[3] or x[3] in partner_ids)
+                for x in rows if x[0] in res]
+
+    def _get_counterparty_banks(self, cr, uid, cp_number, context=None):
+        if cp_number not in self._cp_bank_cache:
+            self._prefetch_counterparty_banks(
+                cr, uid, [cp_number], context=context)
+        return self._cp_bank_cache[cp_number]
+
     def _match_counterparty(self, cr, uid, coda_statement, line,
                             coda_parsing_note, context=None):
 
@@ -1941,27 +2754,16 @@ class account_coda_import(orm.TransientModel):
                     line['account_id'] = transfer_acc
                     match['transfer_account'] = True
             elif find_partner:
-                partner_bank_ids = partner_bank_obj.search(
-                    cr, uid, [('acc_number', '=', cp_number)])
+                partner_banks = self._get_counterparty_banks(
+                    cr, uid, cp_number, context=context)
+                partner_bank_ids = [x[0] for x in partner_banks]
         if not match and find_partner and partner_bank_ids:
-            partner_banks = partner_bank_obj.browse(
-                cr, uid, partner_bank_ids, context=context)
             # filter out partners that belong to other companies
-            # TODO :
-            # adapt this logic to cope with
-            # res.partner record rule customisations
-            partner_bank_ids2 = []
-            for pb in partner_banks:
-                add_pb = True
-                try:
-                    if pb.partner_id.company_id and (
-                            pb.partner_id.company_id.id
-                            != coda_statement['company_id']):
-                        add_pb = False
-                except:
-                    add_pb = False
-                if add_pb:
-                    partner_bank_ids2.append(pb.id)
+            # and partners excluded by the res.partner record rules
+            partner_bank_ids2 = [
+                x[0] for x in partner_banks
+                if x[3] and (not x[2]
+                             or x[2] == coda_statement['company_id'])]
             if len(partner_bank_ids2) > 1:
                 coda_parsing_note += _(
                     "\n    Bank Statement '%%(name)s' line '%s':"
@@ -1970,10 +2772,10 @@ class account_coda_import(orm.TransientModel):
                     "Bank Account Number '%s'!"
                     ) % (line['ref'], cp_number)
             elif len(partner_bank_ids2) == 1:
-                partner_bank = partner_bank_obj.browse(
-                    cr, uid, partner_bank_ids2[0], context=context)
                 line['bank_account_id'] = partner_bank_ids2[0]
-                line['partner_id'] = partner_bank.partner_id.id
+                line['partner_id'] = [
+                    x[1] for x in partner_banks
+                    if x[0] == partner_bank_ids2[0]][0] or False
                 match['partner_id'] = line['partner_id']
         elif not match and find_partner:
             if cp_number:
@@ -1992,13 +2794,11 @@ class account_coda_import(orm.TransientModel):
 
         # add bank account to partner record
         if match and line['account_id'] != transfer_acc \
-                and cp_number and update_partner:
-            partner_bank_ids = partner_bank_obj.search(
-                cr, uid,
-                [('acc_number', '=', cp_number),
-                 ('partner_id', '=',
-                  line['partner_id'])],
-                order='id')
+                and cp_number and update_partner and not self._dry_run:
+            partner_bank_ids = [
+                x[0] for x in self._get_counterparty_banks(
+                    cr, uid, cp_number, context=context)
+                if x[1] == line['partner_id']]
             if len(partner_bank_ids) > 1:
                 # clean up partner bank duplicates, keep most recently created
                 # this logic conflicts with factoring
@@ -2009,11 +2809,13 @@ class account_coda_import(orm.TransientModel):
                     "have been removed, ids = %s",
                     line['partner_id'], partner_bank_ids[:-1])
                 partner_bank_obj.unlink(cr, uid, partner_bank_ids[:-1])
+                self._cp_bank_cache.pop(cp_number, None)
             if not partner_bank_ids:
-                feedback = self._update_partner_bank(
+                feedback = self.update_partner_bank(
                     cr, uid,
                     line['counterparty_bic'], cp_number,
                     line['partner_id'], line['counterparty_name'])
+                self._cp_bank_cache.pop(cp_number, None)
                 if feedback:
                     coda_parsing_note += _(
                         "\n    Bank Statement '%%(name)s' line '%s':"
@@ -2197,466 +2999,44 @@ class account_coda_import(orm.TransientModel):
                  'acc_number': iban})
         return feedback
 
-    def _parse_comm_move(self, cr, uid, line, context=None):
-        comm_type = line['struct_comm_type']
-        comm = st_line_comm = line['communication']
-        st_line_name = line['name']
+    def _get_comm_labels(self, cr, uid, lang):
+        """
+        Translated texts of the Structured Communication decoders,
+        cf. coda_comm.comm_labels.
+        The translations are read via ir.translation._get_source,
+        which is cached and invalidated when the translations change.
+        """
+        translation_obj = self.pool['ir.translation']
 
-        if comm_type == '100':
-            st_line_name = _(
-                "Payment with ISO 11649 structured format communication")
-            st_line_comm = '\n' + indent + _(
-                "Payment with a structured format communication "
-                "applying the ISO standard 11649"
-                ) + ':'
-            st_line_comm += indent + _(
-                "Structured creditor reference to remittance information")
-            st_line_comm += indent + comm
-
-        elif comm_type in ['101', '102']:
-            st_line_name = st_line_comm = \
-                '+++' + comm[0:3] + '/' + comm[3:7] + '/' + comm[7:12] + '+++'
-
-        elif comm_type == '103':
-            st_line_name = ', '.join([line['trans_family_desc'], _('Number')])
-            st_line_comm = comm
-
-        elif comm_type == '105':
-            st_line_name = filter(
-                lambda x: comm_type == x['code'],
-                self._comm_type_table)[0]['description']
-            amount_1 = list2float(comm[0:15])
-            amount_2 = list2float(comm[15:30])
-            rate = number2float(comm[30:42], 8)
-            currency = comm[42:45]
-            struct_format_comm = comm[45:57].strip()
-            country_code = comm[57:59]
-            amount_3 = list2float(comm[59:74])
-            st_line_comm = '\n' + indent + st_line_name + indent + _(
-                "Gross amount in the currency of the account"
-                ) + ': %.2f' % amount_1
-            st_line_comm += indent + _(
-                "Gross amount in the original currency"
-                ) + ': %.2f' % amount_2
-            st_line_comm += indent + _('Rate') + ': %.4f' % rate
-            st_line_comm += indent + _('Currency') + ': %s' % currency
-            st_line_comm += indent + _('Structured format communication') \
-                + ': %s' % struct_format_comm
-            st_line_comm += indent + _('Country code of the principal') \
-                + ': %s' % country_code
-            st_line_comm += indent + _('Equivalent in EUR') \
-                + ': %.2f' % amount_3
-
-        elif comm_type == '106':
-            st_line_name = _(
-                "VAT, withholding tax on income, commission, etc.")
-            interest = comm[30:42].strip('0')
-            st_line_comm = '\n' + indent + st_line_name + indent + _(
-                "Equivalent in the currency of the account"
-                ) + ': %.2f' % list2float(comm[0:15])
-            st_line_comm += indent + _('Amount on which % is calculated') \
-                + ': %.2f' % list2float(comm[15:30])
-            st_line_comm += indent + _('Percent') \
-                + ': %.4f' % number2float(comm[30:42], 8)
-            st_line_comm += indent + (
-                comm[42] == 1
-                and _('Minimum applicable')
-                or _('Minimum not applicable')
-                )
-            st_line_comm += indent + _('Equivalent in EUR') \
-                + ': %.2f' % list2float(comm[43:58])
-
-        elif comm_type == '107':
-            paid_refusals = {
-                '0': _('paid'),
-                '1': _('direct debit cancelled or nonexistent'),
-                '2': _('refusal - other reason'),
-                'D': _('payer disagrees'),
-                'E': _('direct debit number linked to another '
-                       'identification number of the creditor')}
-            st_line_name = _('Direct debit - DOM\'80')
-            direct_debit_number = comm[0:12].strip()
-            pivot_date = str2date(comm[12:18])
-            comm_zone = comm[18:48]
-            paid_refusal = paid_refusals.get(comm[48], '')
-            creditor_number = comm[49:60].strip()
-            st_line_comm = '\n' + indent + st_line_name + indent + _(
-                'Direct Debit Number') + ': %s' % direct_debit_number
-            st_line_comm += indent + _('Central (Pivot) Date') \
-                + ': %s' % pivot_date
-            st_line_comm += indent + _('Communication Zone') \
-                + ': %s' % comm_zone
-            st_line_comm += indent + _('Paid or reason for refusal') \
-                + ': %s' % paid_refusal
-            st_line_comm += indent + _("Creditor's Number") \
-                + ': %s' % creditor_number
-
-        elif comm_type == '108':
-            st_line_name = _(
-                'Closing, period from %s to %s'
-                ) % (str2date(comm[42:48]), str2date(comm[48:54]))
-            interest = comm[30:42].strip('0')
-            st_line_comm = '\n' + indent + st_line_name + indent + _(
-                'Equivalent in the currency of the account'
-                ) + ': %.2f' % list2float(comm[0:15])
-            if interest:
-                st_line_comm += indent + _(
-                    'Interest rates, calculation basis'
-                    ) + ': %.2f' % list2float(comm[15:30]) + \
-                    indent + _('Interest') \
-                    + ': %.2f' % list2float(comm[30:42])
-
-        elif comm_type == '111':
-            card_schemes = {
-                '1': 'Bancontact/Mister Cash',
-                '2': _('Private'),
-                '3': 'Maestro',
-                '5': 'TINA',
-                '9': _('Other')}
-            trans_types = {
-                '1': _('Withdrawal'),
-                '2': _('Cumulative on network'),
-                '7': _('Distribution sector'),
-                '8': _('Teledata'),
-                '9': _('Fuel')}
-            st_line_name = _('POS credit - globalisation')
-            card_scheme = card_schemes.get(comm[0], '')
-            pos_number = comm[1:7].strip()
-            period_number = comm[7:10].strip()
-            first_sequence_number = comm[10:16].strip()
-            trans_first_date = str2date(comm[16:22])
-            last_sequence_number = comm[22:28].strip()
-            trans_last_date = str2date(comm[28:34])
-            trans_type = trans_types.get(comm[34], '')
-            terminal_name = comm[35:50].strip()
-            terminal_city = comm[51:60].strip()
-            st_line_comm = '\n' + indent + st_line_name + indent \
-                + _('Card Scheme') + ': %s' % card_scheme
-            st_line_comm += indent + _('POS Number') + ': %s' % pos_number
-            st_line_comm += indent + _('Period Number') \
-                + ': %s' % period_number
-            st_line_comm += indent + _('First Transaction Sequence Number') \
-                + ': %s' % first_sequence_number
-            st_line_comm += indent + _('Date of first transaction') \
-                + ': %s' % trans_first_date
-            st_line_comm += indent + _('Last Transaction Sequence Number') \
-                + ': %s' % last_sequence_number
-            st_line_comm += indent + _('Date of last transaction') \
-                + ': %s' % trans_last_date
-            st_line_comm += indent + _('Transaction Type') \
-                + ': %s' % trans_type
-            st_line_comm += indent + _('Terminal Identification') + \
-                ': %s' % terminal_name + ', ' + terminal_city
-
-        elif comm_type == '113':
-            card_schemes = {
-                '1': 'Bancontact/Mister Cash',
-                '2': 'Maestro',
-                '3': _('Private'),
-                '9': _('Other')}
-            trans_types = {
-                '1': _('Withdrawal'),
-                '2': _('Proton loading'),
-                '3': _('Reimbursement Proton balance'),
-                '4': _('Reversal of purchases'),
-                '7': _('Distribution sector'),
-                '8': _('Teledata'),
-                '9': _('Fuel')}
-            product_codes = {
-                '01': _('premium with lead substitute'),
-                '02': _('europremium'),
-                '03': _('diesel'),
-                '04': _('LPG'),
-                '06': _('premium plus 98 oct'),
-                '07': _('regular unleaded'),
-                '08': _('domestic fuel oil'),
-                '09': _('lubricants'),
-                '10': _('petrol'),
-                '11': _('premium 99+'),
-                '12': _('Avgas'),
-                '16': _('other types'),
-                }
-            st_line_name = _('ATM/POS debit')
-            card_number = comm[0:16].strip()
-            card_scheme = card_schemes.get(comm[16], '')
-            terminal_number = comm[17:23].strip()
-            sequence_number = comm[23:29].strip()
-            trans_date = comm[29:35].strip() and str2date(comm[29:35]) or ''
-            trans_hour = comm[35:39].strip() and str2time(comm[35:39]) or ''
-            trans_type = trans_types.get(comm[39], '')
-            terminal_name = comm[40:56].strip()
-            terminal_city = comm[56:66].strip()
-            orig_amount = comm[66:81].strip() and list2float(comm[66:81])
-            rate = number2float(comm[81:93], 8)
-            currency = comm[93:96]
-            volume = number2float(comm[96:101], 2)
-            product_code = product_codes.get(comm[101:103], '')
-            unit_price = number2float(comm[103:108], 2)
-            st_line_comm = '\n' + indent + st_line_name + indent \
-                + _('Card Number') + ': %s' % card_number
-            st_line_comm += indent + _('Card Scheme') + ': %s' % card_scheme
-            if terminal_number:
-                st_line_comm += indent + _('Terminal Number') \
-                    + ': %s' % terminal_number
-            st_line_comm += indent + _('Transaction Sequence Number') \
-                + ': %s' % sequence_number
-            st_line_comm += indent + _('Time') \
-                + ': %s' % trans_date + ' ' + trans_hour
-            st_line_comm += indent + _('Transaction Type') \
-                + ': %s' % trans_type
-            st_line_comm += indent + _('Terminal Identification') \
-                + ': %s' % terminal_name + ', ' + terminal_city
-            if orig_amount:
-                st_line_comm += indent + _('Original Amount') \
-                    + ': %.2f' % orig_amount
-                st_line_comm += indent + _('Rate') + ': %.4f' % rate
-                st_line_comm += indent + _('Currency') + ': %s' % currency
-            if volume:
-                st_line_comm += indent + _('Volume') + ': %.2f' % volume
-            if product_code:
-                st_line_comm += indent + _('Product Code') \
-                    + ': %s' % product_code
-            if unit_price:
-                st_line_comm += indent + _('Unit Price') \
-                    + ': %.2f' % unit_price
-
-        elif comm_type == '114':
-            card_schemes = {
-                '1': 'Bancontact/Mister Cash',
-                '2': 'Maestro',
-                '3': _('Private'),
-                '5': 'TINA',
-                '9': _('Other')}
-            trans_types = {
-                '1': _('Withdrawal'),
-                '7': _('Distribution sector'),
-                '8': _('Teledata'),
-                '9': _('Fuel')}
-            st_line_name = _('POS credit - individual transaction')
-            card_scheme = card_schemes.get(comm[0], '')
-            pos_number = comm[1:7].strip()
-            period_number = comm[7:10].strip()
-            sequence_number = comm[10:16].strip()
-            trans_date = str2date(comm[16:22])
-            trans_hour = str2time(comm[22:26])
-            trans_type = trans_types.get(comm[26], '')
-            terminal_name = comm[27:43].strip()
-            terminal_city = comm[43:53].strip()
-            trans_reference = comm[53:69].strip()
-            st_line_comm = '\n' + indent + st_line_name + indent \
-                + _('Card Scheme') + ': %s' % card_scheme
-            st_line_comm += indent + _('POS Number') + ': %s' % pos_number
-            st_line_comm += indent + _('Period Number') \
-                + ': %s' % period_number
-            st_line_comm += indent + _('Transaction Sequence Number') \
-                + ': %s' % sequence_number
-            st_line_comm += indent + _('Time') \
-                + ': %s' % trans_date + ' ' + trans_hour
-            st_line_comm += indent + _('Transaction Type') \
-                + ': %s' % trans_type
-            st_line_comm += indent + _('Terminal Identification') \
-                + ': %s' % terminal_name + ', ' + terminal_city
-            st_line_comm += indent + _('Transaction Reference') \
-                + ': %s' % trans_reference
-
-        elif comm_type == '123':
-            starting_date = str2date(comm[0:6])
-            maturity_date = comm[6:12] == '999999' \
-                and _('guarantee without fixed term') or str2date(comm[0:6])
-            basic_amount = list2float(comm[12:27])
-            percent = number2float(comm[27:39], 8)
-            term = comm[39:43].lstrip('0')
-            minimum = comm[43] == '1' and True or False
-            guarantee_number = comm[44:57].strip()
-            st_line_comm = '\n' + indent + st_line_name + indent \
-                + _('Starting Date') + ': %s' % starting_date
-            st_line_comm += indent + _('Maturity Date') \
-                + ': %s' % maturity_date
-            st_line_comm += indent + _('Basic Amount') \
-                + ': %.2f' % basic_amount
-            st_line_comm += indent + _('Percentage') + ': %.4f' % percent
-            st_line_comm += indent + _('Term in days') + ': %s' % term
-            st_line_comm += indent + (
-                minimum and _('Minimum applicable')
-                or _('Minimum not applicable'))
-            st_line_comm += indent + _(
-                'Guarantee Number') + ': %s' % guarantee_number
-
-        elif comm_type == '124':
-            card_issuers = {
-                '1': 'Mastercard',
-                '2': 'Visa',
-                '3': 'American Express',
-                '4': 'Diners Club',
-                '9': _('Other')}
-            st_line_name = _('Settlement credit cards')
-            card_number = comm[0:20].strip()
-            card_issuer = card_issuers.get(comm[20], '')
-            invoice_number = comm[21:33].strip()
-            identification_number = comm[33:48].strip()
-            date = comm[48:54].strip() and str2date(comm[48:54]) or ''
-            st_line_comm = '\n' + indent + st_line_name + indent \
-                + _('Card Number') + ': %s' % card_number
-            st_line_comm += indent + _('Issuing Institution') \
-                + ': %s' % card_issuer
-            st_line_comm += indent + _('Invoice Number') \
-                + ': %s' % invoice_number
-            st_line_comm += indent + _('Identification Number') \
-                + ': %s' % identification_number
-            st_line_comm += indent + _('Date') + ': %s' % date
-
-        elif comm_type == '125':
-            if line['trans_family'] not in st_line_name_families:
-                st_line_name = _('Credit')
-            credit_account = comm[0:27].strip()
-            if check_bban('BE', credit_account):
-                credit_account = '-'.join(
-                    [credit_account[:3],
-                     credit_account[3:10],
-                     credit_account[10:]])
-            old_balance = list2float(comm[27:42])
-            new_balance = list2float(comm[42:57])
-            amount = list2float(comm[57:72])
-            currency = comm[72:75]
-            start_date = str2date(comm[75:81])
-            end_date = str2date(comm[81:87])
-            rate = number2float(comm[87:99], 8)
-            trans_reference = comm[99:112].strip()
-            st_line_comm = '\n' + indent + st_line_name + indent \
-                + _('Credit Account Number') + ': %s' % credit_account
-            st_line_comm += indent + _('Old Balance') + ': %.2f' % old_balance
-            st_line_comm += indent + _('New Balance') + ': %.2f' % new_balance
-            st_line_comm += indent + _('Amount') + ': %.2f' % amount
-            st_line_comm += indent + _('Currency') + ': %s' % currency
-            st_line_comm += indent + _('Starting Date') + ': %s' % start_date
-            st_line_comm += indent + _('End Date') + ': %s' % end_date
-            st_line_comm += indent + _(
-                'Nominal Interest Rate or Rate of Charge') + ': %.4f' % rate
-            st_line_comm += indent + _(
-                'Transaction Reference') + ': %s' % trans_reference
-
-        elif comm_type == '127':
-            direct_debit_types = {
-                '0': _('unspecified'),
-                '1': _('recurrent'),
-                '2': _('one-off'),
-                '3': _('1-st (recurrent)'),
-                '4': _('last (recurrent)')}
-            direct_debit_schemes = {
-                '0': _('unspecified'),
-                '1': _('SEPA core'),
-                '2': _('SEPA B2B')}
-            paid_refusals = {
-                '0': _('paid'),
-                '1': _('technical problem'),
-                '2': _('refusal - reason not specified'),
-                '3': _('debtor disagrees'),
-                '4': _('debtor\'s account problem')}
-            R_types = {
-                '0': _('paid'),
-                '1': _('reject'),
-                '2': _('return'),
-                '3': _('refund'),
-                '4': _('reversal'),
-                '5': _('cancellation')}
-            st_line_name = _('European direct debit (SEPA)')
-            settlement_date = str2date(comm[0:6])
-            direct_debit_type = direct_debit_types.get(comm[6], '')
-            direct_debit_scheme = direct_debit_schemes.get(comm[7], '')
-            paid_refusal = paid_refusals.get(comm[8], '')
-            creditor_id = comm[9:44].strip()
-            mandate_ref = comm[44:79].strip()
-            comm_zone = comm[79:141]
-            R_type = R_types.get(comm[141], '')
-            reason = comm[142:146].strip()
-            st_line_comm = '\n' + indent + st_line_name + indent \
-                + _('Settlement_Date') + ': %s' % settlement_date
-            st_line_comm += indent + _('Direct Debit Type') \
-                + ': %s' % direct_debit_type
-            st_line_comm += indent + _('Direct Debit Scheme') \
-                + ': %s' % direct_debit_scheme
-            st_line_comm += indent + _('Paid or reason for refusal') \
-                + ': %s' % paid_refusal
-            st_line_comm += indent + _('Creditor\'s Identification Code') \
-                + ': %s' % creditor_id
-            st_line_comm += indent + _('Mandate Reference') \
-                + ': %s' % mandate_ref
-            st_line_comm += indent + _('Communication') + ': %s' % comm_zone
-            st_line_comm += indent + _('R transaction Type') + ': %s' % R_type
-            st_line_comm += indent + _('Reason') + ': %s' % reason
-
-        else:  # To DO :'115', '121', '122', '126'
-            _logger.warn(
-                "The parsing of Structured Commmunication Type %s "
-                "has not yet been implemented. "
-                "Please contact Noviat (info@noviat.com) for more information"
-                " about the development roadmap", comm_type)
+        def translate(source):
+            if not lang:
+                return source
+            return translation_obj._get_source(
+                cr, SUPERUSER_ID, None, ('code', 'sql_constraint'),
+                lang, source) or source
 
-        return st_line_name, st_line_comm
+        return comm_labels(translate)
 
-    def _parse_comm_info(self, cr, uid, line, context=None):
+    def _parse_comm(self, cr, uid, line, decoders, context=None):
         comm_type = line['struct_comm_type']
-        comm = st_line_comm = line['communication']
-        st_line_name = line['name']
-
-        if comm_type == '001':
-            st_line_name = filter(
-                lambda x: comm_type == x['code'],
-                self._comm_type_table)[0]['description']
-            st_line_comm = '\n' + indent + st_line_name + indent \
-                + _('Name') + ': %s' % comm[0:70].strip()
-            st_line_comm += indent + _('Street') \
-                + ': %s' % comm[70:105].strip()
-            st_line_comm += indent + _('Locality') + \
-                ': %s' % comm[105:140].strip()
-            st_line_comm += indent + _('Identification Code') \
-                + ': %s' % comm[140:175].strip()
-
-        elif comm_type in ['002', '004', '005']:
-            st_line_name = filter(
-                lambda x: comm_type == x['code'],
-                self._comm_type_table)[0]['description']
-            st_line_comm = comm.strip()
-
-        elif comm_type == '006':
-            amount_sign = comm[48]
-            amount = (comm[48] == '1' and '-' or '') \
-                + ('%.2f' % list2float(comm[33:48])) + ' ' + comm[30:33]
-            st_line_name = filter(
-                lambda x: comm_type == x['code'],
-                self._comm_type_table)[0]['description']
-            st_line_comm = '\n' + indent + st_line_name + indent \
-                + _('Description of the detail') + ': %s' % comm[0:30].strip()
-            st_line_comm += indent + _('Amount') \
-                + ': %s%s' % (amount_sign, amount)
-            st_line_comm += indent + _('Category') \
-                + ': %s' % comm[49:52].strip()
-
-        elif comm_type == '007':
-            st_line_name = filter(
-                lambda x: comm_type == x['code'],
-                self._comm_type_table)[0]['description']
-            st_line_comm = '\n' + indent + st_line_name + indent \
-                + _('Number of notes/coins') + ': %s' % comm[0:7]
-            st_line_comm += indent + _('Note/coin denomination') \
-                + ': %s' % comm[7:13]
-            st_line_comm += indent + _('Total amount') \
-                + ': %.2f' % list2float(comm[13:28])
-
-        elif comm_type in ['008', '009']:
-            st_line_name = filter(
-                lambda x: comm_type == x['code'],
-                self._comm_type_table)[0]['description']
-            st_line_comm = '\n' + indent + st_line_name + indent + _('Name') \
-                + ': %s' % comm[0:70].strip()
-            st_line_comm += indent + _('Identification Code') \
-                + ': %s' % comm[70:105].strip()
-
-        else:  # To DO : 010, 011
+        decoder = decoders.get(comm_type)
+        if not decoder:
             _logger.warn(
                 "The parsing of Structured Commmunication Type %s "
                 "has not yet been implemented. "
                 "Please contact Noviat (info@noviat.com) for "
                 "more information about the development roadmap", comm_type)
+            return line['name'], line['communication']
+        comm_type_desc = comm_type in self._comm_type_table \
+            and self._comm_type_table[comm_type]['description']
+        st_line_name, rows = decoder(
+            line['communication'], line, comm_type_desc, self._comm_labels)
+        return st_line_name, render_comm(rows)
 
-        return st_line_name, st_line_comm
+    def _parse_comm_move(self, cr, uid, line, context=None):
+        return self._parse_comm(
+            cr, uid, line, COMM_MOVE_DECODERS, context=context)
+
+    def _parse_comm_info(self, cr, uid, line, context=None):
+        return self._parse_comm(
+            cr, uid, line, COMM_INFO_DECODERS, context=context)
@@ -27,30 +27,64 @@ from openerp.exceptions import except_orm
 class account_coda_import(models.TransientModel):
     _inherit = 'account.coda.import'
 
+    def _coda_parsing(self, cr, uid, ids, context=None, **kwargs):
+        self._payment_line_index = {}
+        return super(account_coda_import, self)._coda_parsing(
+            cr, uid, ids, context=context, **kwargs)
+
+    def _prefetch_payment_lines(self, cr, uid, payment_reference,
+                                context=None):
+        """
+        Add the payment lines with name 'payment_reference' to the
+        payment line index together with the other payment lines of
+        the same payment order(s), since the other transactions of
+        the CODA statement will refer to those.
+        Payment lines with the same name in other payment orders are
+        included, hence the ambiguity check is not affected.
+
+        The payment lines excluded by the record rules are removed
+        via a single search.
+        """
+        cr.execute(
+            "SELECT name, id, partner_id, move_line_id FROM payment_line "
+            "WHERE name IN (SELECT name FROM payment_line WHERE order_id IN "
+            "(SELECT order_id FROM payment_line WHERE name = %s))",
+            (payment_reference,))
+        res = cr.fetchall()
+        payline_ids = res and set(self.pool['payment.line'].search(
+            cr, uid, [('id', 'in', [x[1] for x in res])], context=context))
+        index = self._payment_line_index
+        index[payment_reference] = []
+        for name in set([x[0] for x in res]):
+            index[name] = []
+        for name, payline_id, partner_id, move_line_id in res:
+            if payline_id in payline_ids:
+                index[name].append((payline_id, partner_id, move_line_id))
+
     def _match_payment_reference(self, cr, uid, coda_statement, line,
                                  coda_parsing_note, context=None):
         """
         check payment reference in bank statement line
         against payment order lines
         """
-        payment_line_obj = self.pool['payment.line']
         cba = coda_statement['coda_bank_params']
         find_payment = cba['find_payment']
         payment_reference = line['payment_reference']
         match = {}
 
         if payment_reference and find_payment and line['amount'] < 0:
-            payline_ids = payment_line_obj.search(
-                cr, uid, [('name', '=', payment_reference)])
-            if payline_ids:
-                if len(payline_ids) == 1:
-                    payline = payment_line_obj.browse(
-                        cr, uid, payline_ids[0], context=context)
-                    match['payment_line_id'] = payline.id
-                    line['payment_line_id'] = payline.id
-                    line['partner_id'] = payline.partner_id.id
-                    if payline.move_line_id:
-                        line['reconcile'] = payline.move_line_id.id
+            if payment_reference not in self._payment_line_index:
+                self._prefetch_payment_lines(
+                    cr, uid, payment_reference, context=context)
+            paylines = self._payment_line_index[payment_reference]
+            if paylines:
+                if len(paylines) == 1:
+                    payline_id, partner_id, move_line_id = paylines[0]
+                    match['payment_line_id'] = payline_id
+                    line['payment_line_id'] = payline_id
+                    line['partner_id'] = partner_id or False
+                    if move_line_id:
+                        line['reconcile'] = move_line_id
                 else:
                     err_string = _(
                         "\nThe CODA parsing detected a "
@@ -58,7 +92,7 @@ class account_coda_import(models.TransientModel):
                         "movement data record 2.3, seq nr %s!"
                         "\nPlease check your Payment Gateway configuration "
                         "or contact your Odoo support channel."
-                        ) % line[2:10]
+                        ) % line['ref']
                     err_code = 'R2007'
                     if self._batch:
                         return (err_code, err_string)
@@ -21,4 +21,5 @@
 ##############################################################################
 
 from . import account_coda
+from . import sale_order
 from . import wizard
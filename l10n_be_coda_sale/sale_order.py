@@ -0,0 +1,42 @@
+# -*- encoding: utf-8 -*-
+##############################################################################
+#
+#    Odoo, Open Source Management Solution
+#
+#    Copyright (c) 2010-now Noviat nv/sa (www.noviat.com).
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+from openerp import models, fields, api
+import re
+
+
+class sale_order(models.Model):
+    _inherit = 'sale.order'
+
+    coda_ref_key = fields.Char(
+        string='CODA Reference Key', compute='_compute_coda_ref_key',
+        store=True, index=True,
+        help="Sales Order Number as SQL LIKE pattern for the lookup "
+             "of the Sales Order in the free format communication "
+             "of a CODA transaction.\nThe first sequence of 3 to 10 zeros "
+             "matches any text between two zeros.")
+
+    @api.one
+    @api.depends('name')
+    def _compute_coda_ref_key(self):
+        self.coda_ref_key = self.name \
+            and re.sub('[0]{3,10}', '0%0', self.name, count=1)
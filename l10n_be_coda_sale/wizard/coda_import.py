@@ -21,6 +21,9 @@
 ##############################################################################
 
 from openerp import models
+from openerp.addons.l10n_be_coda_advanced.wizard.coda_helpers import \
+    AhoCorasick, like2regex
+import re
 import logging
 _logger = logging.getLogger(__name__)
 
@@ -28,21 +31,70 @@ _logger = logging.getLogger(__name__)
 class account_coda_import(models.TransientModel):
     _inherit = 'account.coda.import'
 
+    def _coda_parsing(self, cr, uid, ids, context=None, **kwargs):
+        self._so_number_index = {}
+        return super(account_coda_import, self)._coda_parsing(
+            cr, uid, ids, context=context, **kwargs)
+
+    def _get_so_number_index(self, cr, uid, company_id, context=None):
+        """
+        Returns an (AhoCorasick automaton, list of (regex, so_id) tuples)
+        for the lookup of the Sales Orders that are not cancelled or done.
+
+        The keywords are derived from the sale.order coda_ref_key
+        SQL LIKE pattern '<head>%<tail>'. A hit on the head is confirmed
+        when the tail follows the head in the communication.
+        Sales Order Numbers containing SQL LIKE wildcards
+        are matched via a regex.
+
+        The index is built once per CODA import and company.
+        """
+        if company_id not in self._so_number_index:
+            cr.execute(
+                "SELECT id, name, coda_ref_key FROM sale_order "
+                "WHERE state NOT IN ('cancel', 'done') "
+                "AND company_id = %s", (company_id,))
+            automaton = AhoCorasick()
+            patterns = []
+            for so_id, name, ref_key in cr.fetchall():
+                if re.search(r'[%_\\]', name):
+                    patterns.append((like2regex(ref_key), so_id))
+                    continue
+                head, sep, tail = ref_key.lower().partition('%')
+                automaton.add(head, (so_id, head, tail if sep else None))
+            self._so_number_index[company_id] = (automaton, patterns)
+        return self._so_number_index[company_id]
+
+    def _filter_open_sale_orders(self, cr, uid, so_ids, context=None):
+        """
+        The Sales Order index is built once per CODA import,
+        hence the state is verified when a Sales Order is found.
+        """
+        if not so_ids:
+            return []
+        cr.execute(
+            "SELECT id FROM sale_order "
+            "WHERE state NOT IN ('cancel', 'done') AND id IN %s",
+            (tuple(so_ids),))
+        return cr.fetchall()
+
     def _get_sale_order(self, cr, uid, coda_statement, line,
                         coda_parsing_note, context=None):
         """
         check matching Sales Order number in free form communication
         """
-        free_comm = repl_special(line['communication'].strip())
-        select = \
-            "SELECT id FROM (SELECT id, name, '%s'::text AS free_comm, " \
-            "regexp_replace(name, '[0]{3,10}', '0%%0') AS name_match " \
-            "FROM sale_order WHERE state not in ('cancel', 'done') " \
-            "AND company_id = %s) sq " \
-            "WHERE free_comm ILIKE '%%'||name_match||'%%'" \
-            % (free_comm, coda_statement['company_id'])
-        cr.execute(select)
-        res = cr.fetchall()
+        free_comm = line['communication'].strip()
+        automaton, patterns = self._get_so_number_index(
+            cr, uid, coda_statement['company_id'], context=context)
+        comm = free_comm.lower()
+        so_ids = set()
+        for so_id, head, tail in automaton.search(comm):
+            if tail is None or comm.find(
+                    tail, comm.find(head) + len(head)) >= 0:
+                so_ids.add(so_id)
+        so_ids.update([x[1] for x in patterns if x[0].search(free_comm)])
+        res = self._filter_open_sale_orders(
+            cr, uid, so_ids, context=context)
         return coda_parsing_note, res
 
     def _match_sale_order(self, cr, uid, coda_statement, line,
@@ -79,9 +131,11 @@ class account_coda_import(models.TransientModel):
                         "WHERE state = 'open' AND amount_total = %s "
                         "AND id in %s",
                         (amount_rounded, tuple(inv_ids)))
-                    res = cr.fetchall()
-                    if res:
-                        inv_ids = [x[0] for x in res]
+                    inv_ids = [x[0] for x in cr.fetchall()]
+                    if inv_ids and self._deferred_aml_ids:
+                        inv_ids = self._filter_open_invoices(
+                            cr, uid, inv_ids, context=context)
+                    if inv_ids:
                         if len(inv_ids) == 1:
                             invoice = inv_obj.browse(
                                 cr, uid, inv_ids[0], context=context)
@@ -94,8 +148,3 @@ class account_coda_import(models.TransientModel):
                                 line['reconcile'] = iml_ids[0]
 
         return coda_parsing_note, match
-
-
-def repl_special(s):
-    s = s.replace("\'", "\'" + "'")
-    return s